@@ -0,0 +1,247 @@
+"""
+Semantic answer cache for off-script candidate questions.
+
+Most off-script messages are the same few questions in different words ("what's the
+salary?", "how much does this pay"). Questions are reduced to their content words (filler
+dropped, light stemming, a few hiring synonyms) and embedded as signed, hashed character
+n-gram + word vectors; a lookup is one NumPy matrix-vector product against every cached
+question, and the best match above ANSWER_CACHE_THRESHOLD (cosine) is answered from the
+cache instead of Gemini.
+
+Entries come from an optional seed file of approved FAQ answers (pinned, never evicted)
+and from Gemini answers to generic questions. Questions or answers that look personal or
+tied to the conversation ("what's my status?", "can you explain that again?") are never
+cached or served from the cache.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_DIM = int(os.getenv("ANSWER_CACHE_DIM", "1024"))
+ANSWER_CACHE_CAPACITY = int(os.getenv("ANSWER_CACHE_CAPACITY", "2048"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.8"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Whether Gemini answers to generic questions are added to the cache (seed answers always are).
+# Off by default: learned answers are served to other candidates without anyone reviewing them.
+ANSWER_CACHE_LEARN = os.getenv("ANSWER_CACHE_LEARN", "0") == "1"
+# JSON list of {"question": ..., "answer": ...} approved by the hiring team
+ANSWER_CACHE_SEED_PATH = os.getenv("ANSWER_CACHE_SEED_PATH", "")
+
+MAX_QUESTION_CHARS = 200
+MAX_ANSWER_CHARS = 2000
+
+# Words that tie a question to this candidate or this conversation
+_CONTEXT_WORDS = frozenset({
+    "i", "me", "my", "mine", "myself", "i'm", "im", "i've", "ive", "i'd", "id", "i'll",
+    "we", "our", "us", "that", "it", "those", "these", "above", "earlier", "previous",
+    "again", "said", "mentioned", "answer", "answers", "question", "status", "application",
+    "profile", "resume", "cv", "email", "phone", "name", "mean", "explain", "repeat", "clarify",
+    # Where the conversation is at ("what's next?", "what happens now?")
+    "next", "now", "then", "after", "yet", "still", "later", "happen", "happens", "happened",
+    "happening", "step", "steps", "done", "finished", "left", "remaining", "continue", "proceed",
+})
+# Words that carry no meaning for matching ("what is the salary for this role" ~ "salary")
+_FILLER_WORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "can", "could",
+    "will", "would", "should", "what", "whats", "how", "much", "many", "when", "where", "which",
+    "who", "why", "there", "for", "of", "to", "in", "on", "at", "by", "with", "about", "this",
+    "role", "position", "job", "your", "you", "please", "tell",
+})
+_SYNONYMS = {
+    "pay": "salary", "paid": "salary", "compensation": "salary", "wage": "salary",
+    "remotely": "remote", "wfh": "remote", "visa": "sponsor", "sponsorship": "sponsor",
+    "hiring": "hire", "interviews": "interview",
+}
+_SUFFIXES = ("ing", "ed", "ly", "es", "s")
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+_SENSITIVE_PATTERN = re.compile(r"\d|@|https?://")
+
+
+def _words(text: str) -> list:
+    return _WORD_PATTERN.findall((text or "").lower().replace("'s", ""))
+
+
+def _stem(word: str) -> str:
+    word = _SYNONYMS.get(word, word)
+    if len(word) > 4 and not word.endswith("ss"):
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+    return _SYNONYMS.get(word, word)
+
+
+def content_words(text: str) -> list:
+    """Stemmed words of `text` without filler, e.g. "How much does the role pay?" -> ["salary"]."""
+    return [w for w in map(_stem, _words(text)) if w not in _FILLER_WORDS]
+
+
+def is_cacheable_question(text: str) -> bool:
+    """Generic questions only: short, no digits/emails/links, nothing about "me" or "that"."""
+    if not content_words(text) or len(text) > MAX_QUESTION_CHARS or _SENSITIVE_PATTERN.search(text):
+        return False
+    return not (set(_words(text)) & _CONTEXT_WORDS)
+
+
+def is_cacheable_answer(answer: str, candidate_name: str = "") -> bool:
+    """Rejects empty or long answers and answers that mention the candidate by name."""
+    if not answer or len(answer) > MAX_ANSWER_CHARS:
+        return False
+    return not (set(_words(candidate_name)) & set(_words(answer)))
+
+
+def embed(text: str, dim: int = ANSWER_CACHE_DIM) -> np.ndarray:
+    """
+    L2-normalized float32 vector of signed hashed features: character 3-5-grams of the
+    question's content words plus the words themselves (weighted double) and word bigrams.
+    """
+    words = content_words(text)
+    padded = f" {' '.join(words)} "
+    features = [padded[i:i + n] for n in (3, 4, 5) for i in range(len(padded) - n + 1)]
+    features += [f"w:{w}" for w in words] * 2 + [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    vector = np.zeros(dim, dtype=np.float32)
+    if not features:
+        return vector
+    hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, hashes % dim, signs)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """
+    Fixed-capacity, thread-safe nearest-neighbour cache of question → answer.
+
+    Embeddings live in one preallocated (capacity × dim) float32 matrix. When full, the
+    least recently used unpinned entry is evicted; unpinned entries also expire after `ttl`.
+    """
+
+    def __init__(self, capacity: int, dim: int, threshold: float, ttl: float):
+        self.capacity = max(1, capacity)
+        self.dim = dim
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._answers = [None] * self.capacity
+        self._questions = [None] * self.capacity
+        self._created = np.zeros(self.capacity)
+        self._last_used = np.zeros(self.capacity)
+        self._pinned = np.zeros(self.capacity, dtype=bool)
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def lookup(self, question: str):
+        """Returns (answer, similarity) for the closest live entry above the threshold, else (None, best similarity)."""
+        query = embed(question, self.dim)
+        with self._lock:
+            if not self._size:
+                self.misses += 1
+                return None, 0.0
+            scores = self._vectors[:self._size] @ query
+            expired = ~self._pinned[:self._size] & (self._created[:self._size] < time.time() - self.ttl)
+            scores[expired] = -1.0
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if score < self.threshold:
+                self.misses += 1
+                return None, score
+            self.hits += 1
+            self._last_used[best] = time.monotonic()
+            return self._answers[best], score
+
+    def add(self, question: str, answer: str, pinned: bool = False) -> None:
+        """Stores an answer; a near-identical cached question is replaced instead of duplicated."""
+        vector = embed(question, self.dim)
+        with self._lock:
+            slot = None
+            if self._size:
+                scores = self._vectors[:self._size] @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= 0.98:
+                    if self._pinned[best] and not pinned:
+                        return  # never overwrite an approved answer with a generated one
+                    slot = best
+            if slot is None:
+                slot = self._size if self._size < self.capacity else self._evict_slot()
+                if slot is None:
+                    return
+                self._size = max(self._size, slot + 1)
+            self._vectors[slot] = vector
+            self._questions[slot] = question
+            self._answers[slot] = answer
+            self._created[slot] = time.time()
+            self._last_used[slot] = time.monotonic()
+            self._pinned[slot] = pinned
+
+    def _evict_slot(self):
+        """Expired unpinned entry if any, else the least recently used unpinned one (None if all pinned)."""
+        candidates = np.flatnonzero(~self._pinned[:self._size])
+        if not len(candidates):
+            return None
+        expired = candidates[self._created[candidates] < time.time() - self.ttl]
+        if len(expired):
+            return int(expired[0])
+        return int(candidates[np.argmin(self._last_used[candidates])])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "pinned": int(self._pinned[:self._size].sum()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def load_seed(self, path: str) -> int:
+        """Adds the approved FAQ answers in `path` as pinned entries; returns how many were loaded."""
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        for entry in entries:
+            self.add(entry["question"], entry["answer"], pinned=True)
+        return len(entries)
+
+
+answer_cache = SemanticAnswerCache(ANSWER_CACHE_CAPACITY, ANSWER_CACHE_DIM, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL_SECONDS)
+
+if ANSWER_CACHE_SEED_PATH:
+    try:
+        logger.info("Answer cache: loaded %d approved answers", answer_cache.load_seed(ANSWER_CACHE_SEED_PATH))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Answer cache: could not load %s: %s", ANSWER_CACHE_SEED_PATH, e)
+
+metrics.register_collector(lambda: {"answer_cache_entries": len(answer_cache)})
+
+
+def cached_answer(question: str):
+    """Answer for a generic off-script question from the cache, or None (including for personal questions)."""
+    if not is_cacheable_question(question):
+        metrics.inc("answer_cache_lookups_total", result="uncacheable")
+        return None
+    answer, _ = answer_cache.lookup(question)
+    metrics.inc("answer_cache_lookups_total", result="hit" if answer else "miss")
+    return answer
+
+
+def remember_answer(question: str, answer: str, candidate_name: str = "") -> bool:
+    """Caches a successful Gemini answer if both the question and the answer are generic."""
+    if not ANSWER_CACHE_LEARN or not is_cacheable_question(question) or not is_cacheable_answer(answer, candidate_name):
+        return False
+    answer_cache.add(question, answer)
+    return True
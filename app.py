@@ -1,24 +1,461 @@
 import streamlit as st
 import json
-import re
+import logging
 import os
+import threading
 st.set_page_config(page_title="HireMate Hiring Assistant", layout="wide")
-from llm_service import call_gemini_api 
-from firebase_service import initialize_firebase, save_candidate_profile
-
-# New import for the code editor
-from streamlit_ace import st_ace 
-from streamlit_phone_number import st_phone_number 
+from llm_service import warm_up as warm_up_llm, stream_gemini_api, build_context_history, generate_technical_questions, prefetch_technical_questions, question_cache_key
+from firebase_service import initialize_firebase, enqueue_candidate_profile, get_profile_delivery_status
+from metrics import registry as metrics, start_metrics_exporter
+from conversation_engine import (
+    JOB_OPTIONS, WIDGET_STAGES, SLOW_EFFECTS, start_interview, transition, question_text,
+    UserMessage, PhoneConfirmed, ExperienceConfirmed, PositionSelected, CodeSubmitted, SaveRequested,
+    QuestionsReady, ProfileSaved, FeedbackReady, ContextualReplyReady,
+    SendMessage, PrefetchQuestions, CancelPrefetch, EvaluateCode, RequestFeedback, GenerateQuestions, SaveProfile, ContextualReply,
+)
+from code_eval import submit_evaluation
+from feedback_jobs import feedback_queue, build_feedback_payload
+from answer_cache import cached_answer, remember_answer
+from local_backend import chat_reply as local_chat_reply
+from chat_render import CHAT_WINDOW_MESSAGES, chat_html_cache, format_message, window_start
+from session_memory import ChatMessage, PayloadTooLarge, check_answer_size, decode_upload, record_session_footprint, shared_text
+from session_store import (
+    SessionWriter, get_session_store, new_session_token, interview_values, restore_interview,
+    code_submission_values, restore_code_submissions,
+)
+
+# The code editor and phone widgets (streamlit_ace, streamlit_phone_number) are imported in
+# render_stage_widgets, the only place that draws them
 
 def format_history_for_prompt(chat_hist):
-   return "\n".join([f"{msg['sender'].capitalize()}: {msg['message']}" for msg in chat_hist])
+   return "\n".join([f"{msg.sender.capitalize()}: {msg.message}" for msg in chat_hist])
+
+APP_ID = os.getenv('__app_id', 'talent-scout-app')
+# How often the chat checks whether the background feedback job has finished
+FEEDBACK_POLL_SECONDS = float(os.getenv("FEEDBACK_POLL_SECONDS", "2"))
+
+# Question language -> streamlit-ace editor mode
+ACE_MODES = {"c++": "c_cpp", "cpp": "c_cpp", "c": "c_cpp", "c#": "csharp", "go": "golang", "shell": "sh", "bash": "sh"}
+
+# How long the consent step waits for an in-flight speculative generation before going live
+QUESTION_PREFETCH_WAIT_SECONDS = float(os.getenv("QUESTION_PREFETCH_WAIT_SECONDS", "30"))
+# Set to "0" to skip the background warm-up (benchmarks/startup.py does, to measure the first run alone)
+WARM_UP_IN_BACKGROUND = os.getenv("WARM_UP_IN_BACKGROUND", "1") == "1"
+
+def start_question_prefetch(desired_position, years_experience, tech_stack):
+    """
+    Speculatively starts question generation as soon as the tech stack is known,
+    replacing any earlier prefetch for this session.
+    """
+    cancel_question_prefetch()
+    st.session_state.question_prefetch = {
+        "key": question_cache_key(desired_position, years_experience, tech_stack),
+        "future": prefetch_technical_questions(desired_position, years_experience, tech_stack),
+    }
+
+def cancel_question_prefetch():
+    """
+    Cancels the session's speculative generation if it has not started yet, and
+    discards its result otherwise.
+    """
+    prefetch = st.session_state.get("question_prefetch")
+    if prefetch:
+        prefetch["future"].cancel()
+    st.session_state.question_prefetch = None
+
+def take_prefetched_questions(desired_position, years_experience, tech_stack):
+    """
+    Returns the prefetched questions if they were generated for the candidate's current
+    profile (waiting for an in-flight generation), or None so the caller generates live.
+    A prefetch still queued behind other sessions' is cancelled rather than waited for.
+    """
+    prefetch = st.session_state.get("question_prefetch")
+    st.session_state.question_prefetch = None
+    if not prefetch or prefetch["future"].cancelled():
+        return None
+    if prefetch["key"] != question_cache_key(desired_position, years_experience, tech_stack):
+        prefetch["future"].cancel()
+        return None
+    # cancel() only succeeds before a worker picks the job up; then generating inline is quicker
+    if prefetch["future"].cancel():
+        return None
+    try:
+        return prefetch["future"].result(timeout=QUESTION_PREFETCH_WAIT_SECONDS) or None
+    except Exception:
+        return None
+
+def stream_bot_message(container, chunks, prefix="", suffix=""):
+    """
+    Renders a bot message into `container` while its text chunks arrive and returns the
+    final message text (prefix + streamed text + suffix) for chat_history.
+    """
+    with container:
+        placeholder = st.empty()
+    streamed_text = ""
+    for chunk in chunks:
+        streamed_text += chunk
+        placeholder.markdown(format_message("bot", f"{prefix}{streamed_text}▌"), unsafe_allow_html=True)
+    final_text = prefix + streamed_text + suffix
+    placeholder.markdown(format_message("bot", final_text), unsafe_allow_html=True)
+    return final_text
+
+def queue_event(event):
+    """
+    Queues a UI event for the conversation engine; it is applied at the start of the next run.
+    """
+    st.session_state.event_queue.append(event)
+
+def queue_chat_message():
+    # on_submit callback of the chat input
+    text = st.session_state.get("main_chat_input_widget")
+    if text and text.strip():
+        queue_event(UserMessage(text))
+
+def apply_event(event, chat_container=None):
+    """
+    Runs the conversation engine for `event`. Instant effects run right away (messages are
+    also rendered into `chat_container` when given); slow effects are queued in
+    `pending_effects` and run after the page has been drawn.
+    """
+    stage = st.session_state.interview.stage
+    with metrics.span("hiremate_stage_transition", stage=stage, event=type(event).__name__):
+        st.session_state.interview, effects = transition(st.session_state.interview, event)
+    if stage == "askingQuestion" and isinstance(event, (UserMessage, CodeSubmitted)):
+        metrics.inc("hiremate_operation_total", operation="process_answer", outcome="ok")
+    for effect in effects:
+        if isinstance(effect, SLOW_EFFECTS):
+            st.session_state.pending_effects.append(effect)
+        elif isinstance(effect, SendMessage):
+            message = ChatMessage(effect.sender, effect.text)
+            st.session_state.chat_history.append(message)
+            if chat_container is not None:
+                with chat_container:
+                    st.markdown(chat_html_cache.message_html(message), unsafe_allow_html=True)
+        elif isinstance(effect, PrefetchQuestions):
+            start_question_prefetch(effect.desired_position, effect.years_experience, effect.tech_stack)
+        elif isinstance(effect, CancelPrefetch):
+            cancel_question_prefetch()
+        elif isinstance(effect, EvaluateCode):
+            # Runs in the sandbox pool while the candidate moves on; collected when feedback is generated
+            st.session_state.code_submissions[effect.response_index] = effect
+            st.session_state.code_evaluations[effect.response_index] = submit_evaluation(effect.answer, effect.tests, effect.language)
+        elif isinstance(effect, RequestFeedback):
+            request_feedback(effect)
+    save_session()
+
+def resume_session():
+    """
+    Binds this browser session to a stored one: the session named by the `session` query
+    parameter if the store still has it (written by any replica), otherwise a new session
+    whose token is put in the URL.
+    """
+    token = st.query_params.get("session")
+    restored = None
+    if token:
+        writer = SessionWriter(get_session_store(), token)
+        try:
+            restored = writer.restore()
+        except Exception as e:
+            st.warning(f"Could not resume your session: {e}")
+    if restored is None:
+        writer = SessionWriter(get_session_store(), new_session_token())
+        st.query_params["session"] = writer.token
+    else:
+        values, st.session_state.chat_history = restored
+        st.session_state.interview = restore_interview(values)
+        # Evaluations still running on the old replica are redone by the feedback job; the
+        # job itself is requeued when the workers start (see main) or re-enqueued if unknown here
+        st.session_state.code_submissions = restore_code_submissions(values, st.session_state.interview)
+        st.session_state.feedback_job_id = values.get("feedback_job_id")
+    st.session_state.session_writer = writer
+
+def save_session():
+    """
+    Writes what changed in this session to the session store, so the candidate can resume
+    on any replica.
+    """
+    writer = st.session_state.get("session_writer")
+    if writer is None:
+        return
+    values = interview_values(st.session_state.interview)
+    values.update(code_submission_values(st.session_state.get("code_submissions", {}), st.session_state.interview))
+    values["feedback_job_id"] = st.session_state.get("feedback_job_id")
+    try:
+        writer.save(values, st.session_state.chat_history)
+    except Exception as e:
+        st.warning(f"Could not save your session: {e}")
+
+def request_feedback(effect):
+    """
+    Queues the background feedback job for a just-saved profile; `poll_feedback_job`
+    picks up the result.
+    """
+    try:
+        payload = build_feedback_payload(effect.candidate_info, APP_ID, st.session_state.user_id, effect.profile_id,
+                                         st.session_state.code_submissions, st.session_state.code_evaluations)
+        st.session_state.feedback_job_id = feedback_queue.enqueue(st.session_state.db, payload)
+    except Exception as e:
+        st.error(f"Feedback queue error: {e}")
+        queue_event(FeedbackReady(False))
+
+def run_slow_effect(effect, chat_container, app_id):
+    """
+    Performs one slow effect and returns the event describing its outcome.
+    """
+    if isinstance(effect, GenerateQuestions):
+        try:
+            questions = (take_prefetched_questions(effect.desired_position, effect.years_experience, effect.tech_stack)
+                         or generate_technical_questions(effect.desired_position, effect.years_experience, effect.tech_stack))
+            return QuestionsReady(questions)
+        except Exception as e:
+            st.error(f"Question generation error: {e}")
+            return QuestionsReady([], error=str(e))
+
+    if isinstance(effect, SaveProfile):
+        try:
+            if st.session_state.db and st.session_state.user_id:
+                # Queued for the background writer; delivery status is shown in the info panel
+                profile_id = enqueue_candidate_profile(st.session_state.db, app_id, st.session_state.user_id, effect.candidate_info)
+                return ProfileSaved(bool(profile_id), profile_id=profile_id or "")
+            return ProfileSaved(False, "Database not available. Profile not saved.")
+        except Exception as e:
+            st.error(f"Save profile error: {e}")
+            return ProfileSaved(False, f"Error saving profile: {e}")
+
+    if isinstance(effect, ContextualReply):
+        try:
+            # Generic questions already answered before skip Gemini entirely
+            bot_msg = cached_answer(effect.question)
+            if bot_msg is not None:
+                message = ChatMessage("bot", bot_msg)
+                st.session_state.chat_history.append(message)
+                with chat_container:
+                    st.markdown(chat_html_cache.message_html(message), unsafe_allow_html=True)
+                return ContextualReplyReady(True)
+
+            contextual_llm_prompt = "You are HireMate, a helpful AI hiring assistant. Respond courteously and contextually to the user's *last* message in the history. If the question is outside your scope, politely state that you cannot answer. Do not deviate from your purpose."
+            context_history = build_context_history(st.session_state.chat_history, summary_cache=st.session_state.context_summaries)
+            outcome = {}
+            stream = stream_gemini_api(contextual_llm_prompt, context_history, outcome, task="chat",
+                                       fallback=lambda: local_chat_reply(effect.question))
+            bot_msg = stream_bot_message(chat_container, stream)
+            st.session_state.chat_history.append(ChatMessage("bot", bot_msg))
+            if outcome.get("ok"):
+                remember_answer(effect.question, bot_msg, st.session_state.interview.candidate_info["fullName"])
+            return ContextualReplyReady(True)
+        except Exception as e:
+            st.error(f"Error handling contextual query: {e}")
+            return ContextualReplyReady(False)
+
+    raise ValueError(f"Unknown effect: {effect!r}")
+
+# Metric labels for slow effects, matching the old pending_operation names
+OPERATION_NAMES = {
+    GenerateQuestions: "generate_questions",
+    SaveProfile: "save_profile",
+    ContextualReply: "contextual_reply",
+}
+
+def run_pending_effects(chat_container, app_id):
+    """
+    Runs queued slow effects, feeding each outcome back into the engine until nothing is
+    pending. Returns True if anything ran (the caller then reruns once to redraw the page).
+    """
+    ran_any = False
+    while st.session_state.pending_effects:
+        effect = st.session_state.pending_effects.pop(0)
+        with st.spinner("Processing..."), metrics.span("hiremate_operation", operation=OPERATION_NAMES[type(effect)]):
+            outcome = run_slow_effect(effect, chat_container, app_id)
+        apply_event(outcome, chat_container)
+        ran_any = True
+    return ran_any
+
+def warm_up():
+    """Imports the Gemini SDK, the question bank and the stage widgets ahead of their first use."""
+    try:
+        with metrics.span("warm_up"):
+            warm_up_llm()
+            import streamlit_ace, streamlit_phone_number  # noqa: F401
+    except Exception as e:
+        logging.getLogger(__name__).warning("Background warm-up failed: %s", e)
+
+@st.cache_resource(show_spinner=False)
+def start_background_warm_up():
+    """
+    Starts `warm_up` on a background thread, once per process, after the first page has
+    been drawn, so the candidate's first Gemini call doesn't also pay for the imports.
+    Returns None when WARM_UP_IN_BACKGROUND is off.
+    """
+    if not WARM_UP_IN_BACKGROUND:
+        return None
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_data(show_spinner=False)
+def load_css(css_file_path):
+    """
+    Reads the stylesheet once per process instead of on every rerun.
+    """
+    with open(css_file_path) as f:
+        return f.read()
+
+@st.fragment
+def render_candidate_panel():
+    """
+    Candidate information panel. Runs as a fragment so it is only rebuilt on full reruns.
+    """
+    st.markdown('<div class="candidate-info-panel">', unsafe_allow_html=True)
+    st.subheader("Candidate Information")
+    info = st.session_state.interview.candidate_info
+    if info["fullName"]: st.markdown(f"**Name:** {info['fullName']}")
+    if info["email"]: st.markdown(f"**Email:** {info['email']}")
+    if info["currentLocation"]: st.markdown(f"**Current Location:** {info['currentLocation']}")
+    if info["phoneNumber"]: st.markdown(f"**Phone:** {info['phoneNumber']}")
+    if info["yearsExperience"] != "": st.markdown(f"**Experience:** {info['yearsExperience']} years")
+    if info["desiredPositions"]: st.markdown(f"**Desired Roles:** {info['desiredPositions']}")
+    if info["techStack"]: st.markdown(f"**Tech Stack:** {info['techStack']}")
+    if info["saved_to_firestore"]:
+        delivery_status = get_profile_delivery_status(st.session_state.interview.profile_id)
+        if delivery_status == "delivered": st.success("Profile submitted and saved to database.")
+        elif delivery_status == "retrying": st.warning("Profile submitted. The database is unreachable right now; it will be saved automatically.")
+        elif delivery_status == "failed": st.error("Profile submitted, but the database rejected it. It has been set aside for an administrator to restore.")
+        else: st.info("Profile submitted. Saving to database...")
+
+    if (
+        st.session_state.interview.stage == "completed"
+        and not info["saved_to_firestore"]
+        and not st.session_state.pending_effects
+    ):
+        st.markdown("---")
+        if st.button("✅ Save and Submit Profile", use_container_width=True, type="primary"):
+            queue_event(SaveRequested())
+            st.rerun()
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def show_earlier_messages():
+    # on_click callback of the "load earlier messages" button
+    st.session_state.chat_window += CHAT_WINDOW_MESSAGES
+
+@st.fragment
+def render_chat_pane():
+    """
+    Chat history pane: the newest `chat_window` messages as one element (their HTML is
+    cached per message), with older ones behind a "load earlier" button. Returns the chat
+    container so that new and streamed messages can be appended to it during the same run.
+    """
+    chat_container = st.container(height=500, border=True)
+    history = st.session_state.chat_history
+    start = window_start(len(history), st.session_state.chat_window)
+
+    with chat_container:
+        if start:
+            st.button(f"⬆ Load {min(start, CHAT_WINDOW_MESSAGES)} earlier messages", key="load_earlier_btn",
+                      on_click=show_earlier_messages)
+        st.markdown(chat_html_cache.window_html(history[start:]), unsafe_allow_html=True)
+    return chat_container
+
+@st.fragment(run_every=FEEDBACK_POLL_SECONDS)
+def poll_feedback_job():
+    """
+    Checks on the background feedback job every few seconds without rerunning the page;
+    once it has finished, hands the result to the engine and reruns once to show it.
+    """
+    job = feedback_queue.get(st.session_state.feedback_job_id)
+    if job and job["status"] in ("queued", "running"):
+        st.caption("⏳ Preparing your feedback...")
+        return
+    if job is None and not st.session_state.get("feedback_job_reenqueued"):
+        # A resumed session whose job this replica's queue has never seen: queue it again from
+        # the saved profile (once Firebase is up, so the result can be merged into the profile)
+        st.caption("⏳ Preparing your feedback...")
+        if st.session_state.firebase_initialized:
+            st.session_state.feedback_job_reenqueued = True
+            interview = st.session_state.interview
+            unknown_job_id = st.session_state.feedback_job_id
+            request_feedback(RequestFeedback(dict(interview.candidate_info), interview.profile_id))
+            if st.session_state.feedback_job_id == unknown_job_id:
+                # Enqueueing failed and request_feedback queued FeedbackReady(False)
+                st.session_state.feedback_job_id = None
+                st.rerun()
+            save_session()
+        return
+    st.session_state.feedback_job_id = None
+    done = bool(job) and job["status"] == "done"
+    queue_event(FeedbackReady(done, job["result"] if done else ""))
+    st.rerun()
+
+@st.fragment
+def render_stage_widgets():
+    """
+    Stage-specific input widgets (code editor, position, phone, experience). Running as a
+    fragment means typing in the editor or changing a widget only reruns this block; the
+    confirm actions queue an engine event and trigger one full rerun to apply it.
+    """
+    interview = st.session_state.interview
+    stage = interview.stage
+    if stage == "askingQuestion":
+        # Coding questions get the editor; theoretical ones are answered through the chat input in main()
+        if interview.awaiting_code_answer:
+            st.info("This is a coding question. Please use the editor below or upload a file.")
+            st.write(question_text(interview.current_question))
+
+            from streamlit_ace import st_ace
+            language = interview.current_question.get("language") or "python"
+            st.session_state.code_input = st_ace(language=ACE_MODES.get(language, language), theme="tomorrow_night", key="ace_editor", auto_update=True)
+            
+            uploaded_file = st.file_uploader("Or upload your code file")
+
+            if st.button("Submit Code Answer", key="submit_code_btn"):
+                try:
+                    if uploaded_file is not None:
+                        answer = f"--- CODE FROM FILE ---\n{decode_upload(uploaded_file)}"
+                    else:
+                        check_answer_size(st.session_state.code_input or "")
+                        answer = f"--- CODE FROM EDITOR ---\n{st.session_state.code_input}"
+                except PayloadTooLarge as e:
+                    st.error(f"{e} Please submit a shorter answer.")
+                else:
+                    # One shared copy for the chat history, the recorded response and the evaluation
+                    queue_event(CodeSubmitted(shared_text(answer)))
+                    st.rerun()
+
+    elif stage == "positions_select":
+        selected_pos = st.selectbox("Please choose your primary desired position from the list:", options=JOB_OPTIONS, key="positions_selectbox_widget", index=None, placeholder="Select a position...")
+        if selected_pos:
+            queue_event(PositionSelected(selected_pos))
+            st.rerun()
+    
+    elif stage == "phoneNumber":
+        from streamlit_phone_number import st_phone_number
+        st.write("Please enter your phone number:")
+        st_phone_number(label="📱 Mobile Number", placeholder="(select country code via dropdown)", default_country="IN", key="phone_number_widget" )
+        if st.button("Confirm Phone Number", key="confirm_phone_btn"):
+            phone_value = st.session_state.get("phone_number_widget")
+            if phone_value:
+                if isinstance(phone_value, dict): 
+                    cc = phone_value.get("countryCallingCode", "")
+                    national = phone_value.get("nationalNumber", "")
+                    phone_value = f"+{cc} {national}".strip()
+                queue_event(PhoneConfirmed(phone_value))
+                st.rerun()
+            else: st.error("Please enter a valid phone number.")
+
+    elif stage == "experience":
+        st.write("Enter your years of professional experience (e.g., 0, 1, 5):")
+        years = st.number_input(label="Years of Experience", min_value=0, step=1, key="experience_input_widget" )
+        if st.button("Confirm Experience", key="confirm_experience_btn"):
+            queue_event(ExperienceConfirmed(int(years)))
+            st.rerun()
 
 def main():
+    start_metrics_exporter()
+    metrics.inc("hiremate_script_runs_total")
+
     # Load CSS 
     css_file_path = os.path.join("style.css")
     try:
-        with open(css_file_path) as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+        st.markdown(f"<style>{load_css(css_file_path)}</style>", unsafe_allow_html=True)
     except FileNotFoundError:
         st.warning(f"Warning: style.css not found at {css_file_path}. Using default Streamlit styles.")
     except Exception as e:
@@ -28,37 +465,29 @@ def main():
     st.title("🤖 HireMate Hiring Assistant")
 
     # Firebase Configuration
-    app_id = os.getenv('__app_id', 'talent-scout-app') 
+    app_id = APP_ID
     firebase_config_b64_str = os.getenv('FIREBASE_CONFIG_B64', '')
     initial_auth_token = os.getenv('__initial_auth_token', None)
 
     # Session State Initialization
+    if "session_writer" not in st.session_state:
+        resume_session()
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
-    if "candidate_info" not in st.session_state:
-        st.session_state.candidate_info = {
-            "fullName": "", "email": "", "currentLocation": "",
-            "phoneNumber": "", "yearsExperience": "", "desiredPositions": "",
-            "techStack": "", "technicalResponses": [], "saved_to_firestore": False
-        }
-    if "info_stage" not in st.session_state:
-        st.session_state.info_stage = "name"
-        st.session_state.chat_history.append(
-            {"sender": "bot", "message": "Hello! Welcome to HireMate’s Hiring Assistant. Please note: All data you provide will be used solely for this simulated hiring process and handled with care."}
-        )
-        st.session_state.chat_history.append(
-            {"sender": "bot", "message": "May I have your full name? (You can type 'exit' anytime to end the conversation)"}
-        )
+    if "event_queue" not in st.session_state:
+        st.session_state.event_queue = []
+    if "pending_effects" not in st.session_state:
+        st.session_state.pending_effects = []
+    if "interview" not in st.session_state:
+        st.session_state.interview, greeting = start_interview()
+        for effect in greeting:
+            st.session_state.chat_history.append(ChatMessage(effect.sender, effect.text))
     # New state for code editor input
     if "code_input" not in st.session_state:
         st.session_state.code_input = ""
+    if "chat_window" not in st.session_state:
+        st.session_state.chat_window = CHAT_WINDOW_MESSAGES
 
-    if "technical_questions" not in st.session_state:
-        st.session_state.technical_questions = []
-    if "current_question_index" not in st.session_state:
-        st.session_state.current_question_index = 0
-    if "is_loading" not in st.session_state:
-        st.session_state.is_loading = False
     if "firebase_initialized" not in st.session_state:
         st.session_state.firebase_initialized = False
     if "user_id" not in st.session_state:
@@ -69,327 +498,73 @@ def main():
         st.session_state.auth = None
     if "firebase_error" not in st.session_state:
         st.session_state.firebase_error = None
-    if "current_user_input" not in st.session_state:
-        st.session_state.current_user_input = None
-    if "pending_operation" not in st.session_state:
-        st.session_state.pending_operation = None
-    if "position_selected_value" not in st.session_state:
-        st.session_state.position_selected_value = None
-
-
-    # Firebase Initialization
-    if not st.session_state.firebase_initialized:
-        st.session_state.db, st.session_state.auth, st.session_state.user_id, st.session_state.firebase_error = \
-            initialize_firebase(app_id, firebase_config_b64_str, initial_auth_token)
-        st.session_state.firebase_initialized = True
-        if st.session_state.firebase_error:
-            st.error(f"Firebase Initialization Error: {st.session_state.firebase_error}")
-        st.rerun()
+    if "question_prefetch" not in st.session_state:
+        st.session_state.question_prefetch = None
+    if "context_summaries" not in st.session_state:
+        st.session_state.context_summaries = {}
+    if "code_evaluations" not in st.session_state:
+        st.session_state.code_evaluations = {}
+    if "code_submissions" not in st.session_state:
+        st.session_state.code_submissions = {}
+    if "feedback_job_id" not in st.session_state:
+        st.session_state.feedback_job_id = None
+
+    # Apply the events queued by widgets and the chat input before drawing the page
+    while st.session_state.event_queue:
+        apply_event(st.session_state.event_queue.pop(0))
+    record_session_footprint(st.session_state.chat_history, st.session_state.interview, st.session_state.code_submissions,
+                             st.session_state.context_summaries, st.session_state.code_input)
+
+    interview = st.session_state.interview
+    stage = interview.stage
+    busy = bool(st.session_state.pending_effects)
 
-    
     # Layout: Two columns
     col1, col2 = st.columns([1, 2], gap="large")
 
     # Left Column: Candidate Information Panel
     with col1:
-        st.markdown('<div class="candidate-info-panel">', unsafe_allow_html=True)
-        st.subheader("Candidate Information")
-        info = st.session_state.candidate_info
-        if info["fullName"]: st.markdown(f"**Name:** {info['fullName']}")
-        if info["email"]: st.markdown(f"**Email:** {info['email']}")
-        if info["currentLocation"]: st.markdown(f"**Current Location:** {info['currentLocation']}")
-        if info["phoneNumber"]: st.markdown(f"**Phone:** {info['phoneNumber']}")
-        if info["yearsExperience"] != "": st.markdown(f"**Experience:** {info['yearsExperience']} years")
-        if info["desiredPositions"]: st.markdown(f"**Desired Roles:** {info['desiredPositions']}")
-        if info["techStack"]: st.markdown(f"**Tech Stack:** {info['techStack']}")
-        if info["saved_to_firestore"]: st.success("Profile submitted and saved to database.")
-
-        if (
-            st.session_state.info_stage == "completed"
-            and not info["saved_to_firestore"]
-            and not st.session_state.is_loading
-            and not st.session_state.pending_operation
-        ):
-            st.markdown("---")
-            if st.button("✅ Save and Submit Profile", use_container_width=True, type="primary"):
-                st.session_state.chat_history.append(
-                    {"sender": "bot", "message": "Submitting your profile..."}
-                )
-                st.session_state.pending_operation = "save_profile"
-                st.session_state.is_loading = True
-                st.rerun()
-        st.markdown('</div>', unsafe_allow_html=True)
+        render_candidate_panel()
 
     # Right Column: Chat‐Style Interaction or Stage‐Specific Widgets
     with col2:
         st.subheader("Chat with HireMate AI")
-        chat_container = st.container(height=500, border=True)
-
-        with chat_container:
-            st.markdown(
-                "<div class='chat-background-area' style='display: flex; flex-direction: column; "
-                "height: 100%; overflow-y: auto;'>",
-                unsafe_allow_html=True
-            )
-            for message_item in st.session_state.chat_history:
-                if message_item["sender"] == "user":
-                    st.markdown(
-                        f'<div class="chat-message user-message">{message_item["message"]}</div>',
-                        unsafe_allow_html=True
-                    )
-                else:
-                    st.markdown(
-                        f'<div class="chat-message bot-message">{message_item["message"]}</div>',
-                        unsafe_allow_html=True
-                    )
-            st.markdown("</div>", unsafe_allow_html=True)
-
+        chat_container = render_chat_pane()
+        if st.session_state.feedback_job_id:
+            poll_feedback_job()
 
-        stage = st.session_state.info_stage
-        
         # Stage-Specific Input Widgets
-        if stage == "askingQuestion" and not st.session_state.is_loading and not st.session_state.pending_operation:
-            current_question = st.session_state.technical_questions[st.session_state.current_question_index]
-            # Check if it's a coding question
-            if "[CODE]" in current_question:
-                st.info("This is a coding question. Please use the editor below or upload a file.")
-                st.write(current_question.replace("[CODE]", "").strip())
-
-                st.session_state.code_input = st_ace(language="python", theme="tomorrow_night", key="ace_editor", auto_update=True)
-                
-                uploaded_file = st.file_uploader("Or upload your code file")
-
-                if st.button("Submit Code Answer", key="submit_code_btn"):
-                    answer = ""
-                    if uploaded_file is not None:
-                        answer = uploaded_file.getvalue().decode("utf-8")
-                        st.session_state.current_user_input = f"--- CODE FROM FILE ---\n{answer}"
-                    else:
-                        answer = st.session_state.code_input
-                        st.session_state.current_user_input = f"--- CODE FROM EDITOR ---\n{answer}"
-                    
-                    st.session_state.chat_history.append({"sender": "user", "message": st.session_state.current_user_input})
-                    st.session_state.pending_operation = "process_answer"
-                    st.session_state.is_loading = True
-                    st.rerun()
-            # It's a regular theoretical question, so use chat input
-            else: 
-                pass # The regular chat input will be handled later
+        if not busy:
+            render_stage_widgets()
 
-        elif stage == "positions_select" and not st.session_state.is_loading and not st.session_state.pending_operation:
-            job_options = ["Software Engineer", "Data Scientist", "Product Manager", "UX Designer", "DevOps Engineer", "Cloud Architect", "Cybersecurity Analyst", "Other"]
-            st.session_state.position_selected_value = st.selectbox("Please choose your primary desired position from the list:", options=job_options, key="positions_selectbox_widget", index=None, placeholder="Select a position...")
-        
-        elif stage == "phoneNumber" and not st.session_state.is_loading and not st.session_state.pending_operation:
-            st.write("Please enter your phone number:")
-            st_phone_number(label="📱 Mobile Number", placeholder="(select country code via dropdown)", default_country="IN", key="phone_number_widget" )
-            if st.button("Confirm Phone Number", key="confirm_phone_btn"):
-                phone_value = st.session_state.get("phone_number_widget")
-                if phone_value:
-                    if isinstance(phone_value, dict): 
-                        cc = phone_value.get("countryCallingCode", "")
-                        national = phone_value.get("nationalNumber", "")
-                        formatted_phone = f"+{cc} {national}".strip()
-                        st.session_state.candidate_info["phoneNumber"] = formatted_phone
-                    else: 
-                        st.session_state.candidate_info["phoneNumber"] = phone_value
-                    
-                    st.session_state.chat_history.append({"sender": "user", "message": st.session_state.candidate_info["phoneNumber"]})
-                    st.session_state.chat_history.append({"sender": "bot", "message": "Thank you. And how many years of professional experience do you have?"})
-                    st.session_state.info_stage = "experience"
-                    st.session_state.current_user_input = None; st.session_state.is_loading = False; st.rerun()
-                else: st.error("Please enter a valid phone number.")
-
-        elif stage == "experience" and not st.session_state.is_loading and not st.session_state.pending_operation:
-            st.write("Enter your years of professional experience (e.g., 0, 1, 5):")
-            years = st.number_input(label="Years of Experience", min_value=0, step=1, key="experience_input_widget" )
-            if st.button("Confirm Experience", key="confirm_experience_btn"):
-                st.session_state.candidate_info["yearsExperience"] = int(years)
-                st.session_state.chat_history.append({"sender": "user", "message": str(years)})
-                st.session_state.chat_history.append({"sender": "bot", "message": "Which primary job role are you interested in?"})
-                st.session_state.info_stage = "positions_select"
-                st.session_state.current_user_input = None; st.session_state.is_loading = False; st.rerun()
- 
-        if st.session_state.is_loading and stage not in ["exit", "final_confirmation", "completed"]:
-            with st.spinner("Processing..."): pass 
-
-        chat_input_disabled = (st.session_state.is_loading or st.session_state.pending_operation is not None or stage in ["positions_select", "phoneNumber", "experience", "completed", "exit"])
+        chat_input_disabled = busy or stage in WIDGET_STAGES + ["completed", "exit"]
         
         # Don't show chat input if it's a coding question UI
-        is_coding_question = "[CODE]" in st.session_state.technical_questions[st.session_state.current_question_index] if stage == "askingQuestion" and st.session_state.technical_questions else False
-        
-        if not is_coding_question and stage not in ["positions_select", "phoneNumber", "experience", "completed", "exit"]:
-            user_input_from_widget = st.chat_input("Type your message here...", disabled=chat_input_disabled, key="main_chat_input_widget")
-            if user_input_from_widget:
-                st.session_state.current_user_input = user_input_from_widget.strip()
-                st.session_state.chat_history.append({"sender": "user", "message": st.session_state.current_user_input})
-                st.session_state.is_loading = True 
-                st.rerun() 
+        if not interview.awaiting_code_answer and stage not in WIDGET_STAGES + ["completed", "exit"]:
+            st.chat_input("Type your message here...", disabled=chat_input_disabled, key="main_chat_input_widget", on_submit=queue_chat_message)
         elif chat_input_disabled:
              st.chat_input("Type your message here...", disabled=True, key="main_chat_input_widget_disabled")
 
         st.markdown("<div style='position: relative; bottom: 0; width: 100%; text-align: left; padding-top: 20px;'><p style='font-size: 0.75rem; color: #9CA3AF;'>&copy; 2024 HireMate. Powered by Gemini & Firebase</p></div>", unsafe_allow_html=True)
 
-    # Handle Pending Operations
-    if st.session_state.pending_operation:
-        op = st.session_state.pending_operation
-        info = st.session_state.candidate_info
-
-        if op == "generate_questions":
-            try:
-                # UPDATED PROMPT: Includes role, experience, difficulty, and coding question format.
-                prompt = (
-                    f"You are a technical interviewer for HireMate. Your task is to generate 3 questions for an initial screening. "
-                    f"The candidate is applying for the role of '{info['desiredPositions']}' with {info['yearsExperience']} years of experience. "
-                    f"Their self-declared tech stack is: \"{info['techStack']}\".\n\n"
-                    "INSTRUCTIONS:\n"
-                    "1. The questions must be suitable for an initial screening: focus on fundamental concepts, not deep, complex problems.\n"
-                    "2. Create a mix of theoretical and practical questions.\n"
-                    "3. If you generate a coding question, you MUST prefix it with the tag `[CODE]`.\n"
-                    "4. Format the final output as a numbered list (e.g., '1. Question one?', '2. [CODE] Question two?')."
-                )
-                response_text = call_gemini_api(prompt, []) 
-                questions = []
-                for line in response_text.split('\n'):
-                    match = re.match(r'^\s*\d+\.\s*(.*)$', line.strip())
-                    if match: questions.append(match.group(1).strip())
-
-                st.session_state.technical_questions = questions[:3] 
-                if st.session_state.technical_questions:
-                    bot_msg = f"Okay, let's start with the first question: {st.session_state.technical_questions[0]}"
-                    st.session_state.info_stage = "askingQuestion"
-                    st.session_state.current_question_index = 0
-                else:
-                    bot_msg = "I had trouble generating questions. Could you please try re-entering your tech stack with more specific terms?"
-                    st.session_state.info_stage = "techStack" 
-                st.session_state.chat_history.append({"sender": "bot", "message": bot_msg})
-            except Exception as e:
-                st.error(f"Question generation error: {e}")
-                st.session_state.chat_history.append({"sender": "bot", "message": f"Sorry, an error occurred. Let's try your tech stack again."})
-                st.session_state.info_stage = "techStack"
-            finally:
-                st.session_state.pending_operation = None; st.session_state.is_loading = False; st.rerun()
-        
-        elif op == "process_answer":
-            question_text = st.session_state.technical_questions[st.session_state.current_question_index]
-            answer_text = st.session_state.current_user_input 
-            info['technicalResponses'].append({"question": question_text, "answer": answer_text})
-            
-            next_idx = st.session_state.current_question_index + 1
-            if next_idx < len(st.session_state.technical_questions):
-                st.session_state.current_question_index = next_idx
-                bot_msg = f"Thank you. Next question: {st.session_state.technical_questions[next_idx]}"
-                st.session_state.info_stage = "askingQuestion"
-            else:
-                bot_msg = f"Thank you. That concludes the technical assessment, {info['fullName']}! Please review your information and click 'Save and Submit Profile'."
-                st.session_state.info_stage = "completed" 
-            st.session_state.chat_history.append({"sender": "bot", "message": bot_msg})
-            st.session_state.pending_operation = None; st.session_state.is_loading = False; st.session_state.current_user_input = None; st.rerun()
-
-        elif op == "save_profile":
-            try:
-                if st.session_state.db and st.session_state.user_id:
-                    if save_candidate_profile(st.session_state.db, app_id, st.session_state.user_id, info):
-                        info["saved_to_firestore"] = True
-                        st.session_state.chat_history.append({"sender": "bot", "message": "✅ Profile saved! Now generating personalized feedback based on your answers..."})
-                        # NEW: Instead of finishing, trigger feedback generation
-                        st.session_state.pending_operation = "generate_feedback"
-                    else: 
-                        st.session_state.chat_history.append({"sender": "bot", "message": "❌ Failed to save profile. Please try again."})
-                        st.session_state.info_stage = "completed"
-                        st.session_state.pending_operation = None
-                else: 
-                     st.session_state.chat_history.append({"sender": "bot", "message": "❌ Database not available. Profile not saved."})
-                     st.session_state.info_stage = "completed"
-                     st.session_state.pending_operation = None
-            except Exception as e:
-                st.error(f"Save profile error: {e}")
-                st.session_state.chat_history.append({"sender": "bot", "message": f"❌ Error saving profile: {e}"})
-                st.session_state.info_stage = "completed"; st.session_state.pending_operation = None
-            finally:
-                st.session_state.is_loading = False; st.rerun()
-
-        # NEW: Feedback Generation Operation
-        elif op == "generate_feedback":
-            try:
-                responses_str = "\n\n".join([f"Q: {r['question']}\nA: {r['answer']}" for r in info['technicalResponses']])
-                feedback_prompt = (
-                    "You are a helpful and constructive career coach for HireMate. "
-                    f"A candidate named {info['fullName']} has applied for the role of '{info['desiredPositions']}' and completed an initial screening.\n"
-                    f"Here are their answers to the technical questions:\n\n{responses_str}\n\n"
-                    "Your task is to provide brief, constructive feedback. "
-                    "Based on their answers, identify 1-2 key areas where they seem strong and 1-2 potential areas for improvement relevant to the desired job role. "
-                    "Keep the tone encouraging and professional. Do not judge, but rather guide. Format the output clearly using Markdown."
-                )
-                feedback_text = call_gemini_api(feedback_prompt, [])
-                bot_msg = "✅ Your profile has been successfully submitted!\n\nHere is some feedback based on your technical answers to help you prepare for future interviews:\n\n" + feedback_text
-                bot_msg += "\n\nA recruiter will be in touch if your profile matches our requirements. Thank you! You can now type 'exit' to end."
-                st.session_state.chat_history.append({"sender": "bot", "message": bot_msg})
-                st.session_state.info_stage = "final_confirmation"
-            except Exception as e:
-                st.error(f"Feedback generation error: {e}")
-                st.session_state.chat_history.append({"sender": "bot", "message": "I had trouble generating feedback, but your profile was saved successfully. Thank you!"})
-                st.session_state.info_stage = "final_confirmation"
-            finally:
-                st.session_state.pending_operation = None; st.session_state.is_loading = False; st.rerun()
-
-
-    if st.session_state.info_stage == "positions_select" and st.session_state.position_selected_value and not st.session_state.is_loading and not st.session_state.pending_operation:
-        selected_pos = st.session_state.position_selected_value
-        info = st.session_state.candidate_info; info["desiredPositions"] = selected_pos
-        st.session_state.chat_history.append({"sender": "user", "message": f"I'm interested in: {selected_pos}"})
-        bot_msg = "Thank you. In which primary tech stack are you proficient? (e.g., Python, React, Java, AWS)"
-        st.session_state.info_stage = "techStack"
-        st.session_state.chat_history.append({"sender": "bot", "message": bot_msg})
-        st.session_state.position_selected_value = None; st.session_state.current_user_input = None; st.session_state.is_loading = False; st.rerun()
-
-    if st.session_state.current_user_input and not st.session_state.pending_operation and st.session_state.is_loading:
-        processed_input = st.session_state.current_user_input
-
-        if processed_input.lower() in ["exit", "quit"]:
-            st.session_state.chat_history.append({"sender": "bot", "message": "Exiting conversation. Goodbye!"}); st.session_state.info_stage = "exit"
-            st.session_state.current_user_input = None; st.session_state.is_loading = False; st.rerun(); return 
-
-        bot_msg = ""; next_stage = st.session_state.info_stage; info = st.session_state.candidate_info; current_stage = st.session_state.info_stage
-        handled_as_stage_specific = False
-
-        if current_stage == "name":
-            info["fullName"] = processed_input; bot_msg = "Great! Now, please enter your official email ID."; next_stage = "email"; handled_as_stage_specific = True
-        elif current_stage == "email":
-            if re.match(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$", processed_input):
-                info["email"] = processed_input; bot_msg = "Please enter your current location (e.g., City, Country)."; next_stage = "currentLocation"; handled_as_stage_specific = True
-            else: bot_msg = "That doesn't look like a valid email. Please provide a valid email address."; handled_as_stage_specific = True
-        elif current_stage == "currentLocation":
-            info["currentLocation"] = processed_input; bot_msg = "Understood. Now, please enter your contact number."; next_stage = "phoneNumber" ; handled_as_stage_specific = True
-        elif current_stage == "techStack":
-            info["techStack"] = processed_input
-            bot_msg = f"Great, {info['fullName']}! I'll now generate 3 technical questions based on your profile. If you are ready, please say 'OK' or 'yes'."
-            next_stage = "awaitingQuestionsConsent"; handled_as_stage_specific = True
-        elif current_stage == "awaitingQuestionsConsent":
-            if processed_input.strip().lower() in ["ok", "yes", "ready", "sure"]:
-                st.session_state.pending_operation = "generate_questions"
-                st.session_state.chat_history.append({"sender": "bot", "message": "Okay, generating technical questions..."})
-                st.session_state.current_user_input = None; st.session_state.is_loading = True; st.rerun(); return 
-            else: bot_msg = "Please type 'OK' or 'yes' when you are ready."; handled_as_stage_specific = True 
-        elif current_stage == "askingQuestion": 
-            # This logic now handles theoretical questions from chat input. Coding questions are handled by a button.
-            is_coding_q = "[CODE]" in st.session_state.technical_questions[st.session_state.current_question_index] if st.session_state.technical_questions else False
-            if not is_coding_q:
-                st.session_state.pending_operation = "process_answer"; st.session_state.is_loading = True; st.rerun(); return 
-        
-        if not handled_as_stage_specific and not st.session_state.pending_operation:
-            try:
-                contextual_llm_prompt = "You are HireMate, a helpful AI hiring assistant. Respond courteously and contextually to the user's *last* message in the history. If the question is outside your scope, politely state that you cannot answer. Do not deviate from your purpose."
-                bot_msg = call_gemini_api(contextual_llm_prompt, st.session_state.chat_history)
-                next_stage = current_stage 
-            except Exception as e:
-                st.error(f"Error handling contextual query: {e}")
-                bot_msg = "I'm sorry, I had a little trouble understanding that. Could you please rephrase?"
-        
-        if not st.session_state.pending_operation: 
-            if bot_msg: st.session_state.chat_history.append({"sender": "bot", "message": bot_msg})
-            st.session_state.info_stage = next_stage
-            st.session_state.current_user_input = None; st.session_state.is_loading = False; st.rerun()
+        # Firebase Initialization. Only saving the profile needs it, so it runs after the page
+        # has been drawn (and before the effects that save)
+        if not st.session_state.firebase_initialized:
+            st.session_state.db, st.session_state.auth, st.session_state.user_id, st.session_state.firebase_error = \
+                initialize_firebase(app_id, firebase_config_b64_str, initial_auth_token)
+            st.session_state.firebase_initialized = True
+            if st.session_state.firebase_error:
+                st.error(f"Firebase Initialization Error: {st.session_state.firebase_error}")
+        if st.session_state.feedback_job_id:
+            # Resumed sessions poll a job this process may not have started yet: start the workers,
+            # which also requeues jobs a restart left queued or running
+            feedback_queue.start(st.session_state.db)
+        start_background_warm_up()
+
+        # Run LLM calls and saves after the page is drawn, streaming their output into the chat,
+        # then rerun once so the whole page reflects the new state
+        if run_pending_effects(chat_container, app_id):
+            st.rerun()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+"""
+In-process stand-ins for Gemini and Firestore with configurable latency, jitter and
+error rates, so the app's service layer can be benchmarked offline.
+"""
+import itertools
+import json
+import random
+import threading
+import time
+import types
+
+from google.api_core import exceptions as google_exceptions
+
+QUESTIONS_REPLY = json.dumps({"questions": [
+    {"text": "What is the difference between a process and a thread?", "type": "theory", "language": "", "difficulty": "easy"},
+    {"text": "Write a function reverse(s) that reverses a string.", "type": "code", "language": "python", "difficulty": "easy",
+     "tests": ["assert reverse('abc') == 'cba'", "assert reverse('') == ''"]},
+    {"text": "How would you design a REST endpoint for creating users?", "type": "theory", "language": "", "difficulty": "medium"},
+]})
+FEEDBACK_REPLY = (
+    "**Strengths**\n\n- Solid grasp of fundamentals.\n\n"
+    "**Areas for improvement**\n\n- Go deeper on system design trade-offs."
+)
+CHAT_REPLY = "Thanks for asking! A recruiter will follow up with details about the role and the hiring process."
+
+
+class LatencyProfile:
+    """Latency (mean ± uniform jitter, in seconds) plus an error rate for a fake backend."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+        time.sleep(delay)
+        if fail:
+            raise google_exceptions.ServiceUnavailable("fake backend: injected failure")
+
+
+def _response(text: str):
+    part = types.SimpleNamespace(text=text)
+    return types.SimpleNamespace(
+        text=text,
+        candidates=[types.SimpleNamespace(content=types.SimpleNamespace(parts=[part]))],
+        prompt_feedback=None,
+        usage_metadata=types.SimpleNamespace(prompt_token_count=0, candidates_token_count=0, total_token_count=0),
+    )
+
+
+class FakeGeminiModel:
+    """
+    Mimics `genai.GenerativeModel.generate_content`, picking a canned reply from the prompt.
+    Streaming splits the reply into a few chunks.
+    """
+
+    def __init__(self, model_name: str, profile: LatencyProfile, stream_chunks: int = 4):
+        self.model_name = model_name
+        self.profile = profile
+        self.stream_chunks = max(1, stream_chunks)
+
+    def _reply_for(self, contents) -> str:
+        prompt = contents[-1]["parts"][0]["text"]
+        if "generate 3 questions" in prompt:
+            return QUESTIONS_REPLY
+        if "career coach" in prompt:
+            return FEEDBACK_REPLY
+        return CHAT_REPLY
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        text = self._reply_for(contents)
+        if not stream:
+            self.profile.wait()
+            return _response(text)
+        # The whole latency is paid before the first chunk, like time-to-first-token
+        self.profile.wait()
+        size = -(-len(text) // self.stream_chunks)
+        return [_response(text[i:i + size]) for i in range(0, len(text), size)]
+
+
+class _FakeDocument:
+    _ids = itertools.count()
+
+    def __init__(self, path: str, doc_id: str = None):
+        self.path = path
+        self.id = doc_id or f"fake{next(self._ids):016d}"
+
+
+class _FakeCollection:
+    def __init__(self, path: str):
+        self.path = path
+
+    def document(self, doc_id: str = None):
+        return _FakeDocument(self.path, doc_id)
+
+
+class _FakeBatch:
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, doc_ref, data, merge=False):
+        self._writes.append((doc_ref, data, merge))
+
+    def commit(self):
+        self._store.profile.wait()
+        with self._store.lock:
+            for doc_ref, data, merge in self._writes:
+                key = f"{doc_ref.path}/{doc_ref.id}"
+                if merge and key in self._store.documents:
+                    self._store.documents[key].update(data)
+                else:
+                    self._store.documents[key] = dict(data)
+            self._store.commits += 1
+
+
+class FakeFirestore:
+    """Minimal Firestore client: collections, documents and batched writes kept in memory."""
+
+    def __init__(self, profile: LatencyProfile):
+        self.profile = profile
+        self.documents = {}
+        self.commits = 0
+        self.lock = threading.Lock()
+
+    def collection(self, path: str):
+        return _FakeCollection(path)
+
+    def batch(self):
+        return _FakeBatch(self)
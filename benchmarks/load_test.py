@@ -0,0 +1,298 @@
+"""
+Headless load test: drives N concurrent simulated candidates through the full screening
+flow (name entry → background feedback) using the conversation engine and the real service
+layer, with Gemini and Firestore replaced by in-process fakes.
+
+    python -m benchmarks.load_test --sessions 200 --concurrency 50 --llm-latency-ms 800
+
+Reports throughput and p50/p95/p99 latency per stage and per slow effect.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+# The fake backends never use the key; setting one keeps llm_service from flagging it as missing
+os.environ.setdefault("GEMINI_API_KEY", "fake-key")
+
+import answer_cache
+import code_eval
+import feedback_jobs
+import firebase_service
+import llm_service
+import local_backend
+from session_memory import ChatMessage, payload_store, session_footprint, shared_text
+from benchmarks.fakes import FakeFirestore, FakeGeminiModel, LatencyProfile
+from conversation_engine import (
+    SLOW_EFFECTS, start_interview, transition,
+    UserMessage, PhoneConfirmed, ExperienceConfirmed, PositionSelected, CodeSubmitted, SaveRequested,
+    QuestionsReady, ProfileSaved, FeedbackReady, ContextualReplyReady,
+    SendMessage, PrefetchQuestions, CancelPrefetch, EvaluateCode, RequestFeedback, GenerateQuestions, SaveProfile, ContextualReply,
+)
+
+APP_ID = "load-test-app"
+USER_ID = "load-test-user"
+TECH_STACKS = ["Python, Django, PostgreSQL", "React, TypeScript, Node.js", "Java, Spring, AWS", "Go, Kubernetes, Docker"]
+POSITIONS = ["Software Engineer", "Data Scientist", "DevOps Engineer", "Cloud Architect"]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class HeadlessSession:
+    """
+    Runs one candidate through the conversation engine, performing effects the same way
+    app.py does but without Streamlit, and records how long each step takes.
+    """
+
+    def __init__(self, db_client, timings: dict):
+        self.db_client = db_client
+        self.timings = timings
+        self.state, greeting = start_interview()
+        self.chat_history = [ChatMessage(e.sender, e.text) for e in greeting]
+        self.context_summaries = {}
+        self.prefetch = None
+        self.code_submissions = {}
+        self.code_evaluations = {}
+        self.feedback_job = None  # (job_id, enqueued at)
+
+    def _record(self, name: str, seconds: float) -> None:
+        self.timings[name].append(seconds)
+
+    def _run_slow(self, effect):
+        started = time.perf_counter()
+        try:
+            if isinstance(effect, GenerateQuestions):
+                questions = None
+                if self.prefetch is not None:
+                    # Like app.py: a prefetch that hasn't started yet is cancelled, not waited for
+                    if not self.prefetch.cancel():
+                        questions = self.prefetch.result()
+                    self.prefetch = None
+                questions = questions or llm_service.generate_technical_questions(
+                    effect.desired_position, effect.years_experience, effect.tech_stack)
+                return QuestionsReady(questions)
+            if isinstance(effect, SaveProfile):
+                profile_id = firebase_service.enqueue_candidate_profile(self.db_client, APP_ID, USER_ID, effect.candidate_info)
+                return ProfileSaved(bool(profile_id), profile_id=profile_id or "")
+            if isinstance(effect, ContextualReply):
+                text = answer_cache.cached_answer(effect.question)
+                if text is None:
+                    context = llm_service.build_context_history(self.chat_history, summary_cache=self.context_summaries)
+                    outcome = {}
+                    text = "".join(llm_service.stream_gemini_api(
+                        "You are HireMate, a helpful AI hiring assistant.", context, outcome, task="chat",
+                        fallback=lambda: local_backend.chat_reply(effect.question)))
+                    if outcome.get("ok"):
+                        answer_cache.remember_answer(effect.question, text, self.state.candidate_info["fullName"])
+                self.chat_history.append(ChatMessage("bot", text))
+                return ContextualReplyReady(True)
+        finally:
+            self._record(f"effect:{type(effect).__name__}", time.perf_counter() - started)
+        raise ValueError(f"Unknown effect: {effect!r}")
+
+    def dispatch(self, event) -> None:
+        """Applies `event` and every slow effect it triggers; timed under the starting stage."""
+        stage = self.state.stage
+        started = time.perf_counter()
+        events = [event]
+        while events:
+            self.state, effects = transition(self.state, events.pop(0))
+            for effect in effects:
+                if isinstance(effect, SLOW_EFFECTS):
+                    events.append(self._run_slow(effect))
+                elif isinstance(effect, SendMessage):
+                    self.chat_history.append(ChatMessage(effect.sender, effect.text))
+                elif isinstance(effect, PrefetchQuestions):
+                    self.prefetch = llm_service.prefetch_technical_questions(
+                        effect.desired_position, effect.years_experience, effect.tech_stack)
+                elif isinstance(effect, CancelPrefetch) and self.prefetch is not None:
+                    self.prefetch.cancel()
+                    self.prefetch = None
+                elif isinstance(effect, EvaluateCode):
+                    self.code_submissions[effect.response_index] = effect
+                    self.code_evaluations[effect.response_index] = code_eval.submit_evaluation(effect.answer, effect.tests, effect.language)
+                elif isinstance(effect, RequestFeedback):
+                    payload = feedback_jobs.build_feedback_payload(effect.candidate_info, APP_ID, USER_ID, effect.profile_id,
+                                                                   self.code_submissions, self.code_evaluations)
+                    self.feedback_job = (feedback_jobs.feedback_queue.enqueue(self.db_client, payload), time.perf_counter())
+        self._record(f"stage:{stage}", time.perf_counter() - started)
+
+
+# Off-script questions asked during the coding question; paraphrases of a few FAQs
+OFF_SCRIPT_QUESTIONS = [
+    "What is the salary for this role?",
+    "How much does the role pay?",
+    "Is this position remote?",
+    "Is the role remote?",
+    "How long does the hiring process take?",
+    "How long does the hiring process usually take?",
+]
+
+
+def candidate_script(index: int) -> list:
+    """The events one simulated candidate produces, from name entry to submission."""
+    return [
+        UserMessage(f"Candidate {index}"),
+        UserMessage(f"candidate{index}@example.com"),
+        UserMessage("Bengaluru, India"),
+        PhoneConfirmed(f"+91 90000{index:05d}"),
+        ExperienceConfirmed(index % 12),
+        PositionSelected(POSITIONS[index % len(POSITIONS)]),
+        UserMessage(TECH_STACKS[index % len(TECH_STACKS)]),
+        UserMessage("ok"),
+        UserMessage("Processes have separate memory; threads share it."),
+        UserMessage(OFF_SCRIPT_QUESTIONS[index % len(OFF_SCRIPT_QUESTIONS)]),
+        CodeSubmitted("--- CODE FROM EDITOR ---\ndef reverse(s):\n    return s[::-1]"),
+        UserMessage("I would POST to /users and return 201 with the new resource."),
+        SaveRequested(),
+    ]
+
+
+def run_session(index: int, db_client, think_time: float) -> dict:
+    timings = defaultdict(list)
+    session = HeadlessSession(db_client, timings)
+    started = time.perf_counter()
+    for event in candidate_script(index):
+        if think_time:
+            time.sleep(think_time)
+        if isinstance(event, CodeSubmitted):
+            event = CodeSubmitted(shared_text(event.answer))  # as the app's submit button does
+        session.dispatch(event)
+    timings["session:total"].append(time.perf_counter() - started)
+    timings["session:completed"].append(1.0 if session.state.stage == "final_confirmation" else 0.0)
+    if session.feedback_job is not None:
+        # Like the UI's poller: wait for the background job, then hand its result to the engine
+        job_id, enqueued_at = session.feedback_job
+        job = feedback_jobs.feedback_queue.wait(job_id, timeout=120)
+        timings["feedback_job:latency"].append(time.perf_counter() - enqueued_at)
+        done = bool(job) and job["status"] == "done"
+        session.dispatch(FeedbackReady(done, job["result"] if done else ""))
+    timings["session:memory_bytes"].append(session_footprint(
+        session.chat_history, session.state, session.code_submissions, session.context_summaries))
+    return timings
+
+
+def install_fakes(args) -> FakeFirestore:
+    """Points llm_service and firebase_service at the in-process fakes."""
+    llm_profile = LatencyProfile(args.llm_latency_ms / 1000, args.llm_jitter_ms / 1000, args.llm_error_rate, args.seed)
+    db_profile = LatencyProfile(args.db_latency_ms / 1000, args.db_jitter_ms / 1000, args.db_error_rate, args.seed)
+    routes = llm_service.MODEL_ROUTES
+    if args.llm_concurrency:
+        routes = {task: replace(route, max_concurrency=args.llm_concurrency) for task, route in routes.items()}
+    if args.llm_tokens_per_minute is not None:
+        routes = {task: replace(route, tokens_per_minute=args.llm_tokens_per_minute) for task, route in routes.items()}
+    llm_service.router = llm_service.ModelRouter(routes, model_factory=lambda name: FakeGeminiModel(name, llm_profile))
+    if args.no_question_cache:
+        llm_service.question_cache.variants_per_key = 10 ** 9
+    llm_service.question_cache.clear()
+    answer_cache.answer_cache = answer_cache.SemanticAnswerCache(
+        answer_cache.ANSWER_CACHE_CAPACITY, answer_cache.ANSWER_CACHE_DIM,
+        2.0 if args.no_answer_cache else answer_cache.ANSWER_CACHE_THRESHOLD, answer_cache.ANSWER_CACHE_TTL_SECONDS)
+    # Measure the cache as deployed with ANSWER_CACHE_LEARN=1: there are no seed answers here
+    answer_cache.ANSWER_CACHE_LEARN = not args.no_answer_cache
+    firebase_service.profile_write_queue = firebase_service.ProfileWriteQueue(
+        tempfile.mkdtemp(prefix="hiremate-journal-"), firebase_service.PROFILE_BATCH_SIZE,
+        firebase_service.PROFILE_FLUSH_INTERVAL_SECONDS, 0.05, 1.0)
+    feedback_jobs.feedback_queue = feedback_jobs.JobQueue(
+        os.path.join(tempfile.mkdtemp(prefix="hiremate-jobs-"), "jobs.sqlite3"), feedback_jobs.run_feedback_job,
+        args.feedback_workers, feedback_jobs.FEEDBACK_MAX_ATTEMPTS, 0.05, 1.0, feedback_jobs.FEEDBACK_JOB_RETENTION_SECONDS)
+    return FakeFirestore(db_profile)
+
+
+def summarize(all_timings: dict, wall_seconds: float, sessions: int) -> dict:
+    completed = sum(all_timings.pop("session:completed", []))
+    memory = sorted(all_timings.pop("session:memory_bytes", []))
+    report = {
+        "sessions": sessions,
+        "completed": int(completed),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_sessions_per_second": round(sessions / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {},
+    }
+    if memory:
+        report["session_memory_bytes"] = {"p50": percentile(memory, 50), "p95": percentile(memory, 95), "max": memory[-1]}
+    for name in sorted(all_timings):
+        values = sorted(all_timings[name])
+        report["latency_ms"][name] = {
+            "count": len(values),
+            "p50": round(percentile(values, 50) * 1000, 2),
+            "p95": round(percentile(values, 95) * 1000, 2),
+            "p99": round(percentile(values, 99) * 1000, 2),
+            "max": round(values[-1] * 1000, 2),
+        }
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"sessions={report['sessions']} completed={report['completed']} "
+          f"wall={report['wall_seconds']}s throughput={report['throughput_sessions_per_second']} sessions/s")
+    print(f"{'step':<40}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in report["latency_ms"].items():
+        print(f"{name:<40}{row['count']:>8}{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}{row['max']:>10}")
+    for task, route in report["routing"].items():
+        print(f"route {task}: model={route['model_name']} requests={route['requests']} remote_ok={route['remote_ok']} "
+              f"remote_failed={route['remote_failed']} over_budget={route['over_budget']} local={route['local']} "
+              f"remote_hit_rate={route['remote_hit_rate']:.2f} gateway={route['gateway']}")
+    for key in ("answer_cache", "session_memory_bytes", "payload_store", "profile_queue", "feedback_jobs"):
+        if key in report:
+            print(f"{key}: {report[key]}")
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="HireMate headless load test")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Pause before each candidate action")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-concurrency", type=int, default=None, help="Concurrency cap of every model route (default: per-route settings)")
+    parser.add_argument("--llm-tokens-per-minute", type=int, default=None, help="Token budget of every model route (0 = none)")
+    parser.add_argument("--db-latency-ms", type=float, default=50.0)
+    parser.add_argument("--db-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--db-error-rate", type=float, default=0.0)
+    parser.add_argument("--feedback-workers", type=int, default=feedback_jobs.FEEDBACK_WORKERS)
+    parser.add_argument("--no-question-cache", action="store_true", help="Generate questions live for every session")
+    parser.add_argument("--no-answer-cache", action="store_true", help="Send every off-script question to the LLM")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    db_client = install_fakes(args)
+    all_timings = defaultdict(list)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for timings in pool.map(lambda i: run_session(i, db_client, args.think_ms / 1000), range(args.sessions)):
+            for name, values in timings.items():
+                all_timings[name].extend(values)
+    wall_seconds = time.perf_counter() - started
+
+    flush_started = time.perf_counter()
+    firebase_service.profile_write_queue.flush(timeout=60)
+    all_timings["profile_queue:drain"].append(time.perf_counter() - flush_started)
+
+    report = summarize(all_timings, wall_seconds, args.sessions)
+    report["routing"] = llm_service.router.stats()
+    report["answer_cache"] = answer_cache.answer_cache.stats()
+    report["payload_store"] = payload_store.stats()
+    report["feedback_jobs"] = feedback_jobs.feedback_queue.stats()
+    report["profile_queue"] = dict(firebase_service.profile_write_queue.stats(), documents_written=len(db_client.documents))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
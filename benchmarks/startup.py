@@ -0,0 +1,110 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import the app and to finish its
+first run (the welcome message on screen), and which heavy SDKs that path pulls in.
+
+    python -m benchmarks.startup --runs 5
+
+Every measurement runs in a new interpreter, like a freshly scaled-up replica.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packages that should stay off the first page load (they are imported lazily or warmed up afterwards)
+HEAVY_PACKAGES = ["google.generativeai", "firebase_admin", "google.cloud.firestore_v1", "pyarrow",
+                  "streamlit_ace", "streamlit_phone_number"]
+
+# Runs in the child process: first script run of app.py in Streamlit's headless test harness
+_FIRST_RUN = r'''
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+harness_ready = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=120)
+at.run()
+finished = time.perf_counter()
+welcome = any("chat-message" in m.value and "Welcome" in m.value for m in at.markdown)
+print(json.dumps({
+    "harness_seconds": harness_ready - started,
+    "first_run_seconds": finished - harness_ready,
+    "welcome_rendered": welcome,
+    "heavy_loaded": sorted(p for p in sys.argv[1:] if p in sys.modules),
+}))
+'''
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _child_env() -> dict:
+    env = dict(os.environ)
+    env.pop("FIREBASE_CONFIG_B64", None)  # measure the app, not a network round trip to Firebase
+    # Without the warm-up thread, "heavy_loaded" reflects the first run alone instead of racing it
+    env["WARM_UP_IN_BACKGROUND"] = "0"
+    return env
+
+
+def measure_import() -> dict:
+    """Imports app.py in a fresh interpreter with -X importtime; returns total and per-package cumulative seconds."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=REPO_ROOT,
+                          env=_child_env(), capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2)) / 1e6
+    return {
+        "import_seconds": cumulative.get("app", 0.0),
+        "packages": {name: cumulative[name] for name in ["streamlit", *HEAVY_PACKAGES] if name in cumulative},
+    }
+
+
+def measure_first_run() -> dict:
+    """Runs app.py once in a fresh interpreter and times the run that renders the welcome message."""
+    proc = subprocess.run([sys.executable, "-c", _FIRST_RUN, *HEAVY_PACKAGES], cwd=REPO_ROOT,
+                          env=_child_env(), capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _summary(values: list) -> dict:
+    values = sorted(values)
+    return {"min": round(values[0] * 1000, 1), "p50": round(values[len(values) // 2] * 1000, 1),
+            "max": round(values[-1] * 1000, 1)}
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="HireMate cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per measurement")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    imports = [measure_import() for _ in range(args.runs)]
+    first_runs = [measure_first_run() for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "import_ms": _summary([r["import_seconds"] for r in imports]),
+        "first_run_ms": _summary([r["first_run_seconds"] for r in first_runs]),
+        "package_import_ms": {name: _summary([r["packages"][name] for r in imports if name in r["packages"]])
+                              for name in imports[0]["packages"]},
+        "heavy_loaded_at_first_render": first_runs[-1]["heavy_loaded"],
+        "welcome_rendered": all(r["welcome_rendered"] for r in first_runs),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"runs={report['runs']} welcome_rendered={report['welcome_rendered']}")
+        print(f"{'measurement':<40}{'min ms':>10}{'p50 ms':>10}{'max ms':>10}")
+        rows = {"import app": report["import_ms"], "first run (time to first render)": report["first_run_ms"]}
+        rows.update({f"  import {name}": row for name, row in report["package_import_ms"].items()})
+        for name, row in rows.items():
+            print(f"{name:<40}{row['min']:>10}{row['p50']:>10}{row['max']:>10}")
+        print(f"heavy packages loaded by the end of the first run: {report['heavy_loaded_at_first_render'] or 'none'}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Chat history rendering.
+
+Each message's HTML is built once and cached by message ID. Bot messages are Markdown:
+they go through a CommonMark renderer with raw HTML disabled, and its output through an
+allow-list sanitizer. Candidate messages are escaped (only bold, inline code and code blocks
+are turned into markup). The chat pane then draws only the newest CHAT_WINDOW_MESSAGES
+messages as a single element, so the work per rerun and the data sent to the browser stay
+the same however long the conversation gets.
+"""
+import html
+import os
+import re
+import threading
+
+import nh3
+from cachetools import LRUCache
+from markdown_it import MarkdownIt
+
+from metrics import registry as metrics
+
+CHAT_WINDOW_MESSAGES = int(os.getenv("CHAT_WINDOW_MESSAGES", "30"))
+CHAT_HTML_CACHE_SIZE = int(os.getenv("CHAT_HTML_CACHE_SIZE", "5000"))
+
+CODE_HEADERS = ("--- CODE FROM EDITOR ---", "--- CODE FROM FILE ---")
+_FENCE = re.compile(r"```[\w+#.-]*\n?(.*?)```", re.S)
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_INLINE_CODE = re.compile(r"`([^`\n]+)`")
+
+# "breaks" keeps single newlines as line breaks, as in the candidate's bubbles
+_MARKDOWN = MarkdownIt("commonmark", {"html": False, "breaks": True}).enable(["table", "strikethrough"])
+# No images: a reply must not make the candidate's browser fetch anything
+_ALLOWED_TAGS = {
+    "p", "br", "hr", "strong", "em", "del", "code", "pre", "blockquote", "ul", "ol", "li",
+    "h1", "h2", "h3", "h4", "h5", "h6", "a", "table", "thead", "tbody", "tr", "th", "td",
+}
+_ALLOWED_ATTRIBUTES = {"a": {"href", "title"}, "code": {"class"}, "ol": {"start"}}
+_URL_SCHEMES = {"http", "https", "mailto"}
+
+
+def _code_block(code: str) -> str:
+    # Newlines as character references keep the whole message on one line, so Markdown
+    # never ends the surrounding HTML block at a blank line inside the code
+    return "<pre><code>" + html.escape(code.strip("\n")).replace("\n", "&#10;") + "</code></pre>"
+
+
+def _text_html(text: str) -> str:
+    escaped = html.escape(text)
+    escaped = _BOLD.sub(r"<strong>\1</strong>", escaped)
+    escaped = _INLINE_CODE.sub(r"<code>\1</code>", escaped)
+    return escaped.replace("\n", "<br>")
+
+
+def _markdown_html(text: str) -> str:
+    rendered = nh3.clean(_MARKDOWN.render(text), tags=_ALLOWED_TAGS, attributes=_ALLOWED_ATTRIBUTES,
+                         url_schemes=_URL_SCHEMES, link_rel="noopener noreferrer nofollow")
+    # One line, for the same reason as in _code_block
+    return rendered.strip().replace("\n", "&#10;")
+
+
+def format_message(sender: str, text: str) -> str:
+    """Sanitized chat bubble HTML for one message."""
+    css_class = "user-message" if sender == "user" else "bot-message"
+    if sender != "user":
+        body = _markdown_html(text)
+    elif text.startswith(CODE_HEADERS):
+        header, _, code = text.partition("\n")
+        body = _text_html(header) + _code_block(code)
+    else:
+        parts = _FENCE.split(text)  # odd positions are the insides of ``` fences
+        body = "".join(_code_block(part) if i % 2 else _text_html(part) for i, part in enumerate(parts))
+    return f'<div class="chat-message {css_class}">{body}</div>'
+
+
+class ChatHtmlCache:
+    """Message ID → rendered HTML, least recently used entries dropped beyond `maxsize`."""
+
+    def __init__(self, maxsize: int):
+        self._lock = threading.Lock()
+        self._html = LRUCache(maxsize=maxsize)
+
+    def message_html(self, message) -> str:
+        with self._lock:
+            cached = self._html.get(message.id)
+        if cached is not None:
+            metrics.inc("chat_html_cache_total", result="hit")
+            return cached
+        metrics.inc("chat_html_cache_total", result="miss")
+        rendered = format_message(message.sender, message.message)
+        with self._lock:
+            self._html[message.id] = rendered
+        return rendered
+
+    def window_html(self, messages) -> str:
+        """The messages' HTML inside the chat's flex column, as one element."""
+        return ("<div class='chat-background-area'>"
+                + "".join(self.message_html(message) for message in messages) + "</div>")
+
+
+chat_html_cache = ChatHtmlCache(CHAT_HTML_CACHE_SIZE)
+
+
+def window_start(history_length: int, shown: int) -> int:
+    """Index of the first message to draw when the newest `shown` messages are visible."""
+    return max(0, history_length - shown)
@@ -0,0 +1,350 @@
+"""
+Sandboxed evaluation of submitted code answers.
+
+Each submission runs against its question's test cases (standalone Python `assert`
+statements) in a fresh interpreter process inside a sandbox: an unprivileged uid
+(nobody), no network, its own PID namespace, and a root filesystem that holds only the
+system libraries and the Python install, read-only. The harness then sets CPU, memory,
+file-size and process limits on itself before running any candidate code, and the parent
+enforces a wall-clock limit. At most EVAL_WORKERS submissions run at once;
+`submit_evaluation` returns immediately with a Future so the screening UI never waits on it.
+
+The sandbox is bubblewrap (`bwrap`) if it is installed, else util-linux `unshare` plus
+`chroot` when the app runs as root. Without either, submissions are not run (status
+"skipped") unless EVAL_SANDBOX=none explicitly allows plain, unisolated processes for
+local development.
+"""
+import functools
+import json
+import logging
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+# "auto" (bwrap, then unshare), "bwrap", "unshare" or "none" (no isolation; development only)
+EVAL_SANDBOX = os.getenv("EVAL_SANDBOX", "auto")
+EVAL_SANDBOX_UID = int(os.getenv("EVAL_SANDBOX_UID", "65534"))  # nobody
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "2"))
+EVAL_TIMEOUT_SECONDS = float(os.getenv("EVAL_TIMEOUT_SECONDS", "10"))
+EVAL_CPU_SECONDS = int(os.getenv("EVAL_CPU_SECONDS", "5"))
+EVAL_MEMORY_MB = int(os.getenv("EVAL_MEMORY_MB", "256"))
+EVAL_MAX_OUTPUT_BYTES = 64 * 1024
+
+SUPPORTED_LANGUAGES = {"python", "py", ""}
+# Exit codes that mean the CPU limit was hit (SIGXCPU at the soft limit, SIGKILL at the hard
+# one), as a signal status or as the shell's 128 + signal number under the unshare sandbox
+_CPU_LIMIT_SIGNALS = {code for name in ("SIGXCPU", "SIGKILL") if hasattr(signal, name)
+                      for code in (-getattr(signal, name), 128 + getattr(signal, name))}
+ANSWER_HEADERS = ("--- CODE FROM EDITOR ---", "--- CODE FROM FILE ---")
+
+# Runs inside the sandbox. Everything lives in `run`'s locals, so the submission can't reach
+# the job or the result pipe through `__main__`: the job comes in on stdin (closed once read),
+# and the result goes out through a pipe the parent passes by fd number, which the harness
+# moves to a random descriptor before any candidate code runs. The harness also keeps its own
+# references to the functions it needs, and each test gets a fresh copy of the submission's
+# namespace with the original builtins. Errors are reported by exception type only: their
+# messages are chosen by the candidate's code and must not reach the feedback prompt.
+# Code running in the same interpreter can still go looking for the pipe or game `==`, so
+# the results are evidence for the feedback prompt, not proof.
+_HARNESS = r'''
+import builtins, json, os, random, sys, time
+
+def run(report_fd):
+    with open(0, "rb") as stdin:
+        job = json.loads(stdin.read())
+    code, tests, limits = job["code"], job["tests"], job["limits"]
+    del job
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    # Move the report pipe to an unguessable descriptor (RLIMIT_NOFILE only limits new ones)
+    hard_limit = 1024
+    if resource is not None:
+        hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
+        if hard_limit == resource.RLIM_INFINITY:
+            hard_limit = 1 << 16
+    private_fd = os.dup2(report_fd, random.SystemRandom().randrange(256, max(257, min(hard_limit, 1 << 16))))
+    os.close(report_fd)
+    if resource is not None:
+        for name, value in limits.items():
+            if hasattr(resource, name):
+                resource.setrlimit(getattr(resource, name), (value, value))
+    clean_builtins = dict(vars(builtins))
+    _compile, _exec, _dict, _type, _round, _open = compile, exec, dict, type, round, open
+    _dumps, _perf_counter = json.dumps, time.perf_counter
+
+    results, setup_error = [], ""
+    namespace = {"__name__": "__submission__", "__builtins__": _dict(clean_builtins)}
+    try:
+        _exec(_compile(code, "<submission>", "exec"), namespace)
+    except BaseException as e:
+        setup_error = _type(e).__name__
+    for test in tests:
+        if setup_error:
+            results.append({"passed": False, "error": "not run", "runtime_ms": 0.0})
+            continue
+        scope = _dict(namespace)
+        scope["__builtins__"] = _dict(clean_builtins)
+        started = _perf_counter()
+        try:
+            _exec(_compile(test, "<test>", "exec"), scope)
+            error = ""
+        except BaseException as e:
+            error = _type(e).__name__
+        results.append({"passed": not error, "error": error, "runtime_ms": _round((_perf_counter() - started) * 1000, 3)})
+    with _open(private_fd, "w", encoding="utf-8") as report:
+        report.write(_dumps({"setup_error": setup_error, "tests": results}))
+
+run(int(sys.argv[1]))
+'''
+
+
+@dataclass
+class EvaluationResult:
+    status: str  # "passed", "failed", "error", "timeout" or "skipped"
+    passed: int = 0
+    total: int = 0
+    runtime_ms: float = 0.0
+    error: str = ""
+    tests: list = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def extract_code(answer: str) -> str:
+    """Strips the "--- CODE FROM EDITOR/FILE ---" header the UI puts in front of code answers."""
+    for header in ANSWER_HEADERS:
+        if answer.startswith(header):
+            return answer[len(header):].lstrip("\n")
+    return answer
+
+
+def _resource_limits() -> dict:
+    """The rlimits the harness sets on itself (by `resource` constant name) before running candidate code."""
+    memory = EVAL_MEMORY_MB * 1024 * 1024
+    return {"RLIMIT_CPU": EVAL_CPU_SECONDS, "RLIMIT_AS": memory, "RLIMIT_FSIZE": 0, "RLIMIT_NOFILE": 16,
+            "RLIMIT_CORE": 0, "RLIMIT_NPROC": 0}
+
+
+# Error names reported by the harness; anything else is replaced (it did not come from the harness)
+_ERROR_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,79}|not run")
+
+
+def _error_name(error: str) -> str:
+    return error if not error or _ERROR_NAME.fullmatch(error) else "Error"
+
+
+def _read_only_paths() -> list:
+    """Host paths visible (read-only) inside the sandbox: system libraries plus the Python install."""
+    paths = ["/usr", "/bin", "/lib", "/lib32", "/lib64"]
+    for prefix in (sys.base_prefix, sys.prefix, os.path.dirname(os.path.dirname(os.path.realpath(sys.executable)))):
+        if prefix not in paths and not any(prefix.startswith(p + "/") for p in paths):
+            paths.append(prefix)
+    return [p for p in paths if os.path.lexists(p)]
+
+
+def _bwrap_command(python: list) -> list:
+    command = ["bwrap", "--unshare-all", "--die-with-parent", "--new-session", "--clearenv",
+               "--uid", str(EVAL_SANDBOX_UID), "--gid", str(EVAL_SANDBOX_UID)]
+    for path in _read_only_paths():
+        if os.path.islink(path):
+            command += ["--symlink", os.readlink(path), path]
+        else:
+            command += ["--ro-bind", path, path]
+    return command + ["--proc", "/proc", "--dev", "/dev", "--tmpfs", "/tmp", "--chdir", "/tmp", *python]
+
+
+# Runs as root in fresh mount/PID/network namespaces: builds a tmpfs root with read-only binds
+# of the paths given as arguments, then chroots into it as the sandbox uid and runs the harness
+_UNSHARE_SETUP = r'''
+set -e
+uid=$1; shift
+mount --make-rprivate /
+mount -t tmpfs -o size=16m,mode=755 hiremate-sandbox /mnt
+while [ "$1" != "--" ]; do
+    if [ -L "$1" ]; then
+        mkdir -p "/mnt$(dirname "$1")"
+        ln -s "$(readlink "$1")" "/mnt$1"
+    else
+        mkdir -p "/mnt$1"
+        mount --bind "$1" "/mnt$1"
+        mount -o remount,bind,ro,nosuid,nodev "/mnt$1"
+    fi
+    shift
+done
+shift
+mkdir -p /mnt/proc /mnt/tmp
+chmod 1777 /mnt/tmp
+mount -t proc -o nosuid,nodev,noexec proc /mnt/proc
+# Not exec'd: the harness must not be the namespace's init, which ignores SIGXCPU
+chroot --userspec="$uid:$uid" /mnt "$@"
+'''
+
+
+def _unshare_command(python: list) -> list:
+    return ["unshare", "--mount", "--net", "--pid", "--ipc", "--uts", "--fork", "--kill-child", "--",
+            "/bin/sh", "-c", _UNSHARE_SETUP, "hiremate-sandbox", str(EVAL_SANDBOX_UID),
+            *_read_only_paths(), "--", *python]
+
+
+def _sandboxed(python: list):
+    """`python` wrapped in the configured sandbox, or None if no working sandbox is available."""
+    wrapper = _sandbox_wrapper()
+    return wrapper(python) if wrapper is not None else None
+
+
+@functools.lru_cache(maxsize=1)
+def _sandbox_wrapper():
+    """Picks the sandbox per EVAL_SANDBOX and checks once that it actually starts here."""
+    if EVAL_SANDBOX == "none":
+        logger.warning("Code evaluation: EVAL_SANDBOX=none, submissions run without isolation.")
+        return lambda python: python
+    candidates = []
+    if EVAL_SANDBOX in ("auto", "bwrap") and shutil.which("bwrap"):
+        candidates.append(_bwrap_command)
+    if EVAL_SANDBOX in ("auto", "unshare") and shutil.which("unshare") and os.name == "posix" and os.geteuid() == 0:
+        candidates.append(_unshare_command)
+    for wrapper in candidates:
+        probe = wrapper([sys.executable, "-I", "-S", "-c", "import os; print(os.getuid())"])
+        try:
+            proc = subprocess.run(probe, capture_output=True, text=True, timeout=EVAL_TIMEOUT_SECONDS, start_new_session=True)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning("Code evaluation: %s sandbox unavailable: %s", wrapper.__name__, e)
+            continue
+        if proc.returncode == 0 and proc.stdout.strip() == str(EVAL_SANDBOX_UID):
+            return wrapper
+        logger.warning("Code evaluation: %s sandbox unavailable: %s", wrapper.__name__, proc.stderr.strip()[-300:])
+    logger.error("Code evaluation: no sandbox available (install bubblewrap); submissions will not be run.")
+    return None
+
+
+def _read_report(fd: int, chunks: list) -> None:
+    """Drains the harness's report pipe into `chunks` (at most EVAL_MAX_OUTPUT_BYTES are kept)."""
+    size = 0
+    with open(fd, "rb") as pipe:
+        while chunk := pipe.read(65536):
+            if size < EVAL_MAX_OUTPUT_BYTES:
+                chunks.append(chunk[:EVAL_MAX_OUTPUT_BYTES - size])
+            size += len(chunk)
+
+
+def evaluate_submission(answer: str, tests: list, language: str = "python") -> EvaluationResult:
+    """
+    Runs one code answer against `tests` in a sandboxed interpreter and returns the
+    structured outcome. Blocks for at most EVAL_TIMEOUT_SECONDS.
+    """
+    if (language or "").lower() not in SUPPORTED_LANGUAGES:
+        return EvaluationResult("skipped", error=f"No sandbox for {language}")
+    if not tests:
+        return EvaluationResult("skipped", error="No test cases for this question")
+
+    read_fd, write_fd = os.pipe()
+    command = _sandboxed([sys.executable, "-I", "-S", "-c", _HARNESS, str(write_fd)])
+    if command is None:
+        os.close(read_fd)
+        os.close(write_fd)
+        metrics.inc("code_eval_results_total", status="skipped")
+        return EvaluationResult("skipped", error="No code sandbox available")
+
+    job = json.dumps({"code": extract_code(answer), "tests": list(tests), "limits": _resource_limits()})
+    report = []
+    reader = threading.Thread(target=_read_report, args=(read_fd, report), name="code-eval-report", daemon=True)
+    started = time.perf_counter()
+    with metrics.span("code_eval"):
+        try:
+            # The candidate's own output is discarded; only the report pipe is read
+            proc = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, pass_fds=(write_fd,),
+                env={"PATH": "/usr/sbin:/usr/bin:/sbin:/bin", "PYTHONHASHSEED": "0"}, start_new_session=True,
+            )
+        finally:
+            os.close(write_fd)
+        reader.start()
+        try:
+            proc.communicate(job.encode("utf-8"), timeout=EVAL_TIMEOUT_SECONDS)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            result = EvaluationResult("timeout", total=len(tests), runtime_ms=EVAL_TIMEOUT_SECONDS * 1000,
+                                      error=f"Timed out after {EVAL_TIMEOUT_SECONDS:g}s")
+            metrics.inc("code_eval_results_total", status=result.status)
+            return result
+        finally:
+            reader.join(timeout=1)
+    runtime_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    try:
+        parsed = json.loads(b"".join(report)) if report else None
+        results = parsed["tests"] if len(parsed["tests"]) == len(tests) else None
+    except (ValueError, TypeError, KeyError):
+        parsed = results = None
+    if results is None and proc.returncode in _CPU_LIMIT_SIGNALS:
+        result = EvaluationResult("timeout", total=len(tests), runtime_ms=runtime_ms, error=f"CPU limit of {EVAL_CPU_SECONDS}s exceeded")
+    elif results is None:
+        # The sandbox died before the harness could report (e.g. the memory limit hit during
+        # startup); only the exit code is kept, the candidate's output never is
+        result = EvaluationResult("error", total=len(tests), runtime_ms=runtime_ms, error=f"Sandbox exited with code {proc.returncode}")
+    else:
+        tests_run = [{"test": test, "passed": t.get("passed") is True, "error": _error_name(str(t.get("error", ""))),
+                      "runtime_ms": float(t.get("runtime_ms", 0.0))}
+                     for test, t in zip(tests, (r if isinstance(r, dict) else {} for r in results))]
+        passed = sum(1 for t in tests_run if t["passed"])
+        setup_error = _error_name(str(parsed.get("setup_error", "")))
+        status = "error" if setup_error else ("passed" if passed == len(tests) else "failed")
+        result = EvaluationResult(status, passed, len(tests), runtime_ms, setup_error, tests_run)
+    metrics.inc("code_eval_results_total", status=result.status)
+    return result
+
+
+_eval_executor = ThreadPoolExecutor(max_workers=EVAL_WORKERS, thread_name_prefix="code-eval")
+
+
+def submit_evaluation(answer: str, tests: list, language: str = "python"):
+    """Queues `evaluate_submission` on the bounded evaluation pool and returns its Future."""
+    return _eval_executor.submit(evaluate_submission, answer, tests, language)
+
+
+def collect_evaluations(futures: dict, timeout: float = EVAL_TIMEOUT_SECONDS) -> dict:
+    """
+    Waits (up to `timeout` overall) for {response index: Future} evaluations and returns
+    {response index: result dict}. Evaluations still running are left out.
+    """
+    deadline = time.monotonic() + timeout
+    results = {}
+    for index, future in futures.items():
+        try:
+            results[index] = future.result(timeout=max(0.0, deadline - time.monotonic())).to_dict()
+        except Exception:
+            continue
+    return results
+
+
+def summarize_evaluation(result: dict) -> str:
+    """One- or two-line summary of an evaluation result (as a dict) for the feedback prompt."""
+    status = result["status"]
+    if status == "skipped":
+        return ""
+    if status == "timeout":
+        return f"Automated tests: timed out ({result['error']})."
+    if status == "error" and not result["tests"]:
+        return f"Automated tests: could not run ({result['error']})."
+    summary = f"Automated tests: {result['passed']}/{result['total']} passed."
+    if result["error"]:
+        summary += f" The code raised on load: {result['error']}."
+    failures = [f"`{t['test']}` ({t['error'] or 'failed'})" for t in result["tests"] if not t["passed"]][:3]
+    if failures and not result["error"]:
+        summary += " Failing: " + "; ".join(failures) + "."
+    return summary
@@ -0,0 +1,300 @@
+"""
+Streamlit-free state machine for the HireMate screening conversation.
+
+The engine is a pure function: `transition(state, event)` returns the new state plus the
+list of side effects the caller has to run (send a message, call the LLM, save the
+profile, ...). Slow effects report their outcome back as another event. The Streamlit
+UI in app.py is one such caller; benchmarks can drive the same engine headlessly.
+
+Stages: name → email → currentLocation → phoneNumber → experience → positions_select →
+techStack → awaitingQuestionsConsent → askingQuestion → completed → final_confirmation
+(or exit at any point). Feedback is generated by a background job after the profile is
+saved and arrives as a `FeedbackReady` event in final_confirmation.
+"""
+import re
+from dataclasses import dataclass, field, replace
+
+JOB_OPTIONS = ["Software Engineer", "Data Scientist", "Product Manager", "UX Designer", "DevOps Engineer", "Cloud Architect", "Cybersecurity Analyst", "Other"]
+EXIT_COMMANDS = ["exit", "quit"]
+CONSENT_REPLIES = ["ok", "yes", "ready", "sure"]
+# Stages whose input comes from a dedicated widget rather than the chat box
+WIDGET_STAGES = ["positions_select", "phoneNumber", "experience"]
+EMAIL_PATTERN = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+
+WELCOME_MESSAGES = [
+    "Hello! Welcome to HireMate’s Hiring Assistant. Please note: All data you provide will be used solely for this simulated hiring process and handled with care.",
+    "May I have your full name? (You can type 'exit' anytime to end the conversation)",
+]
+SUBMITTED_MESSAGE = "✅ Your profile has been successfully submitted! I'm preparing personalized feedback on your technical answers; it will appear here in a moment."
+FEEDBACK_PREFIX = "Here is some feedback based on your technical answers to help you prepare for future interviews:\n\n"
+FEEDBACK_SUFFIX = "\n\nA recruiter will be in touch if your profile matches our requirements. Thank you! You can now type 'exit' to end."
+
+
+def new_candidate_info() -> dict:
+    return {
+        "fullName": "", "email": "", "currentLocation": "",
+        "phoneNumber": "", "yearsExperience": "", "desiredPositions": "",
+        "techStack": "", "technicalResponses": [], "saved_to_firestore": False
+    }
+
+
+# Questions are dicts with "text", "type" ("theory" or "code"), "language" and "difficulty"
+
+def is_coding_question(question: dict) -> bool:
+    return question["type"] == "code"
+
+
+def question_text(question: dict) -> str:
+    """Question as shown to the candidate."""
+    return question["text"]
+
+
+@dataclass
+class InterviewState:
+    stage: str = "name"
+    candidate_info: dict = field(default_factory=new_candidate_info)
+    technical_questions: list = field(default_factory=list)
+    current_question_index: int = 0
+    profile_id: str = ""
+
+    @property
+    def current_question(self):
+        if self.stage == "askingQuestion" and self.technical_questions:
+            return self.technical_questions[self.current_question_index]
+        return None
+
+    @property
+    def awaiting_code_answer(self) -> bool:
+        question = self.current_question
+        return question is not None and is_coding_question(question)
+
+
+# Events: things that happened, either in the UI or as the outcome of a slow effect
+
+@dataclass(frozen=True)
+class UserMessage:
+    text: str
+
+@dataclass(frozen=True)
+class PhoneConfirmed:
+    phone: str
+
+@dataclass(frozen=True)
+class ExperienceConfirmed:
+    years: int
+
+@dataclass(frozen=True)
+class PositionSelected:
+    position: str
+
+@dataclass(frozen=True)
+class CodeSubmitted:
+    answer: str
+
+@dataclass(frozen=True)
+class SaveRequested:
+    pass
+
+@dataclass(frozen=True)
+class QuestionsReady:
+    questions: list
+    error: str = ""
+
+@dataclass(frozen=True)
+class ProfileSaved:
+    ok: bool
+    error: str = ""
+    profile_id: str = ""
+
+@dataclass(frozen=True)
+class FeedbackReady:
+    ok: bool
+    feedback: str = ""
+
+@dataclass(frozen=True)
+class ContextualReplyReady:
+    ok: bool
+
+
+# Effects: work the caller has to do. Effects marked slow report back with an event.
+
+@dataclass(frozen=True)
+class SendMessage:
+    sender: str
+    text: str
+
+@dataclass(frozen=True)
+class PrefetchQuestions:
+    desired_position: str
+    years_experience: object
+    tech_stack: str
+
+@dataclass(frozen=True)
+class CancelPrefetch:
+    pass
+
+@dataclass(frozen=True)
+class EvaluateCode:
+    """Starts sandboxed test runs for a code answer in the background; results are used for feedback."""
+    response_index: int
+    answer: str
+    language: str
+    tests: tuple
+
+@dataclass(frozen=True)
+class GenerateQuestions:
+    """Slow. Reports `QuestionsReady`."""
+    desired_position: str
+    years_experience: object
+    tech_stack: str
+
+@dataclass(frozen=True)
+class SaveProfile:
+    """Slow. Reports `ProfileSaved`."""
+    candidate_info: dict
+
+@dataclass(frozen=True)
+class RequestFeedback:
+    """Queues the background feedback job for a saved profile; its result is reported as `FeedbackReady`."""
+    candidate_info: dict
+    profile_id: str
+
+@dataclass(frozen=True)
+class ContextualReply:
+    """Slow. Replies to the latest chat message (`question`) itself, then reports `ContextualReplyReady`."""
+    question: str
+
+
+SLOW_EFFECTS = (GenerateQuestions, SaveProfile, ContextualReply)
+
+
+def start_interview():
+    """Returns the initial state and the greeting effects for a new session."""
+    return InterviewState(), [SendMessage("bot", message) for message in WELCOME_MESSAGES]
+
+
+def _bot(text: str) -> SendMessage:
+    return SendMessage("bot", text)
+
+
+def _with_info(state: InterviewState, **updates) -> InterviewState:
+    """Copy of `state` with `candidate_info` updated (the original is left untouched)."""
+    info = dict(state.candidate_info)
+    info.update(updates)
+    return replace(state, candidate_info=info)
+
+
+def _record_answer(state: InterviewState, answer: str):
+    responses = state.candidate_info["technicalResponses"] + [{"question": question_text(state.current_question), "answer": answer}]
+    state = _with_info(state, technicalResponses=responses)
+    next_idx = state.current_question_index + 1
+    if next_idx < len(state.technical_questions):
+        state = replace(state, current_question_index=next_idx)
+        return state, [_bot(f"Thank you. Next question: {question_text(state.technical_questions[next_idx])}")]
+    state = replace(state, stage="completed")
+    return state, [_bot(f"Thank you. That concludes the technical assessment, {state.candidate_info['fullName']}! Please review your information and click 'Save and Submit Profile'.")]
+
+
+def _on_user_message(state: InterviewState, text: str):
+    text = text.strip()
+    effects = [SendMessage("user", text)]
+    stage = state.stage
+
+    if text.lower() in EXIT_COMMANDS:
+        return replace(state, stage="exit"), effects + [CancelPrefetch(), _bot("Exiting conversation. Goodbye!")]
+
+    if stage == "name":
+        return replace(_with_info(state, fullName=text), stage="email"), effects + [_bot("Great! Now, please enter your official email ID.")]
+    if stage == "email":
+        if EMAIL_PATTERN.match(text):
+            return replace(_with_info(state, email=text), stage="currentLocation"), effects + [_bot("Please enter your current location (e.g., City, Country).")]
+        return state, effects + [_bot("That doesn't look like a valid email. Please provide a valid email address.")]
+    if stage == "currentLocation":
+        return replace(_with_info(state, currentLocation=text), stage="phoneNumber"), effects + [_bot("Understood. Now, please enter your contact number.")]
+    if stage == "techStack":
+        state = replace(_with_info(state, techStack=text), stage="awaitingQuestionsConsent")
+        info = state.candidate_info
+        return state, effects + [
+            _bot(f"Great, {info['fullName']}! I'll now generate 3 technical questions based on your profile. If you are ready, please say 'OK' or 'yes'."),
+            PrefetchQuestions(info["desiredPositions"], info["yearsExperience"], info["techStack"]),
+        ]
+    if stage == "awaitingQuestionsConsent":
+        if text.lower() in CONSENT_REPLIES:
+            info = state.candidate_info
+            return state, effects + [
+                _bot("Okay, generating technical questions..."),
+                GenerateQuestions(info["desiredPositions"], info["yearsExperience"], info["techStack"]),
+            ]
+        return state, effects + [_bot("Please type 'OK' or 'yes' when you are ready.")]
+    if stage == "askingQuestion" and not state.awaiting_code_answer:
+        new_state, answer_effects = _record_answer(state, text)
+        return new_state, effects + answer_effects
+
+    # Anything else is an off-script question for the LLM
+    return state, effects + [ContextualReply(text)]
+
+
+def transition(state: InterviewState, event):
+    """
+    Applies `event` to `state`.
+
+    Returns:
+        tuple: (new InterviewState, list of effects to run in order).
+    """
+    if isinstance(event, UserMessage):
+        return _on_user_message(state, event.text)
+
+    if isinstance(event, PhoneConfirmed) and state.stage == "phoneNumber":
+        return replace(_with_info(state, phoneNumber=event.phone), stage="experience"), [
+            SendMessage("user", event.phone),
+            _bot("Thank you. And how many years of professional experience do you have?"),
+        ]
+
+    if isinstance(event, ExperienceConfirmed) and state.stage == "experience":
+        return replace(_with_info(state, yearsExperience=int(event.years)), stage="positions_select"), [
+            SendMessage("user", str(event.years)),
+            _bot("Which primary job role are you interested in?"),
+        ]
+
+    if isinstance(event, PositionSelected) and state.stage == "positions_select":
+        return replace(_with_info(state, desiredPositions=event.position), stage="techStack"), [
+            SendMessage("user", f"I'm interested in: {event.position}"),
+            _bot("Thank you. In which primary tech stack are you proficient? (e.g., Python, React, Java, AWS)"),
+        ]
+
+    if isinstance(event, CodeSubmitted) and state.awaiting_code_answer:
+        question = state.current_question
+        evaluate = EvaluateCode(len(state.candidate_info["technicalResponses"]), event.answer,
+                                question.get("language", ""), tuple(question.get("tests") or ()))
+        new_state, answer_effects = _record_answer(state, event.answer)
+        return new_state, [SendMessage("user", event.answer), evaluate] + answer_effects
+
+    if isinstance(event, QuestionsReady):
+        if event.error:
+            return replace(state, stage="techStack"), [_bot("Sorry, an error occurred. Let's try your tech stack again.")]
+        if not event.questions:
+            return replace(state, stage="techStack"), [_bot("I had trouble generating questions. Could you please try re-entering your tech stack with more specific terms?")]
+        state = replace(state, stage="askingQuestion", technical_questions=list(event.questions), current_question_index=0)
+        return state, [_bot(f"Okay, let's start with the first question: {question_text(state.technical_questions[0])}")]
+
+    if isinstance(event, SaveRequested) and state.stage == "completed" and not state.candidate_info["saved_to_firestore"]:
+        return state, [_bot("Submitting your profile..."), SaveProfile(dict(state.candidate_info))]
+
+    if isinstance(event, ProfileSaved):
+        if event.ok:
+            state = replace(_with_info(state, saved_to_firestore=True), profile_id=event.profile_id, stage="final_confirmation")
+            return state, [_bot(SUBMITTED_MESSAGE), RequestFeedback(dict(state.candidate_info), event.profile_id)]
+        if event.error:
+            return replace(state, stage="completed"), [_bot(f"❌ {event.error}")]
+        return replace(state, stage="completed"), [_bot("❌ Failed to save profile. Please try again.")]
+
+    if isinstance(event, FeedbackReady):
+        if event.ok:
+            return state, [_bot(FEEDBACK_PREFIX + event.feedback + FEEDBACK_SUFFIX)]
+        return state, [_bot("I had trouble generating feedback, but your profile was saved successfully. Thank you!")]
+
+    if isinstance(event, ContextualReplyReady) and not event.ok:
+        return state, [_bot("I'm sorry, I had a little trouble understanding that. Could you please rephrase?")]
+
+    # Events that don't apply to the current stage are ignored
+    return state, []
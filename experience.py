@@ -0,0 +1,27 @@
+"""
+Experience buckets.
+
+Candidates with similar experience share generated content (question sets, the question
+bank) and recruiters filter profiles by the same buckets, so the mapping lives here where
+both the LLM layer and the persistence layer can import it without importing each other.
+"""
+
+EXPERIENCE_BUCKETS = ("entry", "mid", "senior", "staff", "unknown")
+
+
+def experience_bucket(years_experience) -> str:
+    """
+    Maps a raw years-of-experience value onto a coarse seniority bucket so that
+    candidates with similar experience share generated content.
+    """
+    try:
+        years = int(years_experience)
+    except (TypeError, ValueError):
+        return "unknown"
+    if years <= 1:
+        return "entry"
+    if years <= 4:
+        return "mid"
+    if years <= 9:
+        return "senior"
+    return "staff"
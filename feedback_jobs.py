@@ -0,0 +1,256 @@
+"""
+Background feedback generation.
+
+Saving a profile enqueues a feedback job instead of blocking the session on a long
+Gemini call. Jobs are durable SQLite records processed by a small worker pool: failed
+attempts are retried with jittered backoff, jobs interrupted by a restart are picked up
+again, and the finished feedback is merged into the candidate's profile document. The
+chat polls `feedback_queue.get(job_id)` for the result.
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from dataclasses import asdict
+
+from code_eval import collect_evaluations, evaluate_submission, summarize_evaluation
+from firebase_service import enqueue_profile_update
+import local_backend
+from llm_service import build_feedback_prompt, generate_text
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_JOBS_DB = os.getenv("FEEDBACK_JOBS_DB", ".feedback_jobs.sqlite3")
+FEEDBACK_WORKERS = int(os.getenv("FEEDBACK_WORKERS", "2"))
+FEEDBACK_MAX_ATTEMPTS = int(os.getenv("FEEDBACK_MAX_ATTEMPTS", "3"))
+FEEDBACK_RETRY_BASE_SECONDS = float(os.getenv("FEEDBACK_RETRY_BASE_SECONDS", "2"))
+FEEDBACK_RETRY_MAX_SECONDS = float(os.getenv("FEEDBACK_RETRY_MAX_SECONDS", "60"))
+# Finished jobs are kept this long so a reconnecting session can still pick up its result
+FEEDBACK_JOB_RETENTION_SECONDS = int(os.getenv("FEEDBACK_JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,              -- queued | running | done | failed
+    payload TEXT NOT NULL,             -- JSON
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, next_attempt_at);
+"""
+
+
+class JobQueue:
+    """
+    Durable local job queue: SQLite job records plus a pool of worker threads that call
+    `handler(payload, db_client)` and store its (string) result.
+
+    Like the profile write queue, the Firestore client is bound by the first `start` or
+    `enqueue`; workers only run once a client is available.
+    """
+
+    def __init__(self, db_path: str, handler, workers: int, max_attempts: int,
+                 retry_base_seconds: float, retry_max_seconds: float, retention_seconds: int):
+        self.db_path = db_path
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.retention_seconds = retention_seconds
+        self._db_client = None
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._schema_ready = False
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self) -> sqlite3.Connection:
+        """This thread's connection, creating the tables first if this process hasn't yet."""
+        conn = self._conn()
+        if not self._schema_ready:
+            with self._cond:
+                if not self._schema_ready:
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def start(self, db_client) -> None:
+        """Binds the Firestore client, requeues interrupted jobs and starts the workers (idempotent)."""
+        with self._cond:
+            if self._db_client is None:
+                self._db_client = db_client
+            if self._threads:
+                return
+            conn = self._conn()
+            conn.executescript(_SCHEMA)
+            self._schema_ready = True
+            now = time.time()
+            # Jobs left "running" by a previous process never finished; run them again
+            conn.execute("UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'", (now,))
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (now - self.retention_seconds,))
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"feedback-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, db_client, payload: dict) -> str:
+        """Stores a new job and returns its ID; a worker picks it up right away."""
+        self.start(db_client)
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, status, payload, created_at, updated_at, next_attempt_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, json.dumps(payload), now, now, now))
+        metrics.inc("feedback_jobs_total", event="enqueued")
+        with self._cond:
+            self._cond.notify()
+        return job_id
+
+    def get(self, job_id: str):
+        """
+        Returns {"status", "result", "error", "attempts"} for a job, or None if it is unknown
+        (e.g. a resumed session whose job ran on a replica with another FEEDBACK_JOBS_DB).
+        Works before `start`; the job only progresses once the workers run.
+        """
+        row = self._ensure_schema().execute("SELECT status, result, error, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def stats(self) -> dict:
+        """Job counts by status (empty until the queue has started)."""
+        if not self._threads:
+            return {}
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def wait(self, job_id: str, timeout: float):
+        """Polls until the job is done or failed (or `timeout` passes) and returns `get(job_id)`."""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job and job["status"] not in ("done", "failed") and time.monotonic() < deadline:
+            time.sleep(0.05)
+            job = self.get(job_id)
+        return job
+
+    def _claim(self):
+        """Atomically marks the oldest ready job as running and returns (id, payload, attempts)."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM jobs WHERE status = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT 1", (time.time(),)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                             (time.time(), row["id"]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return (row["id"], json.loads(row["payload"]), row["attempts"] + 1) if row else None
+
+    def _next_ready_in(self) -> float:
+        row = self._conn().execute("SELECT MIN(next_attempt_at) FROM jobs WHERE status = 'queued'").fetchone()
+        return max(0.05, min(5.0, row[0] - time.time())) if row and row[0] is not None else 5.0
+
+    def _run(self) -> None:
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.warning("Feedback jobs: could not claim a job: %s", e)
+                job = None
+            if job is None:
+                with self._cond:
+                    self._cond.wait(self._next_ready_in())
+                continue
+
+            job_id, payload, attempt = job
+            try:
+                with metrics.span("feedback_job"):
+                    result = self.handler(payload, self._db_client)
+            except Exception as e:
+                if attempt >= self.max_attempts:
+                    self._conn().execute("UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                                         (str(e), time.time(), job_id))
+                    metrics.inc("feedback_jobs_total", event="failed")
+                    logger.warning("Feedback jobs: job %s failed after %d attempts: %s", job_id, attempt, e)
+                else:
+                    delay = random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * (2 ** attempt)))
+                    self._conn().execute(
+                        "UPDATE jobs SET status = 'queued', error = ?, updated_at = ?, next_attempt_at = ? WHERE id = ?",
+                        (str(e), time.time(), time.time() + delay, job_id))
+                    metrics.inc("feedback_jobs_total", event="retried")
+                continue
+
+            self._conn().execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                                 (result, time.time(), job_id))
+            metrics.inc("feedback_jobs_total", event="done")
+
+
+def build_feedback_payload(candidate_info: dict, app_id: str, user_id: str, profile_id: str,
+                           code_submissions: dict, code_evaluations: dict) -> dict:
+    """
+    Builds a feedback job payload. `code_submissions` maps response indexes to the
+    EvaluateCode effects and `code_evaluations` to their Futures; finished evaluations go in
+    as summaries, unfinished ones as submissions the job evaluates itself.
+    """
+    finished = collect_evaluations(code_evaluations, timeout=0)
+    return {
+        "fullName": candidate_info["fullName"],
+        "desiredPositions": candidate_info["desiredPositions"],
+        "technicalResponses": candidate_info["technicalResponses"],
+        "app_id": app_id,
+        "user_id": user_id,
+        "profile_id": profile_id,
+        "evaluations": {str(i): summarize_evaluation(result) for i, result in finished.items()},
+        "pending_evaluations": [asdict(submission) for i, submission in code_submissions.items() if i not in finished],
+    }
+
+
+def run_feedback_job(payload: dict, db_client) -> str:
+    """
+    Generates the feedback for one submitted profile and merges it into the profile document.
+
+    `payload` comes from `build_feedback_payload`.
+    """
+    evaluations = {int(i): summary for i, summary in payload.get("evaluations", {}).items()}
+    for submission in payload.get("pending_evaluations", []):
+        result = evaluate_submission(submission["answer"], submission["tests"], submission["language"])
+        evaluations[submission["response_index"]] = summarize_evaluation(result.to_dict())
+
+    prompt = build_feedback_prompt(payload["fullName"], payload["desiredPositions"], payload["technicalResponses"], evaluations)
+    feedback = generate_text(prompt, task="feedback", fallback=lambda: local_backend.feedback(
+        payload["fullName"], payload["desiredPositions"], payload["technicalResponses"], evaluations))
+    if db_client is not None and payload.get("profile_id"):
+        enqueue_profile_update(db_client, payload["app_id"], payload["user_id"], payload["profile_id"],
+                               {"feedback": feedback, "feedbackGeneratedAt": time.time()})
+    return feedback
+
+
+feedback_queue = JobQueue(
+    FEEDBACK_JOBS_DB, run_feedback_job, FEEDBACK_WORKERS, FEEDBACK_MAX_ATTEMPTS,
+    FEEDBACK_RETRY_BASE_SECONDS, FEEDBACK_RETRY_MAX_SECONDS, FEEDBACK_JOB_RETENTION_SECONDS
+)
+
+
+metrics.register_collector(lambda: {("feedback_jobs", {"status": status}): count for status, count in feedback_queue.stats().items()})
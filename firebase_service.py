@@ -1,40 +1,130 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
+# firebase_admin and the Firestore client library are imported where they are first used:
+# together they take a few hundred milliseconds and aren't needed for the first page load
+import csv
+import functools
 import json
+import logging
+import os
+import random
+import threading
+import time
 import streamlit as st
 import base64
+from cachetools import TTLCache
+from metrics import registry as metrics
+from experience import EXPERIENCE_BUCKETS, experience_bucket
+from tech_stack import canonicalize, strip_version, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Verified ID tokens are cached briefly so new sessions with the same token skip verification
+ID_TOKEN_CACHE_SIZE = int(os.getenv("ID_TOKEN_CACHE_SIZE", "1024"))
+ID_TOKEN_CACHE_TTL_SECONDS = int(os.getenv("ID_TOKEN_CACHE_TTL_SECONDS", "300"))
+
+# Write-behind persistence for candidate profiles
+PROFILE_JOURNAL_DIR = os.getenv("PROFILE_JOURNAL_DIR", ".profile_journal")
+PROFILE_BATCH_SIZE = int(os.getenv("PROFILE_BATCH_SIZE", "50"))  # Firestore allows up to 500 writes per batch
+PROFILE_FLUSH_INTERVAL_SECONDS = float(os.getenv("PROFILE_FLUSH_INTERVAL_SECONDS", "0.5"))
+PROFILE_RETRY_BASE_SECONDS = float(os.getenv("PROFILE_RETRY_BASE_SECONDS", "1"))
+PROFILE_RETRY_MAX_SECONDS = float(os.getenv("PROFILE_RETRY_MAX_SECONDS", "60"))
+# Writes Firestore keeps rejecting (e.g. oversized or forbidden documents) are set aside here
+PROFILE_MAX_ATTEMPTS = int(os.getenv("PROFILE_MAX_ATTEMPTS", "3"))
+PROFILE_DEAD_LETTER_DIR = os.getenv("PROFILE_DEAD_LETTER_DIR", os.path.join(PROFILE_JOURNAL_DIR, "dead_letter"))
+# How long the outcome of a finished write stays available to `get_profile_delivery_status`
+PROFILE_STATUS_TTL_SECONDS = int(os.getenv("PROFILE_STATUS_TTL_SECONDS", "86400"))
+PROFILE_STATUS_CACHE_SIZE = int(os.getenv("PROFILE_STATUS_CACHE_SIZE", "100000"))
+
+# Recruiter read API
+PROFILES_COLLECTION = "candidate_profiles"
+PROFILE_PAGE_SIZE = int(os.getenv("PROFILE_PAGE_SIZE", "200"))
+# Default projection for listings and exports: everything except the large answer/feedback blobs
+PROFILE_SUMMARY_FIELDS = [
+    "fullName", "email", "currentLocation", "phoneNumber", "yearsExperience", "experienceBucket",
+    "desiredPositions", "techStack", "techStackIds", "submittedAt",
+]
+
+# Process-wide Firebase state, shared by every Streamlit session
+_firebase_lock = threading.Lock()
+_db_client = None
+_backend_user_ids = {}  # app_id -> uid of the "backend-service" user
+_verified_tokens = TTLCache(maxsize=ID_TOKEN_CACHE_SIZE, ttl=ID_TOKEN_CACHE_TTL_SECONDS)
+_verified_tokens_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=4)
+def _load_service_account(firebase_config_b64_str: str) -> dict:
+    """Decodes the Base64 service-account JSON (parsed once per distinct config string)."""
+    decoded_bytes = base64.b64decode(firebase_config_b64_str)
+    return json.loads(decoded_bytes.decode("utf-8"))
+
+
+def _get_db_client(firebase_config_b64_str: str):
+    """Initializes the Admin SDK on first use and returns the shared Firestore client."""
+    global _db_client
+    with _firebase_lock:
+        if _db_client is None:
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+            if not firebase_admin._apps:
+                firebase_admin.initialize_app(credentials.Certificate(_load_service_account(firebase_config_b64_str)))
+            _db_client = firestore.client()
+        return _db_client
+
+
+def _verify_id_token(id_token: str) -> str:
+    """
+    Returns the UID for `id_token`. Verified tokens are cached for a short TTL (and never
+    past their own expiry) so repeated sessions with the same token skip re-verification.
+    """
+    with _verified_tokens_lock:
+        cached = _verified_tokens.get(id_token)
+    if cached and cached[1] > time.time():
+        return cached[0]
+    from firebase_admin import auth
+    decoded_token = auth.verify_id_token(id_token)
+    with _verified_tokens_lock:
+        _verified_tokens[id_token] = (decoded_token["uid"], decoded_token.get("exp", float("inf")))
+    return decoded_token["uid"]
+
+
+def _get_backend_user_id(app_id: str) -> str:
+    """
+    Resolves (or creates) the generic "backend-service" user once per process.
+    Raises on failure so the caller can report the error.
+    """
+    with _firebase_lock:
+        user_id = _backend_user_ids.get(app_id)
+        if user_id:
+            return user_id
+        backend_user_email = f"backend-service@{app_id}.app"
+        from firebase_admin import auth
+        try:
+            # Try getting existing user by email
+            user_id = auth.get_user_by_email(backend_user_email).uid
+        except auth.UserNotFoundError:
+            # Create a new backend user
+            user_id = auth.create_user(email=backend_user_email, display_name="Backend Service").uid
+        _backend_user_ids[app_id] = user_id
+        return user_id
+
 
 def initialize_firebase(app_id: str, firebase_config_b64_str: str, initial_auth_token: str):
     """
     Initializes Firebase Admin SDK and returns (db_client, auth_module, user_id, error_message).
-    - If an existing app is initialized, reuses it.
+    - The Firestore client, parsed credentials and backend user ID are cached per process,
+      so only the first session pays for initialization and the Auth API lookup.
     - Decodes FIREBASE_CONFIG_B64 → uses Certificate credentials (no ADC fallback).
-    - Verifies initial_auth_token (ID token) if provided; otherwise creates/uses a generic backend user.
+    - Verifies initial_auth_token (ID token) if provided (with a short TTL cache);
+      otherwise creates/uses a generic backend user.
     """
 
-    # 1) Reuse existing initialized app if present
-    if firebase_admin._apps:
-        try:
-            current_app = firebase_admin.get_app()
-            db_client = firestore.client(app=current_app)
-            # Admin SDK’s auth module itself
-            auth_module = auth    
-            user_id = st.session_state.get("user_id", None)
-            if user_id:
-                return (db_client, auth_module, user_id, None)
-        except Exception:
-            # If something’s inconsistent, fall through to reinitialize
-            pass
-
-    # 2) Decode Base64 service account JSON
+    # 1) Decode Base64 service account JSON
     if not firebase_config_b64_str:
         err = "Firebase Service: FIREBASE_CONFIG_B64 is missing."
         return (None, None, None, err)
 
     try:
-        decoded_bytes = base64.b64decode(firebase_config_b64_str)
-        service_account_info = json.loads(decoded_bytes.decode("utf-8"))
-        cred = credentials.Certificate(service_account_info)
+        _load_service_account(firebase_config_b64_str)
     except (base64.binascii.Error, json.JSONDecodeError, ValueError) as e:
         err = f"Firebase Service: Invalid FIREBASE_CONFIG_B64: {e}"
         return (None, None, None, err)
@@ -42,51 +132,35 @@ def initialize_firebase(app_id: str, firebase_config_b64_str: str, initial_auth_
         err = f"Firebase Service: Error decoding service account: {e}"
         return (None, None, None, err)
 
-    # 3) Initialize Admin SDK
+    # 2) Initialize Admin SDK (once per process)
     try:
-        if not firebase_admin._apps:
-            firebase_admin.initialize_app(cred)
-        db_client = firestore.client()
-        auth_module = auth
+        with metrics.span("firebase_client_init"):
+            db_client = _get_db_client(firebase_config_b64_str)
+        from firebase_admin import auth as auth_module
 
         user_id = None
         auth_error = None
 
-        # 4) Verify ID token if provided
+        # 3) Verify ID token if provided
         if initial_auth_token:
             try:
-                decoded_token = auth_module.verify_id_token(initial_auth_token)
-                user_id = decoded_token["uid"]
+                user_id = _verify_id_token(initial_auth_token)
             except Exception as e:
                 auth_error = f"Token verification failed: {e}. Creating generic backend user."
 
-        # 5) Create or fetch a “backend‐service” user if no valid user_id
+        # 4) Fall back to the shared "backend-service" user if no valid user_id
         if not user_id:
-            backend_user_email = f"backend-service@{app_id}.app"
             try:
-                # Try getting existing user by email
-                user_record = auth_module.get_user_by_email(backend_user_email)
-                user_id = user_record.uid
-            except auth.UserNotFoundError:
-                try:
-                    # Create a new backend user
-                    user_record = auth_module.create_user(
-                        email=backend_user_email,
-                        display_name="Backend Service"
-                    )
-                    user_id = user_record.uid
-                except Exception as ee:
-                    auth_error = (auth_error + f" Failed to create backend user: {ee}"
-                                  if auth_error else f"Failed to create backend user: {ee}")
+                user_id = _get_backend_user_id(app_id)
             except Exception as ee:
-                auth_error = (auth_error + f" Failed to get backend user: {ee}"
-                              if auth_error else f"Failed to get backend user: {ee}")
+                auth_error = (auth_error + f" Failed to get or create backend user: {ee}"
+                              if auth_error else f"Failed to get or create backend user: {ee}")
 
         if not user_id:
             final_err = f"Could not establish a user identity. Errors: {auth_error}"
             return (db_client, None, None, final_err)
 
-        # 6) Save user_id to session_state for reuse
+        # 5) Save user_id to session_state for reuse
         st.session_state.user_id = user_id
         return (db_client, auth_module, user_id, None if not auth_error else auth_error)
 
@@ -95,6 +169,22 @@ def initialize_firebase(app_id: str, firebase_config_b64_str: str, initial_auth_
         return (None, None, None, err_msg)
 
 
+def _profiles_path(app_id: str, user_id: str) -> str:
+    return f"artifacts/{app_id}/users/{user_id}/{PROFILES_COLLECTION}"
+
+
+def _query_fields(app_id: str, candidate_data: dict) -> dict:
+    """
+    Denormalized fields the recruiter queries filter and sort on (see firestore.indexes.json).
+    """
+    return {
+        "appId": app_id,
+        "experienceBucket": experience_bucket(candidate_data.get("yearsExperience")),
+        "techStackIds": list(canonicalize(candidate_data.get("techStack", ""))),
+        "submittedAt": time.time(),
+    }
+
+
 def save_candidate_profile(db_client, app_id: str, user_id: str, candidate_data: dict) -> bool:
     """
     Saves candidate_data into Firestore under:
@@ -111,12 +201,540 @@ def save_candidate_profile(db_client, app_id: str, user_id: str, candidate_data:
 
     # Remove keys with None values to avoid Firestore rejecting null fields
     cleaned_data = {k: v for k, v in candidate_data.items() if v is not None}
+    cleaned_data.update(_query_fields(app_id, candidate_data))
 
     try:
-        path = f"artifacts/{app_id}/users/{user_id}/candidate_profiles"
-        doc_ref = db_client.collection(path).document()
+        doc_ref = db_client.collection(_profiles_path(app_id, user_id)).document()
         doc_ref.set(cleaned_data)
         return True
     except Exception as e:
         st.error(f"Firebase Service: Failed to save profile: {e}")
         return False
+
+
+@functools.lru_cache(maxsize=1)
+def _transient_write_errors() -> tuple:
+    """Errors worth retrying unchanged: the same batch may well commit a moment later."""
+    from google.api_core import exceptions as google_exceptions
+    return (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.GatewayTimeout,
+        google_exceptions.InternalServerError,
+        google_exceptions.Aborted,
+        google_exceptions.Unknown,
+        google_exceptions.RetryError,
+        ConnectionError,
+        TimeoutError,
+    )
+
+
+class ProfileWriteQueue:
+    """
+    Process-wide write-behind queue for candidate profiles.
+
+    `submit` assigns the Firestore document ID up front, journals the write to disk and
+    returns immediately. A background thread groups pending writes into Firestore batch
+    commits. Journal entries are only removed once delivered, so queued writes survive a
+    process restart and are replayed by `start`. Updates to an already queued document
+    (`submit(..., doc_id=...)`) are merged into it and go out after the original write.
+
+    Failed batches are handled by the kind of error:
+    - Transient errors (unavailable, timeouts, quota) retry the whole batch with jittered
+      exponential backoff, for as long as it takes.
+    - Any other error means Firestore rejected something in the batch, so its records are
+      retried one at a time. A record rejected `max_attempts` times is moved (with its queued
+      updates) to the dead-letter directory and its status becomes "failed".
+    """
+
+    def __init__(self, journal_dir: str, batch_size: int, flush_interval_seconds: float,
+                 retry_base_seconds: float, retry_max_seconds: float, max_attempts: int = 3,
+                 dead_letter_dir: str = None, status_ttl_seconds: int = 86400, status_cache_size: int = 100000):
+        self.journal_dir = journal_dir
+        self.batch_size = max(1, min(batch_size, 500))
+        self.flush_interval_seconds = flush_interval_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.dead_letter_dir = dead_letter_dir or os.path.join(journal_dir, "dead_letter")
+        self._db_client = None
+        self._pending = []  # journal records, oldest first
+        self._isolated = set()  # keys of records that were in a rejected batch; sent one at a time
+        self._status = {}   # doc_id -> "pending" | "retrying", while the document is queued
+        self._finished = TTLCache(maxsize=status_cache_size, ttl=status_ttl_seconds)  # doc_id -> "delivered" | "failed"
+        self._dead_lettered = 0
+        self._last_error = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self, db_client) -> None:
+        """Binds the Firestore client, replays the journal and starts the writer thread (idempotent)."""
+        with self._cond:
+            if self._db_client is None:
+                self._db_client = db_client
+            if self._thread is not None:
+                return
+            os.makedirs(self.journal_dir, exist_ok=True)
+            for record in self._read_journal():
+                record.setdefault("key", record["doc_id"])
+                self._pending.append(record)
+                if not record.get("merge"):
+                    self._status[record["doc_id"]] = "pending"
+            self._thread = threading.Thread(target=self._run, name="profile-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, db_client, path: str, data: dict, doc_id: str = None) -> str:
+        """
+        Queues `data` for `path` and returns the document ID it will be written under.
+        With `doc_id`, `data` is merged into that existing document instead.
+        """
+        self.start(db_client)
+        if doc_id is None:
+            doc_id = db_client.collection(path).document().id
+            record = {"path": path, "doc_id": doc_id, "key": doc_id, "data": data, "merge": False, "queued_at": time.time()}
+        else:
+            record = {"path": path, "doc_id": doc_id, "key": f"{doc_id}-{os.urandom(4).hex()}", "data": data, "merge": True, "queued_at": time.time()}
+        self._write_journal(record)
+        with self._cond:
+            self._pending.append(record)
+            if not record["merge"]:
+                self._status[doc_id] = "pending"
+            self._cond.notify()
+        return doc_id
+
+    def status(self, doc_id: str) -> str:
+        """
+        Returns "pending", "retrying", "delivered", "failed" or "unknown" for a submitted document.
+        Before the journal has been replayed (e.g. right after a restart), a journaled or
+        dead-lettered profile still reports "pending" or "failed".
+        """
+        with self._cond:
+            status = self._status.get(doc_id) or self._finished.get(doc_id)
+        if status:
+            return status
+        if os.path.exists(self._journal_file(doc_id)):
+            return "pending"
+        if os.path.exists(os.path.join(self.dead_letter_dir, f"{doc_id}.json")):
+            return "failed"
+        return "unknown"
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "dead_lettered": self._dead_lettered,
+                "consecutive_failures": self._failures,
+                "last_error": self._last_error,
+            }
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Waits until every queued write is delivered; returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify()
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, self.flush_interval_seconds))
+        return True
+
+    def _journal_file(self, key: str) -> str:
+        return os.path.join(self.journal_dir, f"{key}.json")
+
+    def _write_journal(self, record: dict, directory: str = None) -> None:
+        directory = directory or self.journal_dir
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, f"{record['key']}.json")
+        with open(file_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(record, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(file_path + ".tmp", file_path)
+
+    def _remove_journal(self, record: dict) -> None:
+        try:
+            os.remove(self._journal_file(record["key"]))
+        except OSError:
+            pass
+
+    def _next_batch(self) -> list:
+        """Oldest pending records, up to the batch size; a record from a rejected batch goes alone."""
+        if self._pending[0]["key"] in self._isolated:
+            return self._pending[:1]
+        batch_records = []
+        for record in self._pending[:self.batch_size]:
+            if record["key"] in self._isolated:
+                break
+            batch_records.append(record)
+        return batch_records
+
+    def _finish(self, records: list, status: str) -> None:
+        """Drops `records` from the queue and records the outcome of their documents. Caller holds the lock."""
+        keys = {record["key"] for record in records}
+        self._pending = [record for record in self._pending if record["key"] not in keys]
+        self._isolated -= keys
+        for record in records:
+            if not record.get("merge"):
+                self._status.pop(record["doc_id"], None)
+                self._finished[record["doc_id"]] = status
+        self._cond.notify_all()
+
+    def _retry_later(self, batch_records: list, error: Exception) -> float:
+        """Backs off the whole queue after a transient error; returns the delay."""
+        metrics.inc("firestore_profile_writes_total", len(batch_records), outcome="retry")
+        with self._cond:
+            self._failures += 1
+            self._last_error = str(error)
+            delay = random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * (2 ** self._failures)))
+            self._retry_at = time.monotonic() + delay
+            for record in batch_records:
+                if not record.get("merge"):
+                    self._status[record["doc_id"]] = "retrying"
+        return delay
+
+    def _rejected(self, batch_records: list, error: Exception) -> None:
+        """
+        Handles a batch Firestore refused outright: a multi-record batch is split so the
+        bad record can be found; a single record is retried until it runs out of attempts.
+        """
+        metrics.inc("firestore_profile_writes_total", len(batch_records), outcome="rejected")
+        if len(batch_records) > 1:
+            with self._cond:
+                self._isolated.update(record["key"] for record in batch_records)
+                self._last_error = str(error)
+            logger.warning("Firebase Service: Profile batch of %d rejected, retrying one at a time: %s",
+                           len(batch_records), error)
+            return
+
+        record = batch_records[0]
+        record["attempts"] = record.get("attempts", 0) + 1
+        if record["attempts"] < self.max_attempts:
+            self._write_journal(record)
+            with self._cond:
+                self._last_error = str(error)
+                self._retry_at = time.monotonic() + self.retry_base_seconds
+                if not record.get("merge"):
+                    self._status[record["doc_id"]] = "retrying"
+            logger.warning("Firebase Service: Profile write %s rejected (attempt %d of %d): %s",
+                           record["doc_id"], record["attempts"], self.max_attempts, error)
+            return
+        self._dead_letter(record, error)
+
+    def _dead_letter(self, record: dict, error: Exception) -> None:
+        """Moves `record`, and any updates queued behind it for the same new document, to the dead-letter directory."""
+        with self._cond:
+            records = [record]
+            if not record.get("merge"):
+                records += [r for r in self._pending
+                            if r.get("merge") and r["doc_id"] == record["doc_id"] and r["path"] == record["path"]]
+        for dead in records:
+            self._write_journal(dict(dead, error=str(error), failed_at=time.time()), self.dead_letter_dir)
+            self._remove_journal(dead)
+        metrics.inc("firestore_profile_writes_total", len(records), outcome="dead_letter")
+        with self._cond:
+            self._dead_lettered += len(records)
+            self._last_error = str(error)
+            self._finish(records, "failed")
+        logger.error("Firebase Service: Profile write %s failed %d times and was moved to %s: %s",
+                     record["doc_id"], record["attempts"], self.dead_letter_dir, error)
+
+    def _read_journal(self) -> list:
+        records = []
+        for name in os.listdir(self.journal_dir):
+            if not name.endswith(".json"):
+                continue
+            file_path = os.path.join(self.journal_dir, name)
+            try:
+                with open(file_path, encoding="utf-8") as f:
+                    record = json.load(f)
+                # Queue order, not mtime: retried records are rewritten, and a profile replayed
+                # after its merge updates would overwrite them. Entries without queued_at predate it
+                records.append(((record.get("queued_at") or os.path.getmtime(file_path), bool(record.get("merge"))), record))
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning("Firebase Service: Skipping unreadable journal entry %s: %s", name, e)
+        return [record for _, record in sorted(records, key=lambda item: item[0])]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending or time.monotonic() < self._retry_at:
+                    wait = self._retry_at - time.monotonic() if self._pending else None
+                    self._cond.wait(wait if wait is None else max(wait, 0.01))
+                batch_records = self._next_batch()
+            try:
+                with metrics.span("firestore_batch_commit"):
+                    batch = self._db_client.batch()
+                    for record in batch_records:
+                        batch.set(self._db_client.collection(record["path"]).document(record["doc_id"]), record["data"],
+                                  merge=record.get("merge", False))
+                    batch.commit()
+            except _transient_write_errors() as e:
+                delay = self._retry_later(batch_records, e)
+                logger.warning("Firebase Service: Profile batch write failed (retrying in %.1fs): %s", delay, e)
+                continue
+            except Exception as e:
+                self._rejected(batch_records, e)
+                continue
+
+            metrics.inc("firestore_profile_writes_total", len(batch_records), outcome="delivered")
+            for record in batch_records:
+                metrics.observe("profile_delivery_seconds", time.time() - record.get("queued_at", time.time()))
+                self._remove_journal(record)
+            with self._cond:
+                self._finish(batch_records, "delivered")
+                self._failures = 0
+                self._last_error = None
+                self._retry_at = time.monotonic() + self.flush_interval_seconds
+
+
+profile_write_queue = ProfileWriteQueue(
+    PROFILE_JOURNAL_DIR, PROFILE_BATCH_SIZE, PROFILE_FLUSH_INTERVAL_SECONDS,
+    PROFILE_RETRY_BASE_SECONDS, PROFILE_RETRY_MAX_SECONDS, PROFILE_MAX_ATTEMPTS, PROFILE_DEAD_LETTER_DIR,
+    PROFILE_STATUS_TTL_SECONDS, PROFILE_STATUS_CACHE_SIZE
+)
+
+
+metrics.register_collector(lambda: {
+    f"profile_write_queue_{key}": value for key, value in profile_write_queue.stats().items() if key in ("pending", "dead_lettered")
+})
+
+
+def enqueue_candidate_profile(db_client, app_id: str, user_id: str, candidate_data: dict):
+    """
+    Non-blocking counterpart of `save_candidate_profile`: journals the profile for the
+    background writer and returns its document ID straight away.
+
+    Returns the document ID, or None if the profile could not be queued.
+    """
+    if not db_client:
+        st.error("Firebase Service: Firestore client not initialized.")
+        return None
+    if not user_id:
+        st.error("Firebase Service: No user ID available. Cannot save data.")
+        return None
+
+    # Remove keys with None values to avoid Firestore rejecting null fields
+    cleaned_data = {k: v for k, v in candidate_data.items() if v is not None}
+    cleaned_data.update(_query_fields(app_id, candidate_data))
+
+    try:
+        return profile_write_queue.submit(db_client, _profiles_path(app_id, user_id), cleaned_data)
+    except Exception as e:
+        st.error(f"Firebase Service: Failed to queue profile: {e}")
+        return None
+
+
+def enqueue_profile_update(db_client, app_id: str, user_id: str, doc_id: str, updates: dict) -> bool:
+    """
+    Queues a merge of `updates` into an existing candidate profile document. Safe to call
+    from background threads (reports failures through the log, not the page).
+    """
+    try:
+        profile_write_queue.submit(db_client, _profiles_path(app_id, user_id), updates, doc_id=doc_id)
+        return True
+    except Exception as e:
+        logger.warning("Firebase Service: Failed to queue update for profile %s: %s", doc_id, e)
+        return False
+
+
+def get_profile_delivery_status(doc_id: str) -> str:
+    """
+    Returns the delivery status of a queued profile: "pending", "retrying", "delivered", "failed" or "unknown".
+    """
+    return profile_write_queue.status(doc_id)
+
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(db_client, cursor: str) -> list:
+    submitted_at, doc_path = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return [submitted_at, db_client.document(doc_path)]
+
+
+def _profiles_query(db_client, app_id: str, role: str = None, experience: str = None, tech: str = None, fields: list = None):
+    """
+    Builds the recruiter query over every user's candidate_profiles: newest first, with
+    optional equality filters on role and experience bucket and a tech filter that matches
+    profiles whose canonical stack contains that technology.
+    """
+    from google.cloud.firestore_v1 import FieldFilter, Query
+    from google.cloud.firestore_v1.field_path import FieldPath
+    query = db_client.collection_group(PROFILES_COLLECTION).where(filter=FieldFilter("appId", "==", app_id))
+    if role:
+        query = query.where(filter=FieldFilter("desiredPositions", "==", role))
+    if experience:
+        query = query.where(filter=FieldFilter("experienceBucket", "==", experience))
+    if tech:
+        # Unrecognized words aren't in any canonical stack, so they only match profiles
+        # saved before unknown words were left out of techStackIds
+        tech_ids = canonicalize(tech) or tuple(dict.fromkeys(strip_version(token) for token in tokenize(tech)))
+        if len(tech_ids) == 1:
+            query = query.where(filter=FieldFilter("techStackIds", "array_contains", tech_ids[0]))
+        elif tech_ids:
+            query = query.where(filter=FieldFilter("techStackIds", "array_contains_any", list(tech_ids)[:30]))
+    if fields is not None:
+        # submittedAt is always fetched; the page cursor is built from it
+        query = query.select(list(dict.fromkeys([*fields, "submittedAt"])))
+    # Document ID as tie-breaker keeps the cursor stable for profiles saved in the same instant
+    return query.order_by("submittedAt", direction=Query.DESCENDING) \
+                .order_by(FieldPath.document_id(), direction=Query.DESCENDING)
+
+
+def list_candidate_profiles(db_client, app_id: str, role: str = None, experience: str = None, tech: str = None,
+                            fields: list = PROFILE_SUMMARY_FIELDS, page_size: int = PROFILE_PAGE_SIZE, cursor: str = None):
+    """
+    Returns one page of candidate profiles, newest first.
+
+    Args:
+        role / experience / tech: Optional filters on the desired position, the experience
+            bucket ("entry", "mid", "senior", "staff") and a technology (any spelling, e.g. "postgres").
+        fields: Fields to fetch (projection); None fetches whole documents.
+        cursor: The `next_cursor` of the previous page.
+
+    Returns:
+        tuple: (list of profile dicts with "id" and "path" added, next_cursor or None on the last page).
+    """
+    query = _profiles_query(db_client, app_id, role, experience, tech, fields).limit(page_size)
+    if cursor:
+        query = query.start_after(_decode_cursor(db_client, cursor))
+    profiles, last = [], None
+    with metrics.span("firestore_profile_query"):
+        for snapshot in query.stream():
+            profile = snapshot.to_dict() or {}
+            profile["id"] = snapshot.id
+            profile["path"] = snapshot.reference.path
+            profiles.append(profile)
+            last = snapshot
+    if last is None or len(profiles) < page_size:
+        return profiles, None
+    return profiles, _encode_cursor([last.get("submittedAt"), last.reference.path])
+
+
+def _iter_pages(db_client, app_id: str, fields: list, page_size: int, filters: dict):
+    cursor = None
+    while True:
+        profiles, cursor = list_candidate_profiles(db_client, app_id, fields=fields, page_size=page_size, cursor=cursor, **filters)
+        if profiles:
+            yield profiles
+        if cursor is None:
+            return
+
+
+def iter_candidate_profiles(db_client, app_id: str, fields: list = PROFILE_SUMMARY_FIELDS, page_size: int = PROFILE_PAGE_SIZE, **filters):
+    """Yields matching profiles page by page; only one page is held in memory at a time."""
+    for profiles in _iter_pages(db_client, app_id, fields, page_size, filters):
+        yield from profiles
+
+
+def _export_value(value):
+    if isinstance(value, list):
+        return ";".join(str(item) for item in value)
+    return value
+
+
+def export_candidate_profiles(db_client, app_id: str, out_path: str, file_format: str = "csv",
+                              fields: list = PROFILE_SUMMARY_FIELDS, page_size: int = PROFILE_PAGE_SIZE, **filters) -> int:
+    """
+    Streams matching profiles into a CSV or Parquet file one page at a time (a Parquet row
+    group per page), so memory use stays flat however many profiles match. List fields are
+    joined with ";". Returns the number of profiles written.
+    """
+    columns = ["id"] + list(fields)
+    pages = _iter_pages(db_client, app_id, fields, page_size, filters)
+    written = 0
+    if file_format == "csv":
+        with open(out_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            for profiles in pages:
+                writer.writerows({k: _export_value(p.get(k)) for k in columns} for p in profiles)
+                written += len(profiles)
+        return written
+    if file_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([(column, pa.float64() if column == "submittedAt" else pa.string()) for column in columns])
+        with pq.ParquetWriter(out_path, schema) as writer:
+            for profiles in pages:
+                data = {column: [_parquet_value(p.get(column), column) for p in profiles] for column in columns}
+                writer.write_table(pa.Table.from_pydict(data, schema=schema))
+                written += len(profiles)
+        return written
+    raise ValueError(f"Unsupported export format: {file_format}")
+
+
+def _parquet_value(value, column: str):
+    if value is None or column == "submittedAt":
+        return value
+    return str(_export_value(value))
+
+
+def backfill_profile_query_fields(db_client, app_id: str, page_size: int = PROFILE_PAGE_SIZE) -> int:
+    """
+    One-off migration: adds the recruiter query fields to this app's profiles saved before
+    they existed (submittedAt falls back to the document's create time). Returns the number
+    of profiles updated.
+    """
+    from google.cloud.firestore_v1.field_path import FieldPath
+    prefix = f"artifacts/{app_id}/"
+    page_size = min(page_size, 500)  # one batch per page
+    query = db_client.collection_group(PROFILES_COLLECTION).order_by(FieldPath.document_id()).limit(page_size)
+    updated, last = 0, None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        batch, pending = db_client.batch(), 0
+        for snapshot in page:
+            data = snapshot.to_dict() or {}
+            if snapshot.reference.path.startswith(prefix) and "appId" not in data:
+                fields = _query_fields(app_id, data)
+                fields["submittedAt"] = snapshot.create_time.timestamp() if snapshot.create_time else fields["submittedAt"]
+                batch.update(snapshot.reference, fields)
+                pending += 1
+        if pending:
+            batch.commit()
+            updated += pending
+        if len(page) < page_size:
+            return updated
+        last = page[-1]
+
+
+def main(argv=None) -> None:
+    """Recruiter CLI: `export` matching profiles to CSV/Parquet, or `backfill` query fields on old profiles."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Export or migrate HireMate candidate profiles")
+    parser.add_argument("--app-id", default=os.getenv("__app_id", "talent-scout-app"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Stream matching profiles to a file")
+    export.add_argument("--out", required=True)
+    export.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    export.add_argument("--role")
+    export.add_argument("--experience", choices=EXPERIENCE_BUCKETS)
+    export.add_argument("--tech", help="Technology filter in any spelling, e.g. 'postgres'")
+    export.add_argument("--page-size", type=int, default=PROFILE_PAGE_SIZE)
+    subparsers.add_parser("backfill", help="Add query fields to profiles saved before they existed")
+    args = parser.parse_args(argv)
+
+    firebase_config = os.getenv("FIREBASE_CONFIG_B64", "")
+    if not firebase_config:
+        parser.exit(2, "FIREBASE_CONFIG_B64 is not set: export the Base64-encoded service-account JSON first.\n")
+    try:
+        db_client = _get_db_client(firebase_config)
+    except ValueError as e:  # bad Base64, JSON or service-account fields
+        parser.exit(2, f"FIREBASE_CONFIG_B64 is not a valid Base64-encoded service-account JSON: {e}\n")
+    if args.command == "export":
+        count = export_candidate_profiles(db_client, args.app_id, args.out, args.format, page_size=args.page_size,
+                                          role=args.role, experience=args.experience, tech=args.tech)
+        print(f"Exported {count} profiles to {args.out}")
+    else:
+        print(f"Updated {backfill_profile_query_fields(db_client, args.app_id)} profiles")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,507 @@
-import google.generativeai as genai
+import functools
+import json
+import logging
 import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from typing import Literal
 import streamlit as st 
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from cachetools import TTLCache
+from pydantic import BaseModel, Field, ValidationError
+import local_backend
+from experience import experience_bucket
+from metrics import registry as metrics
+from session_memory import ChatMessage
+from tech_stack import display_stack, is_fully_recognized, stack_key
+
+logger = logging.getLogger(__name__)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", None)
+GEMINI_MODEL_NAME = "gemini-2.0-flash-001"
+
+# Gateway defaults; every model route below gets a gateway of its own, shared by all sessions
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+
+# Contextual-query prompt budget: newest turns are kept verbatim, older ones shrink to stubs
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_STUB_CHARS = 160
+
+# Question-set cache configuration (shared by every Streamlit session in this process)
+QUESTION_CACHE_MAXSIZE = int(os.getenv("QUESTION_CACHE_MAXSIZE", "512"))
+QUESTION_CACHE_TTL_SECONDS = int(os.getenv("QUESTION_CACHE_TTL_SECONDS", "21600"))
+QUESTION_CACHE_VARIANTS = int(os.getenv("QUESTION_CACHE_VARIANTS", "3"))
+# Background workers used to generate questions speculatively, ahead of the candidate's consent
+QUESTION_PREFETCH_WORKERS = int(os.getenv("QUESTION_PREFETCH_WORKERS", "4"))
+# Code answers with automated test results are cut to this many characters in the feedback prompt
+FEEDBACK_CODE_CHARS = int(os.getenv("FEEDBACK_CODE_CHARS", "1200"))
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """The model tier one task type is sent to, and the limits it runs under."""
+    model_name: str
+    max_concurrency: int
+    deadline_seconds: float
+    max_output_tokens: int
+    tokens_per_minute: int  # 0 = no budget
+
+
+def _route_from_env(task: str, model_name: str, max_concurrency: int, deadline_seconds: float,
+                    max_output_tokens: int, tokens_per_minute: int = 0) -> ModelRoute:
+    """A route with the given defaults, each overridable with LLM_<TASK>_<SETTING>."""
+    prefix = f"LLM_{task.upper()}_"
+    return ModelRoute(
+        model_name=os.getenv(prefix + "MODEL", model_name),
+        max_concurrency=int(os.getenv(prefix + "MAX_CONCURRENCY", str(max_concurrency))),
+        deadline_seconds=float(os.getenv(prefix + "DEADLINE_SECONDS", str(deadline_seconds))),
+        max_output_tokens=int(os.getenv(prefix + "MAX_OUTPUT_TOKENS", str(max_output_tokens))),
+        tokens_per_minute=int(os.getenv(prefix + "TOKENS_PER_MINUTE", str(tokens_per_minute))),
+    )
+
+
+# Routing rules: task type → model tier. Short chat replies go to the cheaper, faster tier with a
+# short deadline (the candidate is waiting); question sets and feedback run in the background
+# and get the full model. When a route is overloaded or over budget, its task is served by
+# local_backend instead (see ModelRouter and `router.stats()`).
+MODEL_ROUTES = {
+    "chat": _route_from_env("chat", "gemini-2.0-flash-lite-001", LLM_MAX_CONCURRENCY, 10, 512),
+    "questions": _route_from_env("questions", GEMINI_MODEL_NAME, LLM_MAX_CONCURRENCY, LLM_DEADLINE_SECONDS, 2048),
+    "feedback": _route_from_env("feedback", GEMINI_MODEL_NAME, max(1, LLM_MAX_CONCURRENCY // 2), LLM_DEADLINE_SECONDS, 1024),
+}
+
+def _notify(level: str, message: str) -> None:
+    """
+    Surfaces a service message with st.error/st.warning when running inside a Streamlit
+    script run, and falls back to logging in background threads (e.g. question prefetch).
+    """
+    if get_script_run_ctx(suppress_warning=True) is not None:
+        getattr(st, level)(message)
+    else:
+        logger.log(logging.ERROR if level == "error" else logging.WARNING, message)
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY) 
-else:
+
+if not GEMINI_API_KEY:
     # Display error if API key is missing
     st.error("LLM Service Critical Error: GEMINI_API_KEY environment variable not set. The AI features will not work.")
 
 
-def call_gemini_api(prompt: str, history: list) -> str:
+_genai_module = None
+_genai_lock = threading.Lock()
+
+
+def _genai():
+    """
+    The google.generativeai SDK, imported and configured on first use. It takes about a
+    second to import and isn't needed before the tech-stack stage, so it stays off the
+    first page load (`warm_up` loads it in the background afterwards).
+    """
+    global _genai_module
+    if _genai_module is None:
+        with _genai_lock:
+            if _genai_module is None:
+                import google.generativeai as genai
+                if GEMINI_API_KEY:
+                    genai.configure(api_key=GEMINI_API_KEY)
+                _genai_module = genai
+    return _genai_module
+
+
+@functools.lru_cache(maxsize=1)
+def _google_exceptions():
+    from google.api_core import exceptions as google_exceptions
+    return google_exceptions
+
+
+@functools.lru_cache(maxsize=1)
+def transient_errors() -> tuple:
+    """Errors worth retrying: the request may well succeed a moment later."""
+    google_exceptions = _google_exceptions()
+    return (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+    )
+
+
+def warm_up() -> None:
+    """Imports the Gemini SDK and loads the question bank ahead of the first request that needs them."""
+    from question_bank import get_question_bank
+    _genai()
+    transient_errors()
+    get_question_bank()
+
+
+class LLMOverloadedError(Exception):
+    """Raised when no gateway slot frees up (or retries run out) before the deadline."""
+
+
+class LLMGateway:
+    """
+    Process-wide access point for Gemini calls.
+
+    - Reuses one model object per model name across calls and Streamlit sessions.
+    - Caps concurrent requests with a semaphore; callers queue for a free slot.
+    - Retries transient errors with full-jitter exponential backoff until the deadline.
+    - Tracks queue depth and slot wait times (see `stats`).
+    """
+
+    def __init__(self, max_concurrency: int, deadline_seconds: float, backoff_base_seconds: float,
+                 backoff_max_seconds: float, model_factory=None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.deadline_seconds = deadline_seconds
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        # Looked up lazily so the SDK class can be swapped out (e.g. for local fakes)
+        self._model_factory = model_factory or (lambda model_name: _genai().GenerativeModel(model_name))
+        self._models = {}
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._total_requests = 0
+        self._total_retries = 0
+        self._total_wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._last_wait_seconds = 0.0
+
+    def get_model(self, model_name: str = GEMINI_MODEL_NAME):
+        """Returns the shared model object for `model_name`, creating it on first use."""
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._models[model_name] = self._model_factory(model_name)
+            return model
+
+    def _acquire_slot(self, deadline: float) -> None:
+        with self._lock:
+            self._waiting += 1
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=max(0.0, deadline - started))
+        waited = time.monotonic() - started
+        metrics.observe("llm_slot_wait_seconds", waited)
+        with self._lock:
+            self._waiting -= 1
+            self._total_wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+            self._last_wait_seconds = waited
+            if acquired:
+                self._in_flight += 1
+                self._total_requests += 1
+        if not acquired:
+            raise LLMOverloadedError(f"No free LLM slot after waiting {waited:.1f}s (resource exhausted).")
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _backoff_or_raise(self, attempt: int, deadline: float, error: Exception, model_name: str) -> None:
+        """Sleeps for a jittered backoff, or re-raises `error` if that would pass the deadline."""
+        delay = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** attempt)))
+        if time.monotonic() + delay >= deadline:
+            metrics.inc("llm_retries_exhausted_total", model=model_name, error=type(error).__name__)
+            raise error
+        with self._lock:
+            self._total_retries += 1
+        metrics.inc("llm_retries_total", model=model_name, error=type(error).__name__)
+        time.sleep(delay)
+
+    def generate(self, contents: list, generation_config=None, model_name: str = GEMINI_MODEL_NAME):
+        """
+        Calls `generate_content` through the gateway and returns the SDK response.
+        Transient errors are retried until the deadline; other errors propagate.
+        """
+        model = self.get_model(model_name)
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            self._acquire_slot(deadline)
+            try:
+                with metrics.span("llm_request", model=model_name, mode="unary"):
+                    return model.generate_content(contents, generation_config=generation_config)
+            except transient_errors() as e:
+                error = e
+            finally:
+                self._release_slot()
+            self._backoff_or_raise(attempt, deadline, error, model_name)
+            attempt += 1
+
+    def stream(self, contents: list, generation_config=None, model_name: str = GEMINI_MODEL_NAME):
+        """
+        Streaming counterpart of `generate`: yields response chunks as they arrive.
+        The slot is held until the stream is exhausted; only the initial request is retried.
+        """
+        model = self.get_model(model_name)
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            self._acquire_slot(deadline)
+            try:
+                try:
+                    with metrics.span("llm_request", model=model_name, mode="stream_first_chunk"):
+                        response = model.generate_content(contents, generation_config=generation_config, stream=True)
+                except transient_errors() as e:
+                    error = e
+                else:
+                    with metrics.span("llm_request", model=model_name, mode="stream_body"):
+                        yield from response
+                    return
+            finally:
+                self._release_slot()
+            self._backoff_or_raise(attempt, deadline, error, model_name)
+            attempt += 1
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the gateway's queue depth, concurrency and wait times."""
+        with self._lock:
+            return {
+                "queue_depth": self._waiting,
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "total_requests": self._total_requests,
+                "total_retries": self._total_retries,
+                "avg_wait_seconds": self._total_wait_seconds / self._total_requests if self._total_requests else 0.0,
+                "max_wait_seconds": self._max_wait_seconds,
+                "last_wait_seconds": self._last_wait_seconds,
+            }
+
+
+class LLMBudgetExceeded(LLMOverloadedError):
+    """Raised instead of calling Gemini once a route has spent its tokens-per-minute budget."""
+
+
+class ModelRouter:
+    """
+    Sends each task type to the model tier in its ModelRoute.
+
+    - Every route has its own LLMGateway, so a burst of one task type (say, feedback
+      generation) can't take the slots or the retry time of another (chat replies).
+    - Applies the route's output-token limit and refuses calls once the route has used its
+      token budget for the last minute (LLMBudgetExceeded).
+    - Counts remote successes and failures, budget refusals and requests served by the
+      local fallback per route (see `stats`).
+    """
+
+    def __init__(self, routes: dict, model_factory=None):
+        self.routes = dict(routes)
+        self.gateways = {
+            task: LLMGateway(route.max_concurrency, route.deadline_seconds, LLM_BACKOFF_BASE_SECONDS,
+                             LLM_BACKOFF_MAX_SECONDS, model_factory=model_factory)
+            for task, route in self.routes.items()
+        }
+        self._lock = threading.Lock()
+        self._spent = {task: deque() for task in self.routes}  # (time, tokens) of the last minute
+        self._spent_tokens = Counter()
+        self._counts = {task: Counter() for task in self.routes}
+
+    def _count(self, task: str, outcome: str) -> None:
+        with self._lock:
+            self._counts[task][outcome] += 1
+        metrics.inc("llm_route_requests_total", task=task, outcome=outcome)
+
+    def _tokens_last_minute(self, task: str) -> int:
+        # Caller holds self._lock
+        spent = self._spent[task]
+        cutoff = time.monotonic() - 60
+        while spent and spent[0][0] < cutoff:
+            self._spent_tokens[task] -= spent.popleft()[1]
+        return self._spent_tokens[task]
+
+    def _admit(self, task: str) -> None:
+        budget = self.routes[task].tokens_per_minute
+        if not budget:
+            return
+        with self._lock:
+            spent = self._tokens_last_minute(task)
+        if spent >= budget:
+            self._count(task, "over_budget")
+            raise LLMBudgetExceeded(f"The {task} route has used its budget of {budget} tokens per minute.")
+
+    def _charge(self, task: str, usage_response, contents: list) -> None:
+        """Records the call's token usage (estimated from the prompt if Gemini didn't report it)."""
+        _record_usage(usage_response, self.routes[task].model_name)
+        usage = getattr(usage_response, "usage_metadata", None)
+        tokens = getattr(usage, "total_token_count", 0) or sum(
+            estimate_tokens(part["text"]) for content in contents for part in content["parts"])
+        with self._lock:
+            self._spent[task].append((time.monotonic(), tokens))
+            self._spent_tokens[task] += tokens
+
+    def generation_config(self, task: str, generation_config=None):
+        """`generation_config` (or a default one) with the route's output-token limit applied."""
+        generation_config = generation_config or _genai().types.GenerationConfig()
+        limit = self.routes[task].max_output_tokens
+        if limit and generation_config.max_output_tokens is None:
+            generation_config = replace(generation_config, max_output_tokens=limit)
+        return generation_config
+
+    def generate(self, task: str, contents: list, generation_config=None):
+        """Unary call on `task`'s route; returns the SDK response."""
+        self._admit(task)
+        route = self.routes[task]
+        try:
+            response = self.gateways[task].generate(contents, self.generation_config(task, generation_config), route.model_name)
+        except Exception:
+            self._count(task, "remote_failed")
+            raise
+        self._count(task, "remote_ok")
+        self._charge(task, response, contents)
+        return response
+
+    def stream(self, task: str, contents: list, generation_config=None):
+        """Streaming call on `task`'s route; yields response chunks."""
+        self._admit(task)
+        route = self.routes[task]
+        usage_chunk = None
+        try:
+            for chunk in self.gateways[task].stream(contents, self.generation_config(task, generation_config), route.model_name):
+                # Token counts arrive on the last chunk of the stream
+                usage_chunk = chunk if getattr(chunk, "usage_metadata", None) else usage_chunk
+                yield chunk
+        except Exception:
+            self._count(task, "remote_failed")
+            raise
+        self._count(task, "remote_ok")
+        self._charge(task, usage_chunk, contents)
+
+    def record_fallback(self, task: str) -> None:
+        """Counts a `task` request that was served by local_backend."""
+        self._count(task, "local")
+
+    def stats(self) -> dict:
+        """Per task: its routing rule, how its requests were served, and its gateway's stats."""
+        report = {}
+        for task, route in self.routes.items():
+            with self._lock:
+                counts = dict(self._counts[task])
+                tokens = self._tokens_last_minute(task)
+            requests = sum(counts.get(outcome, 0) for outcome in ("remote_ok", "remote_failed", "over_budget"))
+            report[task] = {
+                **asdict(route),
+                "requests": requests,
+                "remote_ok": counts.get("remote_ok", 0),
+                "remote_failed": counts.get("remote_failed", 0),
+                "over_budget": counts.get("over_budget", 0),
+                "local": counts.get("local", 0),
+                "remote_hit_rate": counts.get("remote_ok", 0) / requests if requests else 0.0,
+                "local_rate": counts.get("local", 0) / requests if requests else 0.0,
+                "tokens_last_minute": tokens,
+                "gateway": self.gateways[task].stats(),
+            }
+        return report
+
+
+router = ModelRouter(MODEL_ROUTES)
+
+
+def _gateway_gauges() -> dict:
+    gauges = {}
+    for task, gateway in router.gateways.items():
+        stats = gateway.stats()
+        gauges[("llm_gateway_queue_depth", {"task": task})] = stats["queue_depth"]
+        gauges[("llm_gateway_in_flight", {"task": task})] = stats["in_flight"]
+        gauges[("llm_gateway_max_concurrency", {"task": task})] = stats["max_concurrency"]
+    return gauges
+
+
+metrics.register_collector(_gateway_gauges)
+
+
+def _record_usage(response, model_name: str = GEMINI_MODEL_NAME) -> None:
+    """Adds the prompt/response token counts reported by Gemini to the metrics registry."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    metrics.inc("llm_prompt_tokens_total", getattr(usage, "prompt_token_count", 0) or 0, model=model_name)
+    metrics.inc("llm_response_tokens_total", getattr(usage, "candidates_token_count", 0) or 0, model=model_name)
+
+
+def _format_contents(prompt: str, history: list) -> list:
+    """
+    Formats the chat history plus the new prompt into Gemini `contents`:
+    [{"role": "user"/"model", "parts": [{"text": "message"}]}, ...]
+    """
+    formatted_history = []
+    for msg in history:
+        role = "user" if msg.sender == "user" else "model"
+        formatted_history.append({"role": role, "parts": [{"text": msg.message}]})
+    return formatted_history + [{"role": "user", "parts": [{"text": prompt}]}]
+
+
+def _error_message(e: Exception) -> str:
+    """
+    Maps an exception raised by the Gemini SDK onto a user-facing message.
+    """
+    error_str = str(e).lower()
+    metrics.inc("llm_errors_total", error=type(e).__name__)
+    _notify("error", f"LLM Service: Error calling Gemini API: {e}")
+    google_exceptions = _google_exceptions()
+    if isinstance(e, (LLMOverloadedError, google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable)):
+        return "The AI service is currently overloaded. Please try again later."
+    elif isinstance(e, google_exceptions.TooManyRequests):
+        return "The AI service is experiencing high traffic. Please try again in a moment."
+    elif "api key not valid" in error_str or "permission denied" in error_str:
+        return "There's an issue with the AI service configuration (API key). Please contact support."
+    elif "rate limit" in error_str:
+        return "The AI service is experiencing high traffic. Please try again in a moment."
+    elif "blocked" in error_str or "safety" in error_str: # General safety block
+        return "My response was blocked due to safety guidelines. Please try rephrasing your input."
+    elif "resource exhausted" in error_str:
+         return "The AI service is currently overloaded. Please try again later."
+    # Fallback for other errors
+    return f"An unexpected error occurred while communicating with the AI: {e}. Please try again."
+
+
+def _blocked_message(prompt_feedback) -> str:
+    """
+    Builds the user-facing reply for a prompt that Gemini blocked.
+    """
+    block_reason = prompt_feedback.block_reason
+    metrics.inc("llm_blocked_total", reason=str(block_reason))
+    block_message = f"AI response blocked. Reason: {block_reason}."
+    if prompt_feedback.safety_ratings:
+        block_message += f" Safety Ratings: {prompt_feedback.safety_ratings}"
+    _notify("warning", f"LLM Service: {block_message}")
+    return f"I'm sorry, my response was blocked due to: {block_reason}. Please try rephrasing your input."
+
+
+def _can_fall_back(error: Exception, fallback) -> bool:
+    """Whether a failed call should be served locally: the route is overloaded, over budget or out of retries."""
+    return fallback is not None and isinstance(error, (LLMOverloadedError, *transient_errors()))
+
+
+def _serve_locally(task: str, error: Exception, fallback, outcome: dict = None) -> str:
+    router.record_fallback(task)
+    logger.warning("LLM Service: %s route unavailable (%s); serving a local reply.", task, error)
+    if outcome is not None:
+        outcome["backend"] = "local"
+    return fallback()
+
+
+def call_gemini_api(prompt: str, history: list, generation_config=None, task: str = "chat", fallback=None, outcome: dict = None) -> str:
     """
     Calls the Google Gemini API with a given prompt and conversation history.
 
     Args:
         prompt (str): The user's prompt or question.
-        history (list): A list of dictionaries representing the conversation history for the API.
-                        Each dictionary should have "role" ("user" or "model") and "parts" (list of {"text": "message"}).
-                        For this app, history is often [] as prompts are self-contained.
+        history (list): Chat history as ChatMessage records.
+        generation_config (GenerationConfig, optional): Overrides the default config, e.g. to
+                        request schema-constrained JSON output.
+        task (str): The MODEL_ROUTES entry that picks the model and its limits.
+        fallback (callable, optional): Returns a local reply in the same format, used instead
+                        of an error message when the route is overloaded or over budget.
+        outcome (dict, optional): Gets outcome["backend"] = "local" when `fallback` was used.
 
     Returns:
         str: The response text from the Gemini API.
@@ -29,50 +511,462 @@ def call_gemini_api(prompt: str, history: list) -> str:
         Exception: For other API-related errors if not caught and re-raised as a string.
     """
     if not GEMINI_API_KEY:
-        # If genai.configure wasn't called.
         return "AI service is not configured. Please ensure GEMINI_API_KEY is set."
 
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-001') 
-        
-        # Format the history for the API call to {"role": "user/model", "parts": [{"text": "message"}]}
-        formatted_history = []
-        for msg in history:
-            role = "user" if msg["sender"] == "user" else "model"
-            formatted_history.append({"role": role, "parts": [{"text": msg["message"]}]})
-
-        contents_for_api = formatted_history + [{"role": "user", "parts": [{"text": prompt}]}]
-        
-        generation_config = genai.types.GenerationConfig()
-
-        response = model.generate_content(
-            contents_for_api,
-            generation_config=generation_config
-            )
+        contents_for_api = _format_contents(prompt, history)
+
+        response = router.generate(task, contents_for_api, generation_config)
 
         if response.candidates and response.candidates[0].content.parts:
             return response.candidates[0].content.parts[0].text
         elif response.prompt_feedback and response.prompt_feedback.block_reason:
-            block_reason = response.prompt_feedback.block_reason
-            block_message = f"AI response blocked. Reason: {block_reason}."
-            if response.prompt_feedback.safety_ratings:
-                block_message += f" Safety Ratings: {response.prompt_feedback.safety_ratings}"
-            st.warning(f"LLM Service: {block_message}")
-            return f"I'm sorry, my response was blocked due to: {block_reason}. Please try rephrasing your input."
+            return _blocked_message(response.prompt_feedback)
         else:
-            st.warning("LLM Service: Gemini API returned an empty or malformed response.")
+            _notify("warning", "LLM Service: Gemini API returned an empty or malformed response.")
             return "I'm sorry, I couldn't generate a response. The AI model returned an unexpected reply."
 
     except Exception as e:
-        error_str = str(e).lower()
-        st.error(f"LLM Service: Error calling Gemini API: {e}")
-        if "api key not valid" in error_str or "permission denied" in error_str:
-            return "There's an issue with the AI service configuration (API key). Please contact support."
-        elif "rate limit" in error_str:
-            return "The AI service is experiencing high traffic. Please try again in a moment."
-        elif "blocked" in error_str or "safety" in error_str: # General safety block
-            return "My response was blocked due to safety guidelines. Please try rephrasing your input."
-        elif "resource exhausted" in error_str:
-             return "The AI service is currently overloaded. Please try again later."
-        # Fallback for other errors
-        return f"An unexpected error occurred while communicating with the AI: {e}. Please try again."
\ No newline at end of file
+        if _can_fall_back(e, fallback):
+            return _serve_locally(task, e, fallback, outcome)
+        return _error_message(e)
+
+
+class LLMResponseError(Exception):
+    """Raised by `generate_text` when Gemini blocks the prompt or returns no text."""
+
+
+def generate_text(prompt: str, history: list = None, generation_config=None, task: str = "chat", fallback=None) -> str:
+    """
+    Like `call_gemini_api`, but raises instead of returning a user-facing error string,
+    for background jobs that retry or record failures themselves. With a `fallback`, an
+    overloaded or over-budget route returns its local reply instead of raising.
+
+    Raises:
+        LLMResponseError: Missing API key, blocked prompt or empty reply.
+        Exception: Gateway errors (LLMOverloadedError, non-transient API errors).
+    """
+    if not GEMINI_API_KEY:
+        raise LLMResponseError("GEMINI_API_KEY is not set")
+    try:
+        response = router.generate(task, _format_contents(prompt, history or []), generation_config)
+    except Exception as e:
+        if _can_fall_back(e, fallback):
+            return _serve_locally(task, e, fallback)
+        raise
+    if response.candidates and response.candidates[0].content.parts:
+        return response.candidates[0].content.parts[0].text
+    if response.prompt_feedback and response.prompt_feedback.block_reason:
+        metrics.inc("llm_blocked_total", reason=str(response.prompt_feedback.block_reason))
+        raise LLMResponseError(f"Prompt blocked: {response.prompt_feedback.block_reason}")
+    raise LLMResponseError("Gemini API returned an empty or malformed response.")
+
+
+def stream_gemini_api(prompt: str, history: list, outcome: dict = None, task: str = "chat", fallback=None):
+    """
+    Streaming variant of `call_gemini_api`: yields the response text chunk by chunk
+    as Gemini produces it, so the UI can render partial output immediately.
+
+    Args:
+        prompt (str): The user's prompt or question.
+        history (list): Chat history as ChatMessage records.
+        outcome (dict, optional): Gets outcome["ok"] = True once the stream has finished
+             with a real reply (not an error or blocked-prompt message), or
+             outcome["backend"] = "local" if `fallback` answered instead.
+        task (str): The MODEL_ROUTES entry that picks the model and its limits.
+        fallback (callable, optional): Returns a local reply, yielded instead of an error
+             message when the route is overloaded or over budget before any text arrived.
+
+    Yields:
+        str: Successive text chunks. Errors and blocked prompts are yielded as a single
+             user-facing message, mirroring the strings returned by `call_gemini_api`.
+    """
+    if not GEMINI_API_KEY:
+        yield "AI service is not configured. Please ensure GEMINI_API_KEY is set."
+        return
+
+    produced_text = False
+    try:
+        prompt_feedback = None
+        for chunk in router.stream(task, _format_contents(prompt, history)):
+            prompt_feedback = chunk.prompt_feedback or prompt_feedback
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                text = "".join(part.text for part in chunk.candidates[0].content.parts)
+                if text:
+                    produced_text = True
+                    yield text
+
+        if not produced_text:
+            if prompt_feedback and prompt_feedback.block_reason:
+                yield _blocked_message(prompt_feedback)
+            else:
+                _notify("warning", "LLM Service: Gemini API returned an empty or malformed response.")
+                yield "I'm sorry, I couldn't generate a response. The AI model returned an unexpected reply."
+        elif outcome is not None:
+            outcome["ok"] = True
+
+    except Exception as e:
+        if not produced_text and _can_fall_back(e, fallback):
+            yield _serve_locally(task, e, fallback, outcome)
+            return
+        message = _error_message(e)
+        # Keep whatever was already streamed and append the error after it
+        yield f"\n\n{message}" if produced_text else message
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate for budgeting prompts (~4 characters per token for English text).
+    """
+    return max(1, (len(text) + 3) // 4)
+
+
+def summarize_message(message: str) -> str:
+    """
+    Shrinks a chat message into a short stub for older context: code submissions become
+    a one-line placeholder and long text is cut down to its opening.
+    """
+    if message.startswith("--- CODE FROM"):
+        header, _, code = message.partition("\n")
+        source = header.strip("- ").lower()
+        return f"[{source}: {len(code.splitlines())} lines omitted]"
+    if len(message) > CONTEXT_STUB_CHARS:
+        opening = " ".join(message[:CONTEXT_STUB_CHARS].split())
+        return f"{opening}… [truncated, ~{estimate_tokens(message)} tokens]"
+    return message
+
+
+def build_context_history(history: list, token_budget: int = LLM_CONTEXT_TOKEN_BUDGET, summary_cache: dict = None) -> list:
+    """
+    Selects the chat history to send with a contextual query so that the prompt stays
+    within `token_budget` however long the conversation runs.
+
+    Walking back from the newest message, turns are kept verbatim while they fit the
+    budget (code submissions always go in as stubs unless they are the newest message).
+    Turns that don't fit are replaced by their stub; once even stubs no longer fit,
+    older history is dropped.
+
+    Args:
+        history (list): Chat history as ChatMessage records (append-only).
+        token_budget (int): Approximate token budget for the returned history.
+        summary_cache (dict): Per-session cache of stubs, keyed by message position, so
+                              older turns are only summarized once.
+
+    Returns:
+        list: The selected history in chronological order, same format as the input.
+    """
+    if summary_cache is None:
+        summary_cache = {}
+    selected = []
+    remaining = token_budget
+    for index in range(len(history) - 1, -1, -1):
+        msg = history[index]
+        message = msg.message
+        is_newest = index == len(history) - 1
+        cost = estimate_tokens(message)
+        if cost <= remaining and (is_newest or not message.startswith("--- CODE FROM")):
+            selected.append(msg)
+            remaining -= cost
+            continue
+        cache_key = f"{index}:{len(message)}"
+        stub = summary_cache.get(cache_key)
+        if stub is None:
+            stub = summary_cache[cache_key] = summarize_message(message)
+        stub_cost = estimate_tokens(stub)
+        if stub_cost > remaining and not is_newest:
+            break
+        selected.append(ChatMessage(msg.sender, stub))
+        remaining -= stub_cost
+    selected.reverse()
+    return selected
+
+
+def question_cache_key(desired_position: str, years_experience, tech_stack: str) -> tuple:
+    """
+    Builds the question-set cache key: (normalized role, experience bucket, canonical tech stack IDs).
+    """
+    role = " ".join((desired_position or "").lower().split())
+    return (role, experience_bucket(years_experience), stack_key(tech_stack))
+
+
+class QuestionSetCache:
+    """
+    Process-wide LRU + TTL cache of generated question sets.
+
+    Each key holds up to `variants_per_key` distinct question sets. Until a key has
+    collected that many variants, lookups report a miss so a fresh set gets generated;
+    after that, lookups hand out one of the stored variants at random. Entries expire
+    `ttl` seconds after the first variant was stored, so the pool refreshes over time.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, variants_per_key: int):
+        self.variants_per_key = max(1, variants_per_key)
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """Returns a copy of one cached question set for `key`, or None on a miss."""
+        with self._lock:
+            variants = self._cache.get(key)
+            if not variants or len(variants) < self.variants_per_key:
+                return None
+            return list(random.choice(variants))
+
+    def put(self, key: tuple, questions: list) -> None:
+        """Stores `questions` as another variant for `key` (ignored once the key is full)."""
+        if not questions:
+            return
+        with self._lock:
+            variants = self._cache.get(key)
+            if variants is None:
+                self._cache[key] = [list(questions)]
+            elif len(variants) < self.variants_per_key:
+                # Duplicates still count towards the pool so a key always fills up.
+                # Mutate in place so the entry keeps its original expiry time
+                variants.append(list(questions))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+question_cache = QuestionSetCache(QUESTION_CACHE_MAXSIZE, QUESTION_CACHE_TTL_SECONDS, QUESTION_CACHE_VARIANTS)
+
+
+def build_questions_prompt(desired_position: str, years_experience, tech_stack: str) -> str:
+    """
+    Builds the screening-question prompt for the given role, experience and tech stack.
+    The output format is enforced by QUESTION_SET_SCHEMA, not by the prompt.
+    """
+    return (
+        f"You are a technical interviewer for HireMate. Your task is to generate 3 questions for an initial screening. "
+        f"The candidate is applying for the role of '{desired_position}' with {years_experience} years of experience. "
+        f"Their self-declared tech stack is: \"{tech_stack}\".\n\n"
+        "INSTRUCTIONS:\n"
+        "1. The questions must be suitable for an initial screening: focus on fundamental concepts, not deep, complex problems.\n"
+        "2. Create a mix of theoretical and practical questions.\n"
+        "3. Set `type` to \"code\" for questions the candidate answers by writing code, and give the expected programming `language`; otherwise use \"theory\" and an empty language.\n"
+        "4. Rate each question's `difficulty` as easy, medium or hard.\n"
+        "5. For Python coding questions, name the function the candidate must write and give 2-3 `tests`: "
+        "standalone Python assert statements (e.g. `assert reverse('ab') == 'ba'`) that a correct solution passes. "
+        "Leave `tests` empty for every other question."
+    )
+
+
+def build_feedback_prompt(full_name: str, desired_position: str, technical_responses: list, evaluations: dict = None) -> str:
+    """
+    Builds the post-submission feedback prompt from the candidate's question/answer pairs.
+    `evaluations` maps a response index to a one-line automated test summary; code answers
+    that have one are trimmed to FEEDBACK_CODE_CHARS, since the results speak for them.
+    """
+    evaluations = evaluations or {}
+    entries = []
+    for i, r in enumerate(technical_responses):
+        answer = r['answer']
+        if evaluations.get(i):
+            if len(answer) > FEEDBACK_CODE_CHARS:
+                answer = answer[:FEEDBACK_CODE_CHARS] + "\n[... truncated]"
+            answer += f"\n{evaluations[i]}"
+        entries.append(f"Q: {r['question']}\nA: {answer}")
+    responses_str = "\n\n".join(entries)
+    return (
+        "You are a helpful and constructive career coach for HireMate. "
+        f"A candidate named {full_name} has applied for the role of '{desired_position}' and completed an initial screening.\n"
+        f"Here are their answers to the technical questions:\n\n{responses_str}\n\n"
+        "Your task is to provide brief, constructive feedback. "
+        "Based on their answers, identify 1-2 key areas where they seem strong and 1-2 potential areas for improvement relevant to the desired job role. "
+        "Where automated test results are given, use them as evidence about whether the code works, "
+        "alongside your own reading of the code; they can be wrong, so mention any mismatch you see. "
+        "Keep the tone encouraging and professional. Do not judge, but rather guide. Format the output clearly using Markdown."
+    )
+
+
+def parse_numbered_questions(response_text: str) -> list:
+    """
+    Extracts the items of a numbered list ("1. ...") from an LLM response.
+    """
+    questions = []
+    for line in response_text.split('\n'):
+        match = re.match(r'^\s*\d+\.\s*(.*)$', line.strip())
+        if match: questions.append(match.group(1).strip())
+    return questions
+
+
+class ScreeningQuestion(BaseModel):
+    """One generated screening question, as stored in the interview state and the caches."""
+    text: str = Field(min_length=10)
+    type: Literal["theory", "code"]
+    language: str = ""
+    difficulty: Literal["easy", "medium", "hard"] = "medium"
+    tests: list[str] = []
+
+
+class QuestionSet(BaseModel):
+    questions: list[ScreeningQuestion]
+
+
+# Gemini response_schema (OpenAPI subset) mirroring QuestionSet
+QUESTION_SET_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string"},
+                    "type": {"type": "string", "enum": ["theory", "code"]},
+                    "language": {"type": "string"},
+                    "difficulty": {"type": "string", "enum": ["easy", "medium", "hard"]},
+                    "tests": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["text", "type", "language", "difficulty"],
+            },
+        },
+    },
+    "required": ["questions"],
+}
+
+_TYPE_ALIASES = {"code": "code", "coding": "code", "practical": "code", "programming": "code"}
+_DIFFICULTY_ALIASES = {"easy": "easy", "beginner": "easy", "basic": "easy", "medium": "medium", "intermediate": "medium", "hard": "hard", "advanced": "hard", "difficult": "hard"}
+
+
+def _repair_question(item) -> dict:
+    """
+    Coerces one loosely shaped question (a bare string, legacy `[CODE]` tag, synonyms for
+    type/difficulty, a `question` key instead of `text`) into ScreeningQuestion fields.
+    """
+    if isinstance(item, str):
+        item = {"text": item}
+    if not isinstance(item, dict):
+        return None
+    text = str(item.get("text") or item.get("question") or "").strip()
+    qtype = _TYPE_ALIASES.get(str(item.get("type", "")).strip().lower(), "theory")
+    if "[CODE]" in text:
+        text, qtype = text.replace("[CODE]", "").strip(), "code"
+    language = str(item.get("language") or "").strip().lower()
+    tests = item.get("tests") if qtype == "code" and isinstance(item.get("tests"), list) else []
+    return {
+        "text": text,
+        "type": qtype,
+        "language": language if qtype == "code" else "",
+        "difficulty": _DIFFICULTY_ALIASES.get(str(item.get("difficulty", "")).strip().lower(), "medium"),
+        "tests": [str(test) for test in tests if str(test).strip()],
+    }
+
+
+def _extract_json(response_text: str):
+    """Pulls the first JSON object or array out of a reply (tolerates prose and ``` fences)."""
+    starts = [i for i in (response_text.find("{"), response_text.find("[")) if i != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    end = response_text.rfind("}" if response_text[start] == "{" else "]")
+    try:
+        return json.loads(response_text[start:end + 1])
+    except ValueError:
+        return None
+
+
+def parse_question_set(response_text: str) -> list:
+    """
+    Parses a question-set reply into a list of question dicts (ScreeningQuestion fields).
+
+    Schema-valid JSON is accepted as is. Anything else gets a cheap local repair pass
+    (JSON extraction, field coercion, or the legacy numbered-list format) and keeps the
+    questions that validate, instead of sending the candidate back for another LLM round trip.
+    """
+    try:
+        questions = [q.model_dump() for q in QuestionSet.model_validate_json(response_text).questions]
+        metrics.inc("question_parse_total", result="ok")
+        return questions
+    except ValidationError:
+        pass
+
+    data = _extract_json(response_text)
+    if isinstance(data, dict):
+        items = data.get("questions") or []
+    elif isinstance(data, list):
+        items = data
+    else:
+        items = parse_numbered_questions(response_text)
+
+    questions = []
+    for item in items if isinstance(items, list) else []:
+        try:
+            questions.append(ScreeningQuestion.model_validate(_repair_question(item)).model_dump())
+        except ValidationError:
+            continue
+    metrics.inc("question_parse_total", result="repaired" if questions else "failed")
+    return questions
+
+
+def generate_question_set(desired_position: str, years_experience, tech_stack: str, num_questions: int = 3,
+                          fallback=None, outcome: dict = None) -> list:
+    """
+    Generates a fresh question set with Gemini, bypassing the bank and the cache.
+    `fallback` and `outcome` work as in `call_gemini_api` (the fallback returns question-set JSON).
+
+    Returns:
+        list: Up to `num_questions` question dicts (empty if generation failed).
+    """
+    # A fully recognized stack is sent in canonical form, so every spelling that shares a cache
+    # key shares a prompt; anything else keeps the candidate's own words (see display_stack)
+    prompt = build_questions_prompt(desired_position, years_experience, display_stack(tech_stack))
+    generation_config = _genai().types.GenerationConfig(response_mime_type="application/json", response_schema=QUESTION_SET_SCHEMA)
+    response_text = call_gemini_api(prompt, [], generation_config=generation_config, task="questions",
+                                    fallback=fallback, outcome=outcome)
+    return parse_question_set(response_text)[:num_questions]
+
+
+def generate_technical_questions(desired_position: str, years_experience, tech_stack: str, num_questions: int = 3) -> list:
+    """
+    Returns screening questions for a candidate profile: from the precomputed question
+    bank if it covers the profile, else from the shared question-set cache, and only
+    then by calling Gemini. If the questions route is overloaded or over budget, the set
+    comes from local_backend (nearest banked profile or templates) and isn't cached.
+    Profiles without a single recognized technology skip the bank and the cache: their key
+    would be shared by every such candidate for the role and experience bucket.
+
+    Returns:
+        list: Up to `num_questions` question dicts with `text`, `type` ("theory" or "code"),
+              `language` and `difficulty` (empty if generation failed).
+    """
+    key = question_cache_key(desired_position, years_experience, tech_stack)
+    shared = bool(key[2])
+    if shared:
+        from question_bank import get_question_bank
+        bank = get_question_bank()
+        banked = bank.lookup(key) if bank is not None else None
+        metrics.inc("question_bank_lookups_total", result="hit" if banked else "miss")
+        if banked:
+            return banked[:num_questions]
+
+        cached = question_cache.get(key)
+        metrics.inc("question_cache_lookups_total", result="hit" if cached else "miss")
+        if cached:
+            return cached[:num_questions]
+    else:
+        metrics.inc("question_cache_lookups_total", result="skipped")
+
+    outcome = {}
+    questions = generate_question_set(
+        desired_position, years_experience, tech_stack, num_questions,
+        fallback=lambda: json.dumps({"questions": local_backend.question_set(key, num_questions)}), outcome=outcome)
+    # Only cache complete remote sets; a short or empty parse usually means an error reply. A set
+    # written for a stack with unrecognized words may be about those words, which the key leaves out
+    if shared and len(questions) == num_questions and outcome.get("backend") != "local" and is_fully_recognized(tech_stack):
+        question_cache.put(key, questions)
+    return questions
+
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=QUESTION_PREFETCH_WORKERS, thread_name_prefix="question-prefetch")
+
+
+def prefetch_technical_questions(desired_position: str, years_experience, tech_stack: str):
+    """
+    Starts `generate_technical_questions` on a background worker and returns its Future.
+    The result also lands in the shared question cache, so even a discarded prefetch
+    is not wasted work.
+    """
+    return _prefetch_executor.submit(generate_technical_questions, desired_position, years_experience, tech_stack)
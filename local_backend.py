@@ -0,0 +1,154 @@
+"""
+Local, deterministic stand-in for Gemini.
+
+When a task's model route is overloaded, out of retries or over its token budget,
+llm_service serves the task from here instead of answering with an apology: chat replies
+come from a few canned topic answers, question sets from the nearest question-bank profile
+or from templates, and feedback from the automated test results. The same input always
+gets the same output, and nothing here does I/O beyond reading the mapped question bank.
+"""
+import zlib
+
+from answer_cache import content_words
+from tech_stack import TECHNOLOGIES, code_language
+
+# Topic keywords → canned reply; the first topic sharing a content word with the question wins
+CHAT_TOPICS = [
+    ("salary pay bonus benefits equity stock",
+     "Compensation depends on the role, level and location. The recruiter will share the range "
+     "for this position once your screening has been reviewed."),
+    ("remote hybrid office onsite relocation location visa",
+     "Work arrangements (remote, hybrid or on-site) and visa sponsorship vary by team. The "
+     "recruiter will confirm the details for this position when they contact you."),
+    ("next steps process interview rounds timeline long hear back hiring",
+     "After this screening, a recruiter reviews your profile and answers, usually within a few "
+     "business days. If there is a match, they will invite you to the next interview round."),
+    ("status result feedback submit save",
+     "Your answers are saved as you go. Once you submit your profile, you will get written "
+     "feedback here and a recruiter will follow up by email."),
+]
+CHAT_DEFAULT_REPLY = (
+    "I can't look into that right now, but a recruiter will be happy to answer it when they "
+    "follow up. Meanwhile, let's carry on with your screening."
+)
+
+THEORY_TEMPLATES = [
+    "What kinds of problems is {tech} a good fit for, and when would you choose something else instead?",
+    "Describe a bug or performance problem you solved in a {tech} project. How did you track down the cause?",
+    "How do you test and debug your work with {tech}? Walk through the tools and habits you rely on.",
+    "Which {tech} feature or concept did you find hardest to learn, and how would you explain it to a junior colleague?",
+]
+GENERAL_THEORY_TEMPLATES = [
+    "Tell us about a recent project you are proud of as a {role}. What was your part in it?",
+    "How do you decide what to work on first when several urgent requests reach you at once?",
+    "What would you like to learn in your next role, and how do you usually pick up a new technology?",
+]
+# Python questions carry assert tests so code_eval can grade them
+PYTHON_CODE_QUESTIONS = [
+    ("Write a Python function `reverse_words(sentence)` that returns the words of `sentence` in reverse order, separated by single spaces.",
+     ["assert reverse_words('hello big world') == 'world big hello'", "assert reverse_words('one') == 'one'",
+      "assert reverse_words('') == ''"]),
+    ("Write a Python function `is_palindrome(text)` that tells whether `text` reads the same backwards, ignoring case, spaces and punctuation.",
+     ["assert is_palindrome('A man, a plan, a canal: Panama')", "assert not is_palindrome('hello')",
+      "assert is_palindrome('')"]),
+    ("Write a Python function `count_words(text)` that returns a dict mapping each lowercase word in `text` to how often it appears.",
+     ["assert count_words('a b A') == {'a': 2, 'b': 1}", "assert count_words('') == {}"]),
+]
+CODE_TEMPLATES = {
+    "sql": "Write a SQL query that returns the five customers with the highest total order value, given tables `customers(id, name)` and `orders(id, customer_id, amount)`.",
+}
+CODE_TEMPLATE_DEFAULT = "Write a {language} function that removes duplicate values from a list (or array) while keeping the remaining values in their original order."
+
+# Experience bucket (see experience.experience_bucket) → difficulty of the templated questions
+BUCKET_DIFFICULTY = {"entry": "easy", "mid": "medium", "senior": "hard", "staff": "hard"}
+
+
+_TOPIC_WORDS = [(set(content_words(keywords)), reply) for keywords, reply in CHAT_TOPICS]
+
+
+def chat_reply(question: str) -> str:
+    """Canned answer for an off-script question, picked by topic."""
+    words = set(content_words(question))
+    for topic_words, reply in _TOPIC_WORDS:
+        if words & topic_words:
+            return reply
+    return CHAT_DEFAULT_REPLY
+
+
+def _pick(options: list, seed: int, offset: int = 0):
+    return options[(seed + offset) % len(options)]
+
+
+def _bank_question_set(key: tuple):
+    from question_bank import get_question_bank
+    bank = get_question_bank()
+    return bank.nearest(key) if bank is not None else None
+
+
+def templated_question_set(key: tuple, num_questions: int = 3) -> list:
+    """
+    Question set built from templates for a (role, experience bucket, tech stack) key: one
+    coding question in the stack's language (if it has one), the rest about its technologies
+    and the role.
+    """
+    role, bucket, tech_stack = key
+    seed = zlib.crc32("|".join(key).encode("utf-8"))
+    tech_ids = tuple(tech_stack.split(",")) if tech_stack else ()
+    names = [TECHNOLOGIES[i][0] if i in TECHNOLOGIES else i for i in tech_ids]
+    difficulty = BUCKET_DIFFICULTY.get(bucket, "medium")
+
+    theory = [_pick(THEORY_TEMPLATES, seed, i).format(tech=_pick(names, seed, i)) for i in range(min(2, len(names)))]
+    theory += [template.format(role=role or "candidate") for template in GENERAL_THEORY_TEMPLATES]
+    questions = []
+    for text in theory:
+        if all(q["text"] != text for q in questions):
+            questions.append({"text": text, "type": "theory", "language": "", "difficulty": difficulty, "tests": []})
+
+    # The coding question goes second, after a warm-up question
+    language = code_language(tech_ids)
+    if language == "python":
+        text, tests = _pick(PYTHON_CODE_QUESTIONS, seed)
+        questions.insert(1, {"text": text, "type": "code", "language": "python", "difficulty": difficulty, "tests": list(tests)})
+    elif language:
+        text = CODE_TEMPLATES.get(language, CODE_TEMPLATE_DEFAULT.format(language=TECHNOLOGIES[language][0]))
+        questions.insert(1, {"text": text, "type": "code", "language": language, "difficulty": difficulty, "tests": []})
+    return questions[:num_questions]
+
+
+def question_set(key: tuple, num_questions: int = 3) -> list:
+    """
+    Questions for a (role, experience bucket, tech stack) key without calling Gemini: a
+    banked set for the closest profile if the bank has one, else a templated set.
+    """
+    banked = _bank_question_set(key)
+    if banked:
+        return banked[:num_questions]
+    return templated_question_set(key, num_questions)
+
+
+def feedback(full_name: str, desired_position: str, technical_responses: list, evaluations: dict = None) -> str:
+    """Markdown feedback built from the candidate's answers and their automated test summaries."""
+    evaluations = evaluations or {}
+    names = (full_name or "").split()
+    first_name = names[0] if names else "there"
+    lines = [
+        f"**Thank you for completing the screening, {first_name}!**",
+        "",
+        f"Our detailed AI review is busy right now, so this is a short automated summary for the "
+        f"'{desired_position}' role. A recruiter will read your answers in full.",
+        "",
+        "**Your answers**",
+        "",
+    ]
+    for i, response in enumerate(technical_responses):
+        answer = (response.get("answer") or "").strip()
+        summary = evaluations.get(i) or ("Answered." if answer else "No answer given.")
+        lines.append(f"- Question {i + 1}: {summary}")
+    lines += [
+        "",
+        "**Next steps**",
+        "",
+        "- Where tests failed, re-run the examples from the question against your code.",
+        "- Be ready to talk through your reasoning for each answer in the next interview.",
+    ]
+    return "\n".join(lines)
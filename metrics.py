@@ -0,0 +1,230 @@
+"""
+In-process metrics for HireMate: counters, gauges and latency histograms, exported as
+Prometheus text (optional HTTP endpoint) and/or a periodic JSON dump.
+
+    METRICS_PORT=9464               → serves GET /metrics (Prometheus) and /metrics.json
+    METRICS_JSON_PATH=metrics.json  → rewrites the JSON snapshot every METRICS_DUMP_INTERVAL_SECONDS
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH")
+METRICS_DUMP_INTERVAL_SECONDS = float(os.getenv("METRICS_DUMP_INTERVAL_SECONDS", "30"))
+
+# Seconds; covers sub-millisecond state transitions up to long LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(label_key: tuple, extra: tuple = ()) -> str:
+    pairs = label_key + extra
+    if not pairs:
+        return ""
+    escaped = (k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of named metrics with optional labels.
+
+    Gauges that mirror another component's live state (queue depth, in-flight requests)
+    are pulled at export time through collectors registered with `register_collector`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = float(value)
+
+    def observe(self, name: str, value: float, buckets: tuple = DEFAULT_BUCKETS, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """
+        Times the enclosed block into the `{name}_seconds` histogram and counts
+        `{name}_total` with an `outcome` label ("ok" or "error").
+        """
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+            self.inc(f"{name}_total", outcome=outcome, **labels)
+
+    def register_collector(self, collector) -> None:
+        """`collector()` returns {(gauge_name, labels_dict) or gauge_name: value} at export time."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def _collect(self) -> None:
+        for collector in list(self._collectors):
+            try:
+                for name, value in collector().items():
+                    if isinstance(name, tuple):
+                        name, labels = name
+                    else:
+                        labels = {}
+                    self.set_gauge(name, value, **labels)
+            except Exception as e:
+                logger.warning("Metrics: collector %r failed: %s", collector, e)
+
+    def snapshot(self) -> dict:
+        """Returns all metrics as plain JSON-serializable data."""
+        self._collect()
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._gauges.items())],
+                "histograms": [
+                    {"name": n, "labels": dict(l), "count": h.count, "sum": h.sum,
+                     "buckets": dict(zip([str(b) for b in h.buckets], h.counts))}
+                    for (n, l), h in sorted(self._histograms.items())
+                ],
+            }
+
+    def render_prometheus(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        self._collect()
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                seen = set()
+                for (name, label_key), value in sorted(metrics.items()):
+                    if name not in seen:
+                        seen.add(name)
+                        if name in self._help:
+                            lines.append(f"# HELP {name} {self._help[name]}")
+                        lines.append(f"# TYPE {name} {kind}")
+                    lines.append(f"{name}{_format_labels(label_key)} {value}")
+            seen = set()
+            for (name, label_key), histogram in sorted(self._histograms.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(label_key, (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(label_key, (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(label_key)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(label_key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+registry = MetricsRegistry()
+
+_exporter_lock = threading.Lock()
+_exporter_started = False
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = registry.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(registry.snapshot()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _dump_loop(path: str, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            registry.dump_json(path)
+        except OSError as e:
+            logger.warning("Metrics: JSON dump to %s failed: %s", path, e)
+
+
+def start_metrics_exporter() -> None:
+    """
+    Starts the configured exporters once per process: the HTTP endpoint if METRICS_PORT
+    is set and the periodic JSON dump if METRICS_JSON_PATH is set.
+    """
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+        if METRICS_PORT:
+            try:
+                server = ThreadingHTTPServer(("0.0.0.0", int(METRICS_PORT)), _MetricsHandler)
+                threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            except OSError as e:
+                logger.warning("Metrics: could not listen on port %s: %s", METRICS_PORT, e)
+        if METRICS_JSON_PATH:
+            threading.Thread(target=_dump_loop, args=(METRICS_JSON_PATH, METRICS_DUMP_INTERVAL_SECONDS),
+                             name="metrics-json", daemon=True).start()
@@ -0,0 +1,240 @@
+"""
+Precomputed screening-question bank.
+
+An offline batch command generates question sets for every job role × experience bucket ×
+common tech stack and writes them to an uncompressed Arrow IPC file. The app memory-maps
+that file and serves questions from it, so covered profiles never wait on Gemini (and keep
+working while Gemini is rate-limited or down).
+
+    python question_bank.py build --out question_bank.arrow --variants 3 --workers 4
+    python question_bank.py stats --bank question_bank.arrow
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pyarrow as pa
+
+from tech_stack import canonicalize, code_language
+
+logger = logging.getLogger(__name__)
+
+QUESTION_BANK_PATH = os.getenv("QUESTION_BANK_PATH", "question_bank.arrow")
+
+# Representative years of experience used in the prompt for each bucket
+EXPERIENCE_BUCKET_YEARS = {"entry": 1, "mid": 3, "senior": 7, "staff": 12}
+
+COMMON_TECH_STACKS = [
+    "Python", "Python, Django, PostgreSQL", "Python, Flask, REST APIs", "Python, FastAPI",
+    "Python, Pandas, NumPy, scikit-learn", "Python, TensorFlow, PyTorch", "SQL, Tableau, Excel",
+    "Java, Spring Boot", "Java, Spring Boot, Microservices", "Kotlin, Android",
+    "JavaScript, React", "JavaScript, React, Node.js", "TypeScript, Angular", "Vue.js, JavaScript",
+    "Node.js, Express, MongoDB", "HTML, CSS, JavaScript", "Figma, UX Research",
+    "C#, .NET, SQL Server", "C++", "Go", "Go, Kubernetes, Docker", "Rust",
+    "AWS", "AWS, Terraform", "Azure", "GCP", "Docker, Kubernetes", "Linux, Bash, Ansible",
+    "Jenkins, CI/CD, Git", "Swift, iOS", "PHP, Laravel, MySQL", "Ruby on Rails",
+    "Network Security, SIEM", "Penetration Testing, Python", "Jira, Agile, Scrum",
+]
+
+SCHEMA = pa.schema([
+    ("role", pa.dictionary(pa.int16(), pa.string())),
+    ("experience_bucket", pa.dictionary(pa.int8(), pa.string())),
+    ("tech_stack", pa.string()),
+    ("variant", pa.int16()),
+    ("questions", pa.list_(pa.struct([
+        ("text", pa.string()),
+        ("type", pa.string()),
+        ("language", pa.string()),
+        ("difficulty", pa.string()),
+        ("tests", pa.list_(pa.string())),
+    ]))),
+])
+
+
+def validate_question_set(questions: list, tech_stack: str = "", num_questions: int = 3) -> bool:
+    """
+    A usable set has exactly `num_questions` distinct, reasonably sized questions, at least
+    one of them theory. If the stack has a programming language, at least one must be a
+    coding question; otherwise (e.g. "Figma, UX Research") a theory-only set is fine.
+    Questions are already schema-validated.
+    """
+    texts = {q["text"] for q in questions}
+    if len(questions) != num_questions or len(texts) != num_questions:
+        return False
+    if any(len(text) > 600 for text in texts):
+        return False
+    types = {q["type"] for q in questions}
+    required = {"theory", "code"} if code_language(canonicalize(tech_stack)) else {"theory"}
+    return required <= types
+
+
+class QuestionBank:
+    """
+    Read-only, memory-mapped question bank. Only the key columns are materialized into
+    the lookup index; question text stays in the mapped file until it is served.
+    """
+
+    def __init__(self, table: pa.Table, source=None):
+        self._table = table
+        self._source = source  # keeps the memory map open for the table's lifetime
+        self._questions = table.column("questions")
+        self._index = {}
+        keys = zip(table.column("role").to_pylist(), table.column("experience_bucket").to_pylist(), table.column("tech_stack").to_pylist())
+        for row, key in enumerate(keys):
+            self._index.setdefault(key, []).append(row)
+
+    @classmethod
+    def open(cls, path: str) -> "QuestionBank":
+        source = pa.memory_map(path, "r")
+        return cls(pa.ipc.open_file(source).read_all(), source)
+
+    def __len__(self) -> int:
+        return self._table.num_rows
+
+    @property
+    def num_keys(self) -> int:
+        return len(self._index)
+
+    def lookup(self, key: tuple):
+        """Returns one stored question set for a (role, experience bucket, tech stack) key, or None."""
+        rows = self._index.get(key)
+        if not rows:
+            return None
+        return self._questions[random.choice(rows)].as_py()
+
+    def nearest(self, key: tuple):
+        """
+        Returns a stored set for the same role and experience bucket whose tech stack shares
+        the most technologies with `key`'s (ties go to the smaller stack), or None if none
+        overlaps. Deterministic: the same key always gets the same set.
+        """
+        role, bucket, tech_stack = key
+        wanted = set(tech_stack.split(","))
+        best, best_score = None, (0, 0)
+        for candidate in self._index:
+            if candidate[:2] != (role, bucket):
+                continue
+            stack = set(candidate[2].split(","))
+            score = (len(wanted & stack), -len(stack))
+            if score[0] and score > best_score:
+                best, best_score = candidate, score
+        if best is None:
+            return None
+        return self._questions[self._index[best][0]].as_py()
+
+
+_bank_lock = threading.Lock()
+_bank = None
+_bank_loaded = False
+
+
+def get_question_bank():
+    """Opens the bank at QUESTION_BANK_PATH once per process; None if it doesn't exist."""
+    global _bank, _bank_loaded
+    if _bank_loaded:
+        return _bank
+    with _bank_lock:
+        if not _bank_loaded:
+            if os.path.exists(QUESTION_BANK_PATH):
+                try:
+                    _bank = QuestionBank.open(QUESTION_BANK_PATH)
+                    logger.info("Question bank: loaded %d sets for %d profiles from %s", len(_bank), _bank.num_keys, QUESTION_BANK_PATH)
+                except (OSError, pa.ArrowException, KeyError) as e:
+                    logger.warning("Question bank: could not open %s: %s", QUESTION_BANK_PATH, e)
+            _bank_loaded = True
+    return _bank
+
+
+def write_question_bank(path: str, rows: list) -> None:
+    """Writes (role, bucket, stack, variant, questions) rows, sorted by key, as an Arrow IPC file."""
+    rows = sorted(rows, key=lambda r: (r[0], r[1], r[2], r[3]))
+    columns = list(zip(*rows)) if rows else [[], [], [], [], []]
+    table = pa.Table.from_arrays([
+        pa.array(columns[0], pa.string()).dictionary_encode().cast(SCHEMA.field("role").type),
+        pa.array(columns[1], pa.string()).dictionary_encode().cast(SCHEMA.field("experience_bucket").type),
+        pa.array(columns[2], pa.string()),
+        pa.array(columns[3], pa.int16()),
+        pa.array(columns[4], SCHEMA.field("questions").type),
+    ], schema=SCHEMA)
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, SCHEMA) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def build_question_bank(path: str, variants: int, workers: int, tech_stacks: list, attempts: int = 3) -> dict:
+    """
+    Generates `variants` validated question sets for every role × bucket × stack combination
+    with at most `workers` Gemini calls in flight, then writes the bank to `path`.
+    """
+    from conversation_engine import JOB_OPTIONS
+    from llm_service import generate_question_set, question_cache_key
+
+    # The app never looks up profiles without a recognized technology (see generate_technical_questions)
+    skipped = [stack for stack in tech_stacks if not canonicalize(stack)]
+    if skipped:
+        logger.warning("Question bank: skipping stacks with no recognized technology: %s", ", ".join(skipped))
+    tech_stacks = [stack for stack in tech_stacks if canonicalize(stack)]
+    jobs = [(role, bucket, stack, variant)
+            for role in JOB_OPTIONS
+            for bucket in EXPERIENCE_BUCKET_YEARS
+            for stack in tech_stacks
+            for variant in range(variants)]
+
+    def generate(role, bucket, stack, variant):
+        for _ in range(attempts):
+            questions = generate_question_set(role, EXPERIENCE_BUCKET_YEARS[bucket], stack)
+            if validate_question_set(questions, stack):
+                key = question_cache_key(role, EXPERIENCE_BUCKET_YEARS[bucket], stack)
+                return (*key, variant, questions)
+        return None
+
+    rows, failed = [], 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(generate, *job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), start=1):
+            row = future.result()
+            if row is None:
+                failed += 1
+            else:
+                rows.append(row)
+            if done % 50 == 0 or done == len(jobs):
+                print(f"{done}/{len(jobs)} generated ({failed} failed)", file=sys.stderr)
+
+    write_question_bank(path, rows)
+    return {"jobs": len(jobs), "written": len(rows), "failed": failed, "seconds": round(time.monotonic() - started, 1)}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Build or inspect the precomputed question bank")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Generate question sets with Gemini and write the bank")
+    build.add_argument("--out", default=QUESTION_BANK_PATH)
+    build.add_argument("--variants", type=int, default=3, help="Question sets per profile")
+    build.add_argument("--workers", type=int, default=4, help="Concurrent Gemini calls")
+    build.add_argument("--stacks-file", help="Tech stacks to cover, one per line (default: built-in list)")
+
+    stats = subparsers.add_parser("stats", help="Print a summary of an existing bank")
+    stats.add_argument("--bank", default=QUESTION_BANK_PATH)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        tech_stacks = COMMON_TECH_STACKS
+        if args.stacks_file:
+            with open(args.stacks_file, encoding="utf-8") as f:
+                tech_stacks = [line.strip() for line in f if line.strip()]
+        print(build_question_bank(args.out, args.variants, args.workers, tech_stacks))
+    else:
+        bank = QuestionBank.open(args.bank)
+        print({"question_sets": len(bank), "profiles": bank.num_keys, "bytes": os.path.getsize(args.bank)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Compact per-session memory.
+
+Large texts (code answers, generated feedback) are held once in a process-wide,
+content-addressed `PayloadStore`: identical payloads share one `Payload` object no matter
+how many sessions or structures refer to them, and a payload is freed as soon as nothing
+refers to it any more. Chat history entries are `ChatMessage` records with `__slots__`
+that keep small texts inline and reference large ones in the store.
+
+Uploaded code files are size-checked and decoded chunk by chunk instead of being copied
+whole, and `session_footprint` reports how much memory a session's state takes.
+"""
+import codecs
+import hashlib
+import itertools
+import os
+import sys
+import threading
+import weakref
+from dataclasses import fields, is_dataclass
+
+from metrics import registry as metrics
+
+# Texts at least this long go to the payload store instead of being kept inline
+PAYLOAD_INLINE_CHARS = int(os.getenv("PAYLOAD_INLINE_CHARS", "1024"))
+# Largest accepted code answer (editor text or uploaded file)
+CODE_ANSWER_MAX_BYTES = int(os.getenv("CODE_ANSWER_MAX_BYTES", str(200 * 1024)))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class PayloadTooLarge(ValueError):
+    pass
+
+
+class Payload:
+    """One stored text, identified by its content hash."""
+    __slots__ = ("digest", "text", "__weakref__")
+
+    def __init__(self, digest: str, text: str):
+        self.digest = digest
+        self.text = text
+
+
+class PayloadStore:
+    """
+    Content-addressed store of large texts. Entries are held weakly: the store only
+    deduplicates, and a payload lives exactly as long as some record refers to it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._payloads = weakref.WeakValueDictionary()
+        self.deduplicated = 0
+
+    def put(self, text: str) -> Payload:
+        """Returns the shared Payload for `text`, storing it if it isn't held yet."""
+        digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        with self._lock:
+            payload = self._payloads.get(digest)
+            if payload is None:
+                payload = self._payloads[digest] = Payload(digest, text)
+            else:
+                self.deduplicated += 1
+            return payload
+
+    def stats(self) -> dict:
+        with self._lock:
+            payloads = list(self._payloads.values())
+        return {
+            "entries": len(payloads),
+            "bytes": sum(sys.getsizeof(p.text) for p in payloads),
+            "deduplicated": self.deduplicated,
+        }
+
+
+payload_store = PayloadStore()
+
+
+def store_text(text: str):
+    """`text` itself if it is small, else its shared Payload."""
+    if len(text) < PAYLOAD_INLINE_CHARS:
+        return text
+    return payload_store.put(text)
+
+
+def shared_text(text: str) -> str:
+    """
+    The stored copy of a large `text` (so every structure holding it shares one string
+    object), or `text` itself if it is small.
+    """
+    body = store_text(text)
+    return body if type(body) is str else body.text
+
+
+_message_ids = itertools.count(1)
+
+
+class ChatMessage:
+    """One chat history entry: `sender` ("user" or "bot"), `message` text and a process-unique `id`."""
+    __slots__ = ("id", "sender", "_body")
+
+    def __init__(self, sender: str, message: str):
+        self.id = next(_message_ids)
+        self.sender = sys.intern(sender)
+        self._body = store_text(message)
+
+    @property
+    def message(self) -> str:
+        body = self._body
+        return body if type(body) is str else body.text
+
+    def __repr__(self) -> str:
+        return f"ChatMessage({self.sender!r}, {self.message[:40]!r})"
+
+
+def decode_upload(file, max_bytes: int = CODE_ANSWER_MAX_BYTES) -> str:
+    """
+    Reads an uploaded text file as UTF-8 in chunks (invalid bytes become U+FFFD).
+
+    Raises:
+        PayloadTooLarge: The file is larger than `max_bytes`.
+    """
+    size = getattr(file, "size", None)
+    if size is not None and size > max_bytes:
+        raise PayloadTooLarge(f"The file is {size // 1024} KB; the limit is {max_bytes // 1024} KB.")
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts, read = [], 0
+    file.seek(0)
+    while chunk := file.read(UPLOAD_CHUNK_BYTES):
+        read += len(chunk)
+        if read > max_bytes:
+            raise PayloadTooLarge(f"The file is larger than the {max_bytes // 1024} KB limit.")
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+
+def check_answer_size(text: str, max_bytes: int = CODE_ANSWER_MAX_BYTES) -> None:
+    """Raises PayloadTooLarge for editor answers over the limit (measured in UTF-8 bytes)."""
+    if len(text.encode("utf-8")) > max_bytes:
+        raise PayloadTooLarge(f"Your answer is over the {max_bytes // 1024} KB limit.")
+
+
+def session_footprint(*objects) -> int:
+    """
+    Approximate bytes held by `objects` (chat history, engine state, ...), following
+    containers, dataclasses, slotted records and payloads. Objects reachable several times
+    are counted once; payloads shared with other sessions are counted in full.
+    """
+    seen = set()
+    total = 0
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or obj is None or isinstance(obj, (type, bool, int, float)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, ChatMessage):
+            stack.append(obj._body)
+        elif isinstance(obj, Payload):
+            stack.append(obj.text)
+        elif is_dataclass(obj):
+            stack.extend(getattr(obj, f.name) for f in fields(obj))
+    return total
+
+
+def record_session_footprint(*objects) -> int:
+    """Measures a session with `session_footprint` and records it in the session_memory_bytes histogram."""
+    size = session_footprint(*objects)
+    metrics.observe("session_memory_bytes", size, buckets=(16e3, 32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6))
+    return size
+
+
+metrics.register_collector(lambda: {f"payload_store_{key}": value for key, value in payload_store.stats().items()})
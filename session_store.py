@@ -0,0 +1,258 @@
+"""
+Externalized interview sessions.
+
+Everything needed to continue an interview (the engine state, the chat history, pending
+code submissions and the feedback job) is written to a `SessionStore` as msgpack under a
+random session token, so a candidate can reconnect to any replica (or the same one after
+a restart) and pick up where they left off.
+
+Writes are incremental: the chat history is append-only, so each new message is one small
+row, and every other value (down to each technical response and code submission) is its
+own key that is only rewritten when its packed bytes change. `SQLiteSessionStore` is the local backend; a shared store (Redis, Firestore, ...)
+implements the same three methods.
+"""
+import hashlib
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, fields
+
+import msgpack
+
+from conversation_engine import EvaluateCode, InterviewState
+from metrics import registry as metrics
+from session_memory import ChatMessage, shared_text
+
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", ".sessions.sqlite3")
+# Sessions untouched for this long are deleted when the store is opened
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+_INTERVIEW_PREFIX = "interview."
+_RESPONSE_PREFIX = "response."
+_RESPONSE_COUNT = "response_count"
+_CODE_SUBMISSION_PREFIX = "code_submission."
+_CODE_SUBMISSION_INDEXES = "code_submission_indexes"
+
+
+def new_session_token() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def pack(value) -> bytes:
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def unpack(data: bytes):
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class SessionStore(ABC):
+    """Storage backend: packed values per (token, key) plus an append-only message log per token."""
+
+    @abstractmethod
+    def load(self, token: str):
+        """Returns ({key: packed value}, [packed message, ...]) for a session, or None if it is unknown or expired."""
+
+    @abstractmethod
+    def write(self, token: str, values: dict, messages: list, first_seq: int) -> None:
+        """
+        Atomically stores the changed `values` ({key: packed bytes}) and appends `messages`
+        (packed) at positions first_seq, first_seq + 1, ...; messages from `first_seq` on
+        are replaced.
+        """
+
+    @abstractmethod
+    def delete(self, token: str) -> None:
+        """Removes everything stored for a session."""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS session_values (
+    token TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, PRIMARY KEY (token, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session_messages (
+    token TEXT NOT NULL, seq INTEGER NOT NULL, value BLOB NOT NULL, PRIMARY KEY (token, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at);
+"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store in a local SQLite file (WAL mode, one connection per thread). Replicas
+    on the same host or a shared volume can use it directly.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        self.purge_expired()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, token: str):
+        conn = self._conn()
+        row = conn.execute("SELECT updated_at FROM sessions WHERE token = ?", (token,)).fetchone()
+        if row is None or row[0] < time.time() - self.ttl_seconds:
+            return None
+        values = dict(conn.execute("SELECT key, value FROM session_values WHERE token = ?", (token,)).fetchall())
+        messages = [value for (value,) in conn.execute(
+            "SELECT value FROM session_messages WHERE token = ? ORDER BY seq", (token,)).fetchall()]
+        return values, messages
+
+    def write(self, token: str, values: dict, messages: list, first_seq: int) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR REPLACE INTO sessions (token, updated_at) VALUES (?, ?)", (token, time.time()))
+            conn.executemany("INSERT OR REPLACE INTO session_values (token, key, value) VALUES (?, ?, ?)",
+                             [(token, key, value) for key, value in values.items()])
+            conn.execute("DELETE FROM session_messages WHERE token = ? AND seq >= ?", (token, first_seq))
+            conn.executemany("INSERT INTO session_messages (token, seq, value) VALUES (?, ?, ?)",
+                             [(token, first_seq + i, value) for i, value in enumerate(messages)])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, token: str) -> None:
+        conn = self._conn()
+        for table in ("session_values", "session_messages", "sessions"):
+            conn.execute(f"DELETE FROM {table} WHERE token = ?", (token,))
+
+    def purge_expired(self) -> None:
+        conn = self._conn()
+        cutoff = time.time() - self.ttl_seconds
+        expired = "SELECT token FROM sessions WHERE updated_at < ?"
+        conn.execute(f"DELETE FROM session_values WHERE token IN ({expired})", (cutoff,))
+        conn.execute(f"DELETE FROM session_messages WHERE token IN ({expired})", (cutoff,))
+        conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+
+
+def _digest(packed: bytes) -> bytes:
+    return hashlib.blake2b(packed, digest_size=16).digest()
+
+
+class SessionWriter:
+    """
+    Writes one session's changes to a store. Remembers what was last written (a digest of
+    each packed value, number of chat messages), so `save` only sends the difference.
+    """
+
+    def __init__(self, store: SessionStore, token: str):
+        self.store = store
+        self.token = token
+        self._written = {}
+        self._messages_written = 0
+
+    def save(self, values: dict, chat_history: list) -> int:
+        """Stores the values whose packed form changed plus new chat messages; returns the bytes written."""
+        changed = {}
+        for key, value in values.items():
+            packed = pack(value)
+            if self._written.get(key) != _digest(packed):
+                changed[key] = packed
+        first_seq = self._messages_written if len(chat_history) >= self._messages_written else 0
+        messages = [pack((message.sender, message.message)) for message in chat_history[first_seq:]]
+        if not changed and not messages:
+            return 0
+        with metrics.span("session_store_write"):
+            self.store.write(self.token, changed, messages, first_seq)
+        self._written.update((key, _digest(packed)) for key, packed in changed.items())
+        self._messages_written = len(chat_history)
+        written = sum(map(len, changed.values())) + sum(map(len, messages))
+        metrics.inc("session_store_bytes_written_total", written)
+        return written
+
+    def restore(self):
+        """Loads the session: returns ({key: value}, [ChatMessage, ...]), or None if the store doesn't have it."""
+        loaded = self.store.load(self.token)
+        if loaded is None:
+            return None
+        values, messages = loaded
+        self._written = {key: _digest(packed) for key, packed in values.items()}
+        self._messages_written = len(messages)
+        return {key: unpack(value) for key, value in values.items()}, [ChatMessage(*unpack(message)) for message in messages]
+
+
+def interview_values(state: InterviewState) -> dict:
+    """
+    The engine state as one store value per field, with each technical response under its
+    own key: answering a question adds one value and leaves the profile and earlier
+    answers (which can be large code blobs) untouched.
+    """
+    values = {}
+    for name, value in asdict(state).items():
+        if name == "candidate_info":
+            responses = value.pop("technicalResponses")
+            values[_RESPONSE_COUNT] = len(responses)
+            values.update((f"{_RESPONSE_PREFIX}{i}", response) for i, response in enumerate(responses))
+        values[_INTERVIEW_PREFIX + name] = value
+    return values
+
+
+def restore_interview(values: dict) -> InterviewState:
+    state = InterviewState(**{f.name: values[_INTERVIEW_PREFIX + f.name] for f in fields(InterviewState)
+                              if _INTERVIEW_PREFIX + f.name in values})
+    info = state.candidate_info
+    if "technicalResponses" not in info:  # sessions saved before responses had keys of their own
+        info["technicalResponses"] = [values[f"{_RESPONSE_PREFIX}{i}"] for i in range(values.get(_RESPONSE_COUNT, 0))]
+    # Share large answers with the restored chat history instead of holding them twice
+    for response in info["technicalResponses"]:
+        response["answer"] = shared_text(response["answer"])
+    return state
+
+
+def code_submission_values(code_submissions: dict, state: InterviewState) -> dict:
+    """
+    EvaluateCode effects as plain dicts, one key per response index; their evaluation
+    Futures are not stored, and neither is an answer already stored with its response.
+    """
+    responses = state.candidate_info["technicalResponses"]
+    values = {_CODE_SUBMISSION_INDEXES: sorted(code_submissions)}
+    for index, submission in code_submissions.items():
+        value = asdict(submission)
+        if index < len(responses) and responses[index]["answer"] == value["answer"]:
+            del value["answer"]
+        values[f"{_CODE_SUBMISSION_PREFIX}{index}"] = value
+    return values
+
+
+def restore_code_submissions(values: dict, state: InterviewState) -> dict:
+    if _CODE_SUBMISSION_INDEXES in values:
+        stored = [values[f"{_CODE_SUBMISSION_PREFIX}{i}"] for i in values[_CODE_SUBMISSION_INDEXES]]
+    else:  # sessions saved before submissions had keys of their own
+        stored = values.get("code_submissions", [])
+    responses = state.candidate_info["technicalResponses"]
+    submissions = {}
+    for value in stored:
+        answer = value["answer"] if "answer" in value else responses[value["response_index"]]["answer"]
+        submissions[value["response_index"]] = EvaluateCode(**dict(value, answer=shared_text(answer), tests=tuple(value["tests"])))
+    return submissions
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide session store, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SQLiteSessionStore(SESSION_STORE_PATH, SESSION_TTL_SECONDS)
+        return _store
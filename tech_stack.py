@@ -0,0 +1,246 @@
+"""
+Tech-stack canonicalization.
+
+Candidates describe their stack as free text ("py, Django & postgres", "Python3/django/PostgreSQL").
+`canonicalize` turns that into a stable, sorted tuple of canonical technology IDs so the
+question bank, the question cache and the prompts all see the same stack:
+
+    canonicalize("Python3/django & postgres 14")  -> ("django", "postgresql", "python")
+    stack_key(...)                                -> "django,postgresql,python"
+    display_stack(...)                            -> "Django, PostgreSQL, Python"
+
+Aliases (including multi-word ones like "amazon web services") are compiled once into a
+token trie; lookups are a regex tokenization plus a greedy longest-match walk, and results
+are memoized, so this stays in the microsecond range on the candidate's path.
+Words that aren't technologies are left out; aliases that double as everyday words ("go",
+"next", "rest") only count in a clause that lists technologies and nothing else.
+"""
+import re
+from functools import lru_cache
+
+# canonical ID -> (display name, aliases). The display name and the ID itself are aliases too.
+TECHNOLOGIES = {
+    "python": ("Python", ["py", "python3", "cpython"]),
+    "django": ("Django", ["django rest framework", "drf"]),
+    "flask": ("Flask", []),
+    "fastapi": ("FastAPI", ["fast api"]),
+    "pandas": ("Pandas", []),
+    "numpy": ("NumPy", []),
+    "scikit-learn": ("scikit-learn", ["sklearn", "scikit learn", "scikit"]),
+    "tensorflow": ("TensorFlow", ["tf", "keras"]),
+    "pytorch": ("PyTorch", ["torch"]),
+    "machine-learning": ("Machine Learning", ["ml", "machine learning"]),
+    "java": ("Java", ["jdk", "j2ee", "java ee"]),
+    "spring": ("Spring", ["spring boot", "springboot", "spring framework"]),
+    "kotlin": ("Kotlin", []),
+    "android": ("Android", []),
+    "swift": ("Swift", ["swiftui"]),
+    "ios": ("iOS", []),
+    "javascript": ("JavaScript", ["js", "ecmascript", "es6", "vanilla js"]),
+    "typescript": ("TypeScript", ["ts"]),
+    "react": ("React", ["reactjs", "react.js", "react js"]),
+    "react-native": ("React Native", ["react native"]),
+    "angular": ("Angular", ["angularjs", "angular.js"]),
+    "vue": ("Vue.js", ["vuejs", "vue.js", "vue js"]),
+    "nextjs": ("Next.js", ["next.js", "next js", "next"]),
+    "nodejs": ("Node.js", ["node", "node.js", "node js"]),
+    "express": ("Express", ["expressjs", "express.js"]),
+    "html": ("HTML", ["html5"]),
+    "css": ("CSS", ["css3", "scss", "sass", "tailwind", "tailwindcss"]),
+    "csharp": ("C#", ["c#", "c sharp"]),
+    "dotnet": (".NET", [".net", "dotnet core", ".net core", "asp.net", "asp.net core"]),
+    "cpp": ("C++", ["c++", "cplusplus"]),
+    "c": ("C", []),
+    "go": ("Go", ["golang"]),
+    "rust": ("Rust", []),
+    "php": ("PHP", []),
+    "laravel": ("Laravel", []),
+    "ruby": ("Ruby", []),
+    "rails": ("Ruby on Rails", ["ruby on rails", "ror"]),
+    "sql": ("SQL", ["t-sql", "tsql", "pl/sql", "plsql"]),
+    "postgresql": ("PostgreSQL", ["postgres", "psql", "pg", "pgsql"]),
+    "mysql": ("MySQL", ["mariadb"]),
+    "sql-server": ("SQL Server", ["sql server", "mssql", "ms sql"]),
+    "mongodb": ("MongoDB", ["mongo"]),
+    "redis": ("Redis", []),
+    "graphql": ("GraphQL", []),
+    "rest": ("REST APIs", ["rest api", "rest apis", "restful", "restful apis"]),
+    "microservices": ("Microservices", ["microservice"]),
+    "aws": ("AWS", ["amazon web services", "amazon aws"]),
+    "azure": ("Azure", ["microsoft azure"]),
+    "gcp": ("GCP", ["google cloud", "google cloud platform"]),
+    "docker": ("Docker", []),
+    "kubernetes": ("Kubernetes", ["k8s", "kube"]),
+    "terraform": ("Terraform", []),
+    "ansible": ("Ansible", []),
+    "jenkins": ("Jenkins", []),
+    "ci-cd": ("CI/CD", ["ci/cd", "cicd", "ci cd"]),
+    "git": ("Git", ["github", "gitlab"]),
+    "linux": ("Linux", ["unix"]),
+    "bash": ("Bash", ["shell", "shell scripting"]),
+    "excel": ("Excel", ["ms excel"]),
+    "tableau": ("Tableau", []),
+    "power-bi": ("Power BI", ["powerbi", "power bi"]),
+    "figma": ("Figma", []),
+    "ux-research": ("UX Research", ["ux research", "user research"]),
+    "agile": ("Agile", ["scrum", "kanban"]),
+    "jira": ("Jira", []),
+    "siem": ("SIEM", ["splunk"]),
+    "network-security": ("Network Security", ["network security"]),
+    "penetration-testing": ("Penetration Testing", ["pentesting", "pen testing", "penetration testing"]),
+}
+
+# Canonical technology IDs that are programming languages (and the `language` of a code question)
+CODE_LANGUAGES = frozenset({
+    "python", "javascript", "typescript", "java", "kotlin", "swift", "csharp", "cpp", "c", "go",
+    "rust", "php", "ruby", "sql",
+})
+# Frameworks imply their language when no language was declared
+IMPLIED_LANGUAGES = {
+    "django": "python", "flask": "python", "fastapi": "python", "pandas": "python", "numpy": "python",
+    "scikit-learn": "python", "tensorflow": "python", "pytorch": "python", "spring": "java",
+    "android": "kotlin", "ios": "swift", "react": "javascript", "react-native": "javascript",
+    "angular": "typescript", "vue": "javascript", "nextjs": "javascript", "nodejs": "javascript",
+    "express": "javascript", "dotnet": "csharp", "laravel": "php", "rails": "ruby",
+    "postgresql": "sql", "mysql": "sql", "sql-server": "sql",
+}
+
+# Aliases that are also everyday words ("go next", "the rest of"). On their own they only count
+# in a clause made up entirely of technologies ("Go, Kubernetes", "Kubernetes and Go");
+# spelled unambiguously ("golang", "next.js", "REST APIs") they always count
+AMBIGUOUS_ALIASES = frozenset({
+    "go", "next", "rest", "c", "express", "node", "spring", "swift", "rust", "ruby", "react",
+    "shell", "excel", "agile",
+})
+
+# Filler words dropped between technologies
+STOPWORDS = frozenset({"and", "with", "also", "using", "plus", "in", "of", "the", "a", "an", "etc", "framework", "frameworks", "language", "languages"})
+
+# "c++", "c#", ".net", "node.js", "ci/cd", "pl/sql" stay single tokens; other punctuation splits
+_TOKEN_PATTERN = re.compile(r"ci/cd|pl/sql|\.?[a-z0-9][a-z0-9+#.\-]*")
+_VERSION_TOKEN = re.compile(r"v?\d+(\.(\d+|x))*x?")
+_VERSION_SUFFIX = re.compile(r"(?<=[a-z+#])[\-.]?v?\d+(\.(\d+|x))*x?$")
+
+# Punctuation that separates list items or clauses
+_CLAUSE_BREAK = re.compile(r"[,;:|()\n]+")
+
+_TERMINAL = ""  # trie key holding the canonical ID; can't collide with a (non-empty) token
+
+
+def tokenize(text: str) -> list:
+    """Lowercases `text` and splits it into technology-ish tokens, dropping stopwords and bare version numbers."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall((text or "").lower()):
+        token = token.rstrip(".-")
+        if token and token not in STOPWORDS and not _VERSION_TOKEN.fullmatch(token):
+            tokens.append(token)
+    return tokens
+
+
+def strip_version(token: str) -> str:
+    """'python3' -> 'python', 'angular-15' -> 'angular', 'vue.js' -> 'vue.js'."""
+    if not (token[-1].isdigit() or token[-1] == "x"):
+        return token
+    return _VERSION_SUFFIX.sub("", token)
+
+
+def _compile_trie(technologies: dict) -> dict:
+    trie = {}
+    for canonical_id, (display_name, aliases) in technologies.items():
+        for alias in [canonical_id, display_name, *aliases]:
+            node = trie
+            for token in tokenize(alias):
+                node = node.setdefault(token, {})
+            node[_TERMINAL] = canonical_id
+    return trie
+
+
+_ALIAS_TRIE = _compile_trie(TECHNOLOGIES)
+
+
+def _match(tokens: list, start: int):
+    """Longest alias starting at tokens[start]; returns (canonical_id, tokens consumed) or (None, 0)."""
+    node, best, consumed = _ALIAS_TRIE, (None, 0), 0
+    for token in tokens[start:]:
+        child = node.get(token)
+        if child is None:
+            child = node.get(strip_version(token))
+        if child is None:
+            break
+        node = child
+        consumed += 1
+        if _TERMINAL in node:
+            best = (node[_TERMINAL], consumed)
+    return best
+
+
+@lru_cache(maxsize=4096)
+def _resolve(tech_stack: str) -> tuple:
+    """(sorted tuple of unique canonical IDs, whether every token belonged to a known technology)."""
+    ids = set()
+    complete = True
+    for clause in _CLAUSE_BREAK.split(tech_stack or ""):
+        tokens = tokenize(clause)
+        matches = []  # (canonical ID or None, matched an ambiguous alias)
+        i = 0
+        while i < len(tokens):
+            canonical_id, consumed = _match(tokens, i)
+            if canonical_id is None:
+                matches.append((None, False))
+                i += 1
+                continue
+            matches.append((canonical_id, consumed == 1 and strip_version(tokens[i]) in AMBIGUOUS_ALIASES))
+            i += consumed
+        # An everyday word next to other words is taken as prose, not as a technology
+        plain_words = any(canonical_id is None for canonical_id, _ in matches)
+        for canonical_id, ambiguous in matches:
+            if canonical_id is None or (plain_words and ambiguous):
+                complete = False
+            else:
+                ids.add(canonical_id)
+    return tuple(sorted(ids)), complete
+
+
+def canonicalize(tech_stack: str) -> tuple:
+    """
+    Maps a free-text tech stack to a sorted tuple of unique canonical technology IDs.
+    Unknown words are left out ("3 years of Python" -> ("python",)).
+    """
+    return _resolve(tech_stack)[0]
+
+
+def is_fully_recognized(tech_stack: str) -> bool:
+    """True if every word of the stack (stopwords and versions aside) named a known technology."""
+    return _resolve(tech_stack)[1]
+
+
+def code_language(tech_ids: tuple) -> str:
+    """The stack's programming language (canonical ID), declared or implied by a framework; "" if none."""
+    for tech_id in tech_ids:
+        if tech_id in CODE_LANGUAGES:
+            return tech_id
+    for tech_id in tech_ids:
+        if tech_id in IMPLIED_LANGUAGES:
+            return IMPLIED_LANGUAGES[tech_id]
+    return ""
+
+
+def stack_key(tech_stack: str) -> str:
+    """Canonical cache key for a free-text stack, e.g. "django,postgresql,python"."""
+    return ",".join(canonicalize(tech_stack))
+
+
+def display_stack(tech_stack: str) -> str:
+    """
+    Stack description for prompts. A fully recognized stack is listed by display name, e.g.
+    "Django, PostgreSQL, Python"; otherwise the candidate's own text is kept, followed by the
+    technologies recognized in it, so nothing they wrote is lost.
+    """
+    ids, complete = _resolve(tech_stack)
+    raw = (tech_stack or "").strip()
+    names = ", ".join(TECHNOLOGIES[i][0] for i in ids)
+    if ids and complete:
+        return names
+    if ids:
+        return f"{raw} (recognized: {names})"
+    return raw
@@ -0,0 +1,67 @@
+import pytest
+
+from answer_cache import SemanticAnswerCache, content_words, is_cacheable_answer, is_cacheable_question
+
+SALARY = "The salary range is shared by the recruiter after the first round."
+
+
+def make_cache(capacity=8, ttl=3600):
+    return SemanticAnswerCache(capacity, 1024, 0.8, ttl)
+
+
+def test_content_words_drop_filler_and_map_synonyms():
+    assert content_words("How much does the role pay?") == ["salary"]
+
+
+def test_reworded_question_hits():
+    cache = make_cache()
+    cache.add("What is the salary for this role?", SALARY)
+    answer, score = cache.lookup("how much does this job pay")
+    assert answer == SALARY and score >= 0.8
+
+
+def test_unrelated_question_misses():
+    cache = make_cache()
+    cache.add("What is the salary for this role?", SALARY)
+    assert cache.lookup("Is remote work allowed?")[0] is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_entries_are_not_served():
+    cache = make_cache(ttl=-1)
+    cache.add("What is the salary for this role?", SALARY)
+    assert cache.lookup("What is the salary for this role?")[0] is None
+
+
+def test_pinned_entries_survive_eviction_and_are_not_overwritten():
+    cache = make_cache(capacity=2)
+    cache.add("What is the salary for this role?", SALARY, pinned=True)
+    cache.add("Is remote work allowed?", "Hybrid, two days a week.")
+    cache.add("Do you sponsor visas?", "Yes, for senior roles.")
+    cache.add("What is the salary for this role?", "Generated answer")
+    assert len(cache) == 2
+    assert cache.lookup("What is the salary for this role?")[0] == SALARY
+    assert cache.lookup("Do you sponsor visas?")[0] == "Yes, for senior roles."
+    assert cache.lookup("Is remote work allowed?")[0] is None
+
+
+@pytest.mark.parametrize("question, cacheable", [
+    ("What is the salary for this role?", True),
+    ("Do you offer visa sponsorship?", True),
+    ("What's next?", False),
+    ("What happens now?", False),
+    ("What's my application status?", False),
+    ("Can you explain that again?", False),
+    ("Is 50000 the salary?", False),
+    ("Email me at jane@example.com", False),
+    ("", False),
+])
+def test_is_cacheable_question(question, cacheable):
+    assert is_cacheable_question(question) is cacheable
+
+
+def test_is_cacheable_answer():
+    assert is_cacheable_answer(SALARY, "Jane Doe")
+    assert not is_cacheable_answer("Thanks Jane, the salary is shared later.", "Jane Doe")
+    assert not is_cacheable_answer("")
+    assert not is_cacheable_answer("x" * 5000)
@@ -0,0 +1,66 @@
+from html.parser import HTMLParser
+
+import pytest
+
+from chat_render import format_message
+
+
+class _Elements(HTMLParser):
+    """Collects the (tag, attributes) of every element the browser would build."""
+
+    def __init__(self):
+        super().__init__()
+        self.elements = []
+
+    def handle_starttag(self, tag, attrs):
+        self.elements.append((tag, dict(attrs)))
+
+
+def elements(rendered):
+    parser = _Elements()
+    parser.feed(rendered)
+    return parser.elements
+
+
+@pytest.mark.parametrize("text", [
+    "<script>alert(1)</script>",
+    '<img src=x onerror="alert(1)">',
+    '<a href="#" onclick="alert(1)">click</a>',
+    "[click](javascript:alert(1))",
+    "![x](https://evil.example/track.png)",
+    '<iframe src="https://evil.example"></iframe>',
+])
+@pytest.mark.parametrize("sender", ["bot", "user"])
+def test_no_active_content_survives(sender, text):
+    for tag, attrs in elements(format_message(sender, text)):
+        assert tag not in ("script", "img", "iframe")
+        assert not any(name.startswith("on") for name in attrs)
+        assert not (attrs.get("href") or "").lower().startswith("javascript:")
+
+
+def test_bot_markdown_is_rendered():
+    rendered = format_message("bot", "## Feedback\n- **Good** use of `map`\n- Tests pass")
+    assert "<h2>Feedback</h2>" in rendered
+    assert "<li><strong>Good</strong> use of <code>map</code></li>" in rendered
+
+
+def test_bot_links_keep_safe_urls_with_rel():
+    rendered = format_message("bot", "[docs](https://docs.python.org)")
+    assert 'href="https://docs.python.org"' in rendered
+    assert 'rel="noopener noreferrer nofollow"' in rendered
+
+
+def test_user_html_is_escaped_not_rendered():
+    rendered = format_message("user", "<b>hi</b> **there**")
+    assert "&lt;b&gt;hi&lt;/b&gt;" in rendered
+    assert "<strong>there</strong>" in rendered
+    assert format_message("user", "# not a heading").count("<h1>") == 0
+
+
+def test_user_code_fences_are_escaped_code_blocks():
+    rendered = format_message("user", "```python\nif a < b:\n    pass\n```")
+    assert "<pre><code>if a &lt; b:&#10;    pass</code></pre>" in rendered
+
+
+def test_messages_render_on_one_line():
+    assert "\n" not in format_message("bot", "line one\n\n```\ncode\n\nmore\n```")
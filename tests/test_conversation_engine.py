@@ -0,0 +1,134 @@
+from conversation_engine import (
+    CancelPrefetch, CodeSubmitted, ContextualReply, ContextualReplyReady, EvaluateCode, ExperienceConfirmed,
+    FeedbackReady, GenerateQuestions, InterviewState, PhoneConfirmed, PositionSelected, PrefetchQuestions,
+    ProfileSaved, QuestionsReady, RequestFeedback, SaveProfile, SaveRequested, SendMessage, UserMessage,
+    WELCOME_MESSAGES, start_interview, transition,
+)
+
+QUESTIONS = [
+    {"text": "What is a list?", "type": "theory", "language": "", "difficulty": "easy", "tests": []},
+    {"text": "Write add(a, b).", "type": "code", "language": "python", "difficulty": "easy",
+     "tests": ["assert add(1, 2) == 3"]},
+]
+
+
+def run(state, *events):
+    effects = []
+    for event in events:
+        state, new_effects = transition(state, event)
+        effects += new_effects
+    return state, effects
+
+
+def at_tech_stack():
+    state, _ = run(InterviewState(), UserMessage("Jane Doe"), UserMessage("jane@example.com"), UserMessage("Pune"),
+                   PhoneConfirmed("+91 99999"), ExperienceConfirmed(3), PositionSelected("Software Engineer"))
+    return state
+
+
+def asking_questions():
+    state, _ = run(at_tech_stack(), UserMessage("Python"), UserMessage("ok"), QuestionsReady(QUESTIONS))
+    return state
+
+
+def test_start_interview_greets():
+    state, effects = start_interview()
+    assert state.stage == "name"
+    assert effects == [SendMessage("bot", text) for text in WELCOME_MESSAGES]
+
+
+def test_profile_stages_in_order():
+    stages = []
+    state = InterviewState()
+    for event in [UserMessage("Jane Doe"), UserMessage("jane@example.com"), UserMessage("Pune"),
+                  PhoneConfirmed("+91 99999"), ExperienceConfirmed(3), PositionSelected("Software Engineer")]:
+        state, _ = transition(state, event)
+        stages.append(state.stage)
+    assert stages == ["email", "currentLocation", "phoneNumber", "experience", "positions_select", "techStack"]
+    assert state.candidate_info["fullName"] == "Jane Doe"
+    assert state.candidate_info["yearsExperience"] == 3
+
+
+def test_invalid_email_keeps_stage():
+    state, _ = run(InterviewState(), UserMessage("Jane Doe"))
+    new_state, effects = transition(state, UserMessage("not-an-email"))
+    assert new_state.stage == "email"
+    assert new_state.candidate_info["email"] == ""
+    assert "valid email" in effects[-1].text
+
+
+def test_transition_does_not_mutate_the_input_state():
+    state = InterviewState()
+    transition(state, UserMessage("Jane Doe"))
+    assert state.stage == "name"
+    assert state.candidate_info["fullName"] == ""
+
+
+def test_tech_stack_prefetches_and_consent_generates():
+    state, effects = transition(at_tech_stack(), UserMessage("Python, Django"))
+    assert state.stage == "awaitingQuestionsConsent"
+    assert PrefetchQuestions("Software Engineer", 3, "Python, Django") in effects
+
+    state, effects = transition(state, UserMessage("maybe later"))
+    assert not any(isinstance(effect, GenerateQuestions) for effect in effects)
+    state, effects = transition(state, UserMessage("OK"))
+    assert GenerateQuestions("Software Engineer", 3, "Python, Django") in effects
+
+
+def test_questions_ready_starts_asking():
+    state = asking_questions()
+    assert state.stage == "askingQuestion"
+    assert state.current_question == QUESTIONS[0]
+
+
+def test_failed_generation_returns_to_tech_stack():
+    state, _ = run(at_tech_stack(), UserMessage("Python"), UserMessage("ok"))
+    assert transition(state, QuestionsReady([]))[0].stage == "techStack"
+    assert transition(state, QuestionsReady([], error="boom"))[0].stage == "techStack"
+
+
+def test_code_question_takes_code_and_queues_evaluation():
+    state, _ = transition(asking_questions(), UserMessage("A mutable sequence"))
+    assert state.awaiting_code_answer
+
+    # Chat messages during a code question are off-script questions, not answers
+    _, effects = transition(state, UserMessage("Can I use Python 3.12?"))
+    assert effects[-1] == ContextualReply("Can I use Python 3.12?")
+
+    state, effects = transition(state, CodeSubmitted("def add(a, b): return a + b"))
+    assert state.stage == "completed"
+    assert EvaluateCode(1, "def add(a, b): return a + b", "python", ("assert add(1, 2) == 3",)) in effects
+    assert [r["question"] for r in state.candidate_info["technicalResponses"]] == ["What is a list?", "Write add(a, b)."]
+
+
+def test_save_feedback_flow():
+    state, _ = run(asking_questions(), UserMessage("A mutable sequence"), CodeSubmitted("def add(a, b): return a + b"))
+    state, effects = transition(state, SaveRequested())
+    assert any(isinstance(effect, SaveProfile) for effect in effects)
+
+    failed, effects = transition(state, ProfileSaved(False, error="Database down"))
+    assert failed.stage == "completed"
+    assert effects[-1].text == "❌ Database down"
+
+    state, effects = transition(state, ProfileSaved(True, profile_id="doc-1"))
+    assert state.stage == "final_confirmation"
+    assert state.candidate_info["saved_to_firestore"]
+    assert effects[-1] == RequestFeedback(dict(state.candidate_info), "doc-1")
+
+    # Saving again is ignored once the profile is saved
+    assert transition(state, SaveRequested()) == (state, [])
+
+    _, effects = transition(state, FeedbackReady(True, "Good work."))
+    assert "Good work." in effects[0].text
+
+
+def test_exit_from_any_stage_cancels_prefetch():
+    state, effects = transition(at_tech_stack(), UserMessage("EXIT"))
+    assert state.stage == "exit"
+    assert CancelPrefetch() in effects
+
+
+def test_events_for_other_stages_are_ignored():
+    state = InterviewState()
+    assert transition(state, PhoneConfirmed("+1 555")) == (state, [])
+    assert transition(state, ContextualReplyReady(True)) == (state, [])
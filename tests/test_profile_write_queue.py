@@ -0,0 +1,83 @@
+import json
+import os
+
+from benchmarks.fakes import FakeFirestore, LatencyProfile, _FakeBatch
+from firebase_service import ProfileWriteQueue
+
+PATH = "artifacts/app/users/u1/candidate_profiles"
+
+
+class RejectingFirestore(FakeFirestore):
+    """Refuses (as a non-transient error) any batch that writes a document with "bad" set."""
+
+    def batch(self):
+        store = self
+
+        class Batch(_FakeBatch):
+            def commit(self):
+                if any(data.get("bad") for _, data, _ in self._writes):
+                    raise ValueError("invalid document")
+                super().commit()
+
+        return Batch(store)
+
+
+def make_queue(tmp_path, **kwargs):
+    return ProfileWriteQueue(str(tmp_path / "journal"), 10, 0.01, 0.01, 0.05, **kwargs)
+
+
+def write_record(directory, record, mtime):
+    os.makedirs(directory, exist_ok=True)
+    file_path = os.path.join(directory, f"{record['key']}.json")
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    os.utime(file_path, (mtime, mtime))
+
+
+def test_submitted_profile_and_update_are_delivered(tmp_path):
+    db, queue = FakeFirestore(LatencyProfile()), make_queue(tmp_path)
+    doc_id = queue.submit(db, PATH, {"fullName": "Jane", "feedback": None})
+    queue.submit(db, PATH, {"feedback": "Good work."}, doc_id=doc_id)
+    assert queue.flush(5)
+    assert db.documents[f"{PATH}/{doc_id}"] == {"fullName": "Jane", "feedback": "Good work."}
+    assert queue.status(doc_id) == "delivered"
+    assert os.listdir(queue.journal_dir) == []
+
+
+def test_replay_follows_queue_order_not_mtime(tmp_path):
+    queue = make_queue(tmp_path)
+    # The profile was retried (rewritten) after its update was queued, so its file is newer
+    base = {"path": PATH, "doc_id": "doc1", "key": "doc1", "data": {"fullName": "Jane", "feedback": None},
+            "merge": False, "queued_at": 100.0, "attempts": 1}
+    update = {"path": PATH, "doc_id": "doc1", "key": "doc1-abcd", "data": {"feedback": "Good work."},
+              "merge": True, "queued_at": 101.0}
+    write_record(queue.journal_dir, update, mtime=1000)
+    write_record(queue.journal_dir, base, mtime=2000)
+
+    assert queue.status("doc1") == "pending"  # from the journal, before replay
+    db = FakeFirestore(LatencyProfile())
+    queue.start(db)
+    assert queue.flush(5)
+    assert db.documents[f"{PATH}/doc1"] == {"fullName": "Jane", "feedback": "Good work."}
+
+
+def test_status_before_replay(tmp_path):
+    queue = make_queue(tmp_path)
+    write_record(queue.dead_letter_dir, {"key": "doc2"}, mtime=1000)
+    assert queue.status("doc2") == "failed"
+    assert queue.status("doc3") == "unknown"
+
+
+def test_rejected_profile_is_dead_lettered_with_its_updates(tmp_path):
+    db, queue = RejectingFirestore(LatencyProfile()), make_queue(tmp_path, max_attempts=2)
+    good = queue.submit(db, PATH, {"fullName": "Jane"})
+    bad = queue.submit(db, PATH, {"fullName": "Joe", "bad": True})
+    queue.submit(db, PATH, {"feedback": "Good work."}, doc_id=bad)
+    assert queue.flush(5)
+
+    assert queue.status(good) == "delivered"
+    assert queue.status(bad) == "failed"
+    assert f"{PATH}/{bad}" not in db.documents
+    assert queue.stats()["dead_lettered"] == 2
+    assert len(os.listdir(queue.dead_letter_dir)) == 2
+    assert not [name for name in os.listdir(queue.journal_dir) if name.endswith(".json")]
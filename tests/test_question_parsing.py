@@ -0,0 +1,48 @@
+import json
+
+from llm_service import parse_question_set
+
+THEORY = {"text": "Explain Python's GIL.", "type": "theory", "language": "", "difficulty": "medium", "tests": []}
+CODE = {"text": "Write a function that reverses a string.", "type": "code", "language": "python",
+        "difficulty": "easy", "tests": ["assert reverse('ab') == 'ba'"]}
+
+
+def test_schema_valid_json_is_accepted_as_is():
+    assert parse_question_set(json.dumps({"questions": [THEORY, CODE]})) == [THEORY, CODE]
+
+
+def test_fenced_json_is_extracted():
+    reply = "```json\n" + json.dumps({"questions": [THEORY, CODE]}) + "\n```"
+    assert parse_question_set(reply) == [THEORY, CODE]
+
+
+def test_prose_wrapped_json_array_is_extracted():
+    reply = "Sure! Here are your questions:\n" + json.dumps([THEORY, CODE]) + "\nGood luck."
+    assert parse_question_set(reply) == [THEORY, CODE]
+
+
+def test_loose_fields_are_coerced():
+    reply = json.dumps({"questions": [
+        {"question": "Explain Python's GIL.", "difficulty": "Intermediate"},
+        {"text": "Write a function that reverses a string.", "type": "Coding", "language": "Python",
+         "difficulty": "beginner", "tests": ["assert reverse('ab') == 'ba'", "  "]},
+    ]})
+    assert parse_question_set(reply) == [THEORY, CODE]
+
+
+def test_legacy_numbered_list_with_code_tag():
+    reply = "1. Explain Python's GIL.\n2. [CODE] Write a function that reverses a string.\nThanks!"
+    questions = parse_question_set(reply)
+    assert [q["type"] for q in questions] == ["theory", "code"]
+    assert questions[1]["text"] == "Write a function that reverses a string."
+    assert questions[1]["tests"] == []
+
+
+def test_invalid_items_are_dropped():
+    reply = json.dumps({"questions": [THEORY, {"text": "Too short"}, 42, None]})
+    assert parse_question_set(reply) == [THEORY]
+
+
+def test_unusable_reply_yields_no_questions():
+    assert parse_question_set("I'm sorry, I can't help with that.") == []
+    assert parse_question_set("{not json") == []
@@ -0,0 +1,55 @@
+import pytest
+
+from tech_stack import canonicalize, code_language, display_stack, is_fully_recognized, stack_key
+
+
+@pytest.mark.parametrize("stack, expected", [
+    ("Python 3.11, Django", ("django", "python")),
+    ("python3 and DRF", ("django", "python")),
+    ("ReactJS, node.js, TS", ("nodejs", "react", "typescript")),
+    ("Spring Boot, Java 17", ("java", "spring")),
+    ("C++, C#, C", ("c", "cpp", "csharp")),
+    ("Ruby on Rails", ("rails",)),
+    ("python and django and  postgres", ("django", "postgresql", "python")),
+])
+def test_aliases_versions_and_multi_word_names(stack, expected):
+    assert canonicalize(stack) == expected
+    assert is_fully_recognized(stack)
+
+
+def test_spelling_and_order_share_a_key():
+    assert stack_key("Django, Python") == stack_key("python3 / django") == "django,python"
+
+
+def test_unknown_words_are_dropped_but_mark_the_stack_incomplete():
+    assert canonicalize("3 years of Python") == ("python",)
+    assert not is_fully_recognized("3 years of Python")
+    assert canonicalize("Cobol wizardry") == ()
+    assert stack_key("Cobol wizardry") == ""
+
+
+@pytest.mark.parametrize("stack, expected", [
+    ("I want to go next with REST APIs", ("rest",)),
+    ("I excel at python", ("python",)),
+    ("Go, Kubernetes, Docker", ("docker", "go", "kubernetes")),
+    ("Kubernetes and Go", ("go", "kubernetes")),
+    ("golang, next.js", ("go", "nextjs")),
+])
+def test_everyday_word_aliases_need_a_tech_only_clause(stack, expected):
+    assert canonicalize(stack) == expected
+
+
+def test_display_stack():
+    assert display_stack("python3, django") == "Django, Python"
+    assert display_stack("I excel at python") == "I excel at python (recognized: Python)"
+    assert display_stack("Cobol wizardry") == "Cobol wizardry"
+
+
+@pytest.mark.parametrize("stack, expected", [
+    ("Python, Docker", "python"),
+    ("Django", "python"),
+    ("Spring Boot", "java"),
+    ("Docker, Kubernetes", ""),
+])
+def test_code_language(stack, expected):
+    assert code_language(canonicalize(stack)) == expected